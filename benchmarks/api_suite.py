@@ -0,0 +1,377 @@
+"""Latency and throughput of the main API endpoints, with regression checks.
+
+Seeds a database with `--users`, `--warehouses` and `--products` through
+bulk inserts (skipped when it already holds that many), then drives the
+real app either in process through httpx's ASGI transport or over HTTP
+against uvicorn with `--workers` processes. Every scenario reports
+p50/p95/p99 latency and requests per second; results are written as JSON
+and can be checked against a stored baseline:
+
+    python benchmarks/api_suite.py --output baseline.json
+    python benchmarks/api_suite.py --mode uvicorn --workers 4 --output run.json \\
+        --baseline baseline.json --max-rps-drop 10 --max-latency-increase 20
+    python benchmarks/api_suite.py --compare run.json --baseline baseline.json
+
+The exit status is 1 when a scenario regressed past a threshold. Only
+compare runs of the same mode, volumes and machine. Without DATABASE_URL a
+throwaway SQLite database is used, which serializes writers: use
+PostgreSQL for transfer numbers with several workers. The response cache
+is off unless --response-cache is given, so list scenarios measure the
+database path.
+"""
+import argparse
+import asyncio
+import json
+import os
+import platform
+import random
+import socket
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+from collections import defaultdict
+from datetime import datetime
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+PASSWORD = "bench-password"
+BATCH = 10000
+SCENARIOS = ["health", "login", "list_products", "list_warehouses", "transfer"]
+
+
+def email(index: int) -> str:
+    return f"bench-{index}@example.com"
+
+
+def percentile(timings, fraction: float) -> float:
+    return timings[max(int(len(timings) * fraction) - 1, 0)]
+
+
+# --- Seeding ---
+
+def seed(users: int, warehouses: int, products: int) -> None:
+    from sqlalchemy import func, insert
+
+    from database import Base, SessionLocal, engine
+    from models.product import Product
+    from models.user import User
+    from models.warehouse import Warehouse
+    from models.warehouse_stock import WarehouseStock
+    from services.passwords import get_pwd_context
+
+    Base.metadata.create_all(bind=engine)
+    db = SessionLocal()
+    try:
+        if db.query(func.count(User.id)).filter(User.email.like("bench-%")).scalar() >= users:
+            return
+        # One hash for everyone, bcrypt per row would dominate the seeding
+        hashed = get_pwd_context().hash(PASSWORD)
+        db.execute(insert(User), [
+            {"email": email(i), "password": hashed, "user_type": "business", "is_active": True,
+             "created_at": datetime.utcnow()}
+            for i in range(users)
+        ])
+        user_ids = [id for (id,) in db.query(User.id).filter(User.email.like("bench-%")).order_by(User.id)]
+        db.execute(insert(Warehouse), [
+            {"name": f"bench-{i}", "location": f"city-{i % 10}", "capacity": 10 ** 9,
+             "rental_price": float(1 + i % 50), "warehouse_type": "bench", "is_available": True,
+             "owner_id": user_ids[i % users], "created_at": datetime.utcnow()}
+            for i in range(warehouses)
+        ])
+        owners = dict(db.query(Warehouse.id, Warehouse.owner_id).filter(Warehouse.name.like("bench-%")))
+        warehouse_ids = sorted(owners)
+        totals = defaultdict(int)
+        for start in range(0, products, BATCH):
+            rows = []
+            for i in range(start, min(start + BATCH, products)):
+                warehouse_id = warehouse_ids[i % len(warehouse_ids)]
+                totals[warehouse_id] += 1000
+                rows.append({
+                    "name": f"sku-{i}", "description": None, "quantity": 1000, "is_active": True,
+                    "warehouse_id": warehouse_id, "owner_id": owners[warehouse_id],
+                    "created_at": datetime.utcnow()
+                })
+            # Bulk inserts skip the ORM events, so owner_id is set above
+            db.execute(insert(Product), rows)
+            db.commit()
+        db.execute(insert(WarehouseStock), [
+            {"warehouse_id": id, "total_quantity": total, "sku_count": total // 1000,
+             "updated_at": datetime.utcnow()}
+            for id, total in totals.items()
+        ])
+        db.commit()
+    finally:
+        db.close()
+
+
+def transfer_candidates(limit: int, rng: random.Random):
+    """(owner email, product id, from warehouse, to warehouse) of random products."""
+    from sqlalchemy import func
+
+    from database import SessionLocal
+    from models.product import Product
+    from models.user import User
+    from models.warehouse import Warehouse
+
+    db = SessionLocal()
+    try:
+        by_owner = defaultdict(list)
+        for id, owner_id in db.query(Warehouse.id, Warehouse.owner_id).filter(Warehouse.name.like("bench-%")):
+            by_owner[owner_id].append(id)
+        emails = dict(db.query(User.id, User.email).filter(User.email.like("bench-%")))
+        rows = db.query(Product.id, Product.warehouse_id, Product.owner_id).filter(
+            Product.name.like("sku-%")
+        ).order_by(func.random()).limit(limit).all()
+    finally:
+        db.close()
+    return [
+        (emails[owner_id], product_id, warehouse_id,
+         rng.choice([id for id in by_owner[owner_id] if id != warehouse_id]))
+        for product_id, warehouse_id, owner_id in rows
+        if len(by_owner[owner_id]) > 1
+    ]
+
+
+# --- Load generation ---
+
+async def drive(client, requests, concurrency: int, warmup: int):
+    """Run the `requests` coroutine factories; returns (timings in ms, errors, seconds)."""
+    for make in requests[:warmup]:
+        await make(client)
+    semaphore = asyncio.Semaphore(concurrency)
+    timings, errors = [], 0
+
+    async def one(make):
+        nonlocal errors
+        async with semaphore:
+            started = time.perf_counter()
+            try:
+                response = await make(client)
+                failed = response.status_code >= 400
+            except Exception:
+                failed = True
+            timings.append((time.perf_counter() - started) * 1000)
+            errors += failed
+
+    started = time.perf_counter()
+    await asyncio.gather(*(one(make) for make in requests[warmup:]))
+    return timings, errors, time.perf_counter() - started
+
+
+def summarize(timings, errors: int, seconds: float):
+    timings = sorted(timings)
+    return {
+        "requests": len(timings),
+        "errors": errors,
+        "rps": round(len(timings) / seconds, 1),
+        "p50_ms": round(statistics.median(timings), 2),
+        "p95_ms": round(percentile(timings, 0.95), 2),
+        "p99_ms": round(percentile(timings, 0.99), 2),
+        "mean_ms": round(statistics.fmean(timings), 2),
+    }
+
+
+def build_requests(scenario: str, count: int, tokens, transfers, rng: random.Random):
+    emails = sorted(tokens)
+
+    def auth(address):
+        return {"Authorization": f"Bearer {tokens[address]}"}
+
+    if scenario == "health":
+        return [lambda client: client.get("/health") for _ in range(count)]
+    if scenario == "login":
+        return [
+            lambda client, address=rng.choice(emails): client.post(
+                "/auth/login", data={"username": address, "password": PASSWORD}
+            )
+            for _ in range(count)
+        ]
+    if scenario == "list_products":
+        return [
+            lambda client, address=rng.choice(emails): client.get("/products/?limit=50", headers=auth(address))
+            for _ in range(count)
+        ]
+    if scenario == "list_warehouses":
+        return [
+            lambda client, address=rng.choice(emails): client.get(
+                "/warehouses/?limit=20&products=summary", headers=auth(address)
+            )
+            for _ in range(count)
+        ]
+    if scenario == "transfer":
+        return [
+            lambda client, move=transfers[i % len(transfers)]: client.post("/products/transfer", json={
+                "product_id": move[1], "from_warehouse_id": move[2], "to_warehouse_id": move[3], "quantity": 1
+            }, headers=auth(move[0]))
+            for i in range(count)
+        ]
+    raise ValueError(scenario)
+
+
+async def run_scenarios(client, args) -> dict:
+    rng = random.Random(args.seed)
+    tokens = {}
+    for index in range(args.users):
+        response = await client.post("/auth/login", data={"username": email(index), "password": PASSWORD})
+        response.raise_for_status()
+        tokens[email(index)] = response.json()["access_token"]
+    transfers = transfer_candidates(args.requests, rng)
+
+    results = {}
+    for scenario in args.scenarios:
+        count = args.login_requests if scenario == "login" else args.requests
+        requests = build_requests(scenario, count + args.warmup, tokens, transfers, rng)
+        results[scenario] = summarize(*await drive(client, requests, args.concurrency, args.warmup))
+        print(format_result(scenario, results[scenario]), flush=True)
+    return results
+
+
+async def run_in_process(args) -> dict:
+    import httpx
+
+    from main import app
+
+    async with httpx.AsyncClient(app=app, base_url="http://bench", timeout=60) as client:
+        return await run_scenarios(client, args)
+
+
+def free_port() -> int:
+    with socket.socket() as sock:
+        sock.bind(("127.0.0.1", 0))
+        return sock.getsockname()[1]
+
+
+async def run_uvicorn(args) -> dict:
+    import httpx
+
+    port = free_port()
+    server = subprocess.Popen(
+        [sys.executable, "-m", "uvicorn", "main:app", "--host", "127.0.0.1", "--port", str(port),
+         "--workers", str(args.workers), "--log-level", "warning"],
+        cwd=ROOT, env=os.environ.copy()
+    )
+    limits = httpx.Limits(max_connections=args.concurrency, max_keepalive_connections=args.concurrency)
+    try:
+        async with httpx.AsyncClient(base_url=f"http://127.0.0.1:{port}", timeout=60, limits=limits) as client:
+            deadline = time.monotonic() + 60
+            while True:
+                try:
+                    if (await client.get("/health")).status_code == 200:
+                        break
+                except httpx.TransportError:
+                    pass
+                if server.poll() is not None or time.monotonic() > deadline:
+                    raise SystemExit("uvicorn did not start")
+                await asyncio.sleep(0.2)
+            return await run_scenarios(client, args)
+    finally:
+        server.terminate()
+        server.wait(30)
+
+
+# --- Reporting ---
+
+def format_result(scenario: str, result: dict) -> str:
+    return (f"{scenario:<16} rps={result['rps']:>8.1f} p50={result['p50_ms']:>7.2f}ms "
+            f"p95={result['p95_ms']:>7.2f}ms p99={result['p99_ms']:>7.2f}ms errors={result['errors']}")
+
+
+def compare(current: dict, baseline: dict, max_rps_drop: float, max_latency_increase: float) -> bool:
+    """Print the change of every scenario against the baseline; False on a regression."""
+    if current["meta"]["config"] != baseline["meta"]["config"]:
+        print("warning: baseline was taken with different settings:", baseline["meta"]["config"])
+    ok = True
+    for scenario, result in current["results"].items():
+        base = baseline["results"].get(scenario)
+        if base is None:
+            continue
+        problems = []
+        rps_change = (result["rps"] - base["rps"]) / base["rps"] * 100
+        if rps_change < -max_rps_drop:
+            problems.append(f"rps {rps_change:+.1f}%")
+        for key in ("p95_ms", "p99_ms"):
+            change = (result[key] - base[key]) / base[key] * 100 if base[key] else 0.0
+            if change > max_latency_increase:
+                problems.append(f"{key} {change:+.1f}%")
+        if result["errors"] > base["errors"]:
+            problems.append(f"errors {base['errors']} -> {result['errors']}")
+        ok = ok and not problems
+        print(f"{scenario:<16} rps {rps_change:+6.1f}%  p95 {base['p95_ms']:.2f} -> {result['p95_ms']:.2f}ms  "
+              f"p99 {base['p99_ms']:.2f} -> {result['p99_ms']:.2f}ms  "
+              f"{'REGRESSION: ' + ', '.join(problems) if problems else 'ok'}")
+    return ok
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--mode", choices=["inprocess", "uvicorn"], default="inprocess")
+    parser.add_argument("--workers", type=int, default=4, help="uvicorn worker processes")
+    parser.add_argument("--users", type=int, default=10)
+    parser.add_argument("--warehouses", type=int, default=200)
+    parser.add_argument("--products", type=int, default=100_000)
+    parser.add_argument("--scenarios", nargs="+", choices=SCENARIOS, default=SCENARIOS)
+    parser.add_argument("--requests", type=int, default=1000, help="timed requests per scenario")
+    parser.add_argument("--login-requests", type=int, default=100, help="bcrypt makes logins far slower")
+    parser.add_argument("--warmup", type=int, default=20)
+    parser.add_argument("--concurrency", type=int, default=32)
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--response-cache", action="store_true")
+    parser.add_argument("--output", help="write the results to this JSON file")
+    parser.add_argument("--compare", help="check this results file instead of running")
+    parser.add_argument("--baseline", help="results file to check against")
+    parser.add_argument("--max-rps-drop", type=float, default=10.0, help="percent")
+    parser.add_argument("--max-latency-increase", type=float, default=20.0, help="percent, on p95 and p99")
+    args = parser.parse_args()
+
+    if args.compare:
+        with open(args.compare) as file:
+            report = json.load(file)
+    else:
+        os.environ.setdefault(
+            "DATABASE_URL", f"sqlite:///{os.path.join(tempfile.mkdtemp(), 'bench.db')}"
+        )
+        os.environ["RESPONSE_CACHE_ENABLED"] = str(args.response_cache)
+        started = time.perf_counter()
+        seed(args.users, args.warehouses, args.products)
+        print(f"seeded in {time.perf_counter() - started:.1f}s", flush=True)
+        runner = run_uvicorn if args.mode == "uvicorn" else run_in_process
+        results = asyncio.run(runner(args))
+
+        from sqlalchemy.engine import make_url
+
+        config = {
+            "mode": args.mode,
+            "workers": args.workers if args.mode == "uvicorn" else 1,
+            "database": make_url(os.environ["DATABASE_URL"]).get_backend_name(),
+            "db_async": os.getenv("DB_ASYNC", "False"),
+            "users": args.users,
+            "warehouses": args.warehouses,
+            "products": args.products,
+            "concurrency": args.concurrency,
+            "response_cache": args.response_cache,
+        }
+        report = {
+            "meta": {
+                "created_at": datetime.utcnow().isoformat(),
+                "python": platform.python_version(),
+                "machine": platform.node(),
+                "config": config,
+            },
+            "results": results,
+        }
+        if args.output:
+            with open(args.output, "w") as file:
+                json.dump(report, file, indent=2)
+
+    if args.baseline:
+        with open(args.baseline) as file:
+            baseline = json.load(file)
+        if not compare(report, baseline, args.max_rps_drop, args.max_latency_increase):
+            sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
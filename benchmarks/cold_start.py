@@ -0,0 +1,100 @@
+"""Cold start of the API: import time and time until uvicorn serves.
+
+Times `import main` in fresh interpreters, then starts uvicorn with
+`--workers` processes and polls until /health answers and, where the app
+has it, until /ready reports warm pools:
+
+    python benchmarks/cold_start.py --workers 4 --runs 5
+
+Without DATABASE_URL a throwaway SQLite database is used; the schema is
+created up front so only startup itself is measured.
+"""
+import argparse
+import os
+import socket
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+
+def import_time() -> float:
+    started = time.perf_counter()
+    subprocess.run([sys.executable, "-c", "import main"], cwd=ROOT, check=True)
+    return (time.perf_counter() - started) * 1000
+
+
+def free_port() -> int:
+    with socket.socket() as sock:
+        sock.bind(("127.0.0.1", 0))
+        return sock.getsockname()[1]
+
+
+def serve_time(workers: int):
+    """Milliseconds until /health and /ready first answer 200 (None if there is no /ready)."""
+    import httpx
+
+    port = free_port()
+    started = time.perf_counter()
+    server = subprocess.Popen(
+        [sys.executable, "-m", "uvicorn", "main:app", "--host", "127.0.0.1", "--port", str(port),
+         "--workers", str(workers), "--log-level", "warning"],
+        cwd=ROOT
+    )
+    healthy = ready = None
+    try:
+        with httpx.Client(base_url=f"http://127.0.0.1:{port}", timeout=5) as client:
+            while ready is None and time.perf_counter() - started < 120:
+                try:
+                    if healthy is None and client.get("/health").status_code == 200:
+                        healthy = (time.perf_counter() - started) * 1000
+                    if healthy is not None:
+                        status = client.get("/ready").status_code
+                        if status == 404:
+                            break
+                        if status == 200:
+                            ready = (time.perf_counter() - started) * 1000
+                except httpx.TransportError:
+                    pass
+                time.sleep(0.01)
+    finally:
+        server.terminate()
+        server.wait(30)
+    return healthy, ready
+
+
+def create_schema():
+    # Older trees create it on import, newer ones through the migration runner
+    if os.path.exists(os.path.join(ROOT, "scripts", "migrate.py")):
+        subprocess.run([sys.executable, "scripts/migrate.py"], cwd=ROOT, check=True, stdout=subprocess.DEVNULL)
+    else:
+        import_time()
+
+
+def describe(name: str, timings):
+    timings = [timing for timing in timings if timing is not None]
+    if timings:
+        print(f"{name:<8} median={statistics.median(timings):8.1f}ms min={min(timings):8.1f}ms")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--workers", type=int, default=4)
+    parser.add_argument("--runs", type=int, default=5)
+    args = parser.parse_args()
+
+    os.environ.setdefault(
+        "DATABASE_URL", f"sqlite:///{os.path.join(tempfile.mkdtemp(), 'bench.db')}"
+    )
+    create_schema()
+    describe("import", [import_time() for _ in range(args.runs)])
+    serves = [serve_time(args.workers) for _ in range(args.runs)]
+    describe("health", [healthy for healthy, _ in serves])
+    describe("ready", [ready for _, ready in serves])
+
+
+if __name__ == "__main__":
+    main()
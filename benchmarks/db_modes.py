@@ -0,0 +1,88 @@
+"""Requests per second of the sync (threadpool) and async (AsyncSession) modes.
+
+Each mode runs in its own process so DB_ASYNC is read fresh at import.
+Without DATABASE_URL a throwaway SQLite database is used:
+
+    python benchmarks/db_modes.py --requests 2000 --concurrency 64
+"""
+import argparse
+import asyncio
+import json
+import os
+import subprocess
+import sys
+import tempfile
+import time
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+ENDPOINTS = ["/products/?limit=50", "/warehouses/?limit=20&products=summary"]
+
+
+async def measure(requests: int, concurrency: int) -> dict:
+    import httpx
+
+    from database import Base, SessionLocal, engine
+    from main import app
+    from models.product import Product
+    from models.user import User
+    from models.warehouse import Warehouse
+    from routers.auth import create_access_token
+
+    Base.metadata.create_all(bind=engine)
+    db = SessionLocal()
+    owner = db.query(User).filter(User.email == "bench@example.com").first()
+    if owner is None:
+        owner = User(email="bench@example.com", password="x", user_type="business")
+        db.add(owner)
+        db.flush()
+        for i in range(20):
+            warehouse = Warehouse(name=f"bench-{i}", location="bench", capacity=1000,
+                                  rental_price=1.0, warehouse_type="bench", owner_id=owner.id)
+            db.add(warehouse)
+            db.flush()
+            db.add_all(Product(name=f"sku-{j}", quantity=10, warehouse_id=warehouse.id)
+                       for j in range(50))
+        db.commit()
+    db.close()
+
+    headers = {"Authorization": f"Bearer {create_access_token({'sub': 'bench@example.com'})}"}
+    semaphore = asyncio.Semaphore(concurrency)
+    results = {}
+    async with httpx.AsyncClient(app=app, base_url="http://bench", headers=headers) as client:
+        for endpoint in ENDPOINTS:
+            async def call():
+                async with semaphore:
+                    (await client.get(endpoint)).raise_for_status()
+
+            started = time.perf_counter()
+            await asyncio.gather(*(call() for _ in range(requests)))
+            results[endpoint] = requests / (time.perf_counter() - started)
+    return results
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--requests", type=int, default=2000)
+    parser.add_argument("--concurrency", type=int, default=64)
+    parser.add_argument("--child", action="store_true", help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.child:
+        sys.path.insert(0, ROOT)
+        print(json.dumps(asyncio.run(measure(args.requests, args.concurrency))))
+        return
+
+    env = dict(os.environ)
+    env.setdefault("DATABASE_URL", f"sqlite:///{os.path.join(tempfile.mkdtemp(), 'bench.db')}")
+    for mode in ("False", "True"):
+        output = subprocess.run(
+            [sys.executable, __file__, "--child", "--requests", str(args.requests),
+             "--concurrency", str(args.concurrency)],
+            env={**env, "DB_ASYNC": mode}, cwd=ROOT, check=True, capture_output=True, text=True
+        ).stdout
+        for endpoint, rps in json.loads(output.splitlines()[-1]).items():
+            print(f"{'async' if mode == 'True' else 'sync':<6} {endpoint:<45} {rps:8.1f} req/s")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,105 @@
+"""Demand model cost at 1M products: replay, incremental updates and lookups.
+
+Feeds services.forecasting.DemandModel synthetic ledger batches, the same
+columnar arrays a refresh reads from the database, and times:
+
+* load: current warehouse and quantity of every product
+* replay: `--days` days of history, `--movements` ledger rows per day
+* update: one incremental refresh worth of movements (`--update` rows)
+* metrics: reorder points of every product at once
+* suggestions: reorder suggestions of one warehouse (p50/p95/p99)
+
+For scale, --python-loop also times a per-product Python loop computing
+the same smoothing over a sample of products.
+
+    python benchmarks/forecasting.py --products 1000000
+"""
+import argparse
+import os
+import statistics
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import numpy as np  # noqa: E402
+
+from services.forecasting import DemandModel  # noqa: E402
+
+WAREHOUSES = 1000
+
+
+def timed(label: str, fn):
+    started = time.perf_counter()
+    result = fn()
+    print(f"{label:12} {(time.perf_counter() - started) * 1000:10.1f}ms")
+    return result
+
+
+def movements(rng, products: int, count: int, day: int):
+    product_ids = rng.integers(1, products + 1, count)
+    return (
+        product_ids,
+        product_ids % WAREHOUSES,
+        -rng.poisson(3, count),
+        rng.integers(0, 500, count),
+        np.full(count, day),
+        np.zeros(count, dtype=bool),
+    )
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--products", type=int, default=1_000_000)
+    parser.add_argument("--days", type=int, default=56)
+    parser.add_argument("--movements", type=int, default=200_000)
+    parser.add_argument("--update", type=int, default=10_000)
+    parser.add_argument("--queries", type=int, default=200)
+    parser.add_argument("--python-loop", type=int, default=10_000, metavar="PRODUCTS")
+    args = parser.parse_args()
+
+    rng = np.random.default_rng(0)
+    model = DemandModel(start_day=0)
+    ids = np.arange(1, args.products + 1)
+    print(f"products={args.products} days={args.days} movements/day={args.movements}")
+    timed("load", lambda: model.load_products(ids, ids % WAREHOUSES, rng.integers(0, 500, args.products)))
+
+    def replay():
+        for day in range(args.days):
+            model.ingest(*movements(rng, args.products, args.movements, day))
+        model.advance_to(args.days)
+
+    timed("replay", replay)
+    timed("update", lambda: model.ingest(*movements(rng, args.products, args.update, args.days)))
+    timed("metrics", lambda: model.metrics())
+
+    timings = []
+    for _ in range(args.queries):
+        warehouse_id = int(rng.integers(0, WAREHOUSES))
+        started = time.perf_counter()
+        rows = np.flatnonzero(model.warehouse_ids == warehouse_id)
+        columns = model.metrics(rows)
+        due = np.flatnonzero(columns["suggested_order"] > 0)
+        due[np.argsort(columns["days_until_stockout"][due])][:100]
+        timings.append((time.perf_counter() - started) * 1000)
+    timings.sort()
+    print(f"suggestions  p50={statistics.median(timings):.2f}ms "
+          f"p95={timings[int(len(timings) * 0.95) - 1]:.2f}ms p99={timings[int(len(timings) * 0.99) - 1]:.2f}ms")
+
+    if args.python_loop:
+        # Same exponential smoothing, one product at a time
+        history = rng.poisson(3, (args.python_loop, args.days)).tolist()
+        started = time.perf_counter()
+        for series in history:
+            level = variance = 0.0
+            for demand in series:
+                error = demand - level
+                level += model.smoothing * error
+                variance = (1 - model.smoothing) * (variance + model.smoothing * error * error)
+        elapsed = time.perf_counter() - started
+        print(f"python loop  {elapsed * 1000:10.1f}ms for {args.python_loop} products "
+              f"(~{elapsed * args.products / args.python_loop:.1f}s for all)")
+
+
+if __name__ == "__main__":
+    main()
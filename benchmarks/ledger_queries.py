@@ -0,0 +1,114 @@
+"""Point-in-time stock and movement history latency on a large ledger.
+
+Seeds `--movements` ledger rows spread over `--warehouses` warehouses and
+`--days` days (skipped when the ledger is already that large), snapshots
+every warehouse daily over that period, then times `stock_as_of` at random
+moments and keyset pages of a warehouse's movements:
+
+    DATABASE_URL=postgresql://... python benchmarks/ledger_queries.py --movements 10000000
+"""
+import argparse
+import os
+import random
+import statistics
+import sys
+import tempfile
+import time
+from datetime import datetime, timedelta
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+os.environ.setdefault(
+    "DATABASE_URL", f"sqlite:///{os.path.join(tempfile.mkdtemp(), 'bench.db')}"
+)
+
+from sqlalchemy import func, insert  # noqa: E402
+
+from database import Base, SessionLocal, engine  # noqa: E402
+from models.product import Product  # noqa: E402,F401
+from models.stock_movement import StockMovement, StockSnapshot  # noqa: E402
+from models.user import User  # noqa: E402,F401
+from models.warehouse import Warehouse  # noqa: E402,F401
+from services.ledger import stock_as_of  # noqa: E402
+from services.pagination import encode_cursor, paginate_by_id  # noqa: E402
+
+BATCH = 10000
+START = datetime(2024, 1, 1)
+
+
+def seed(db, movements: int, warehouses: int, products: int, days: int):
+    Base.metadata.create_all(bind=engine)
+    if db.query(func.count(StockMovement.id)).scalar() >= movements:
+        return
+    rng = random.Random(0)
+    step = days * 86400 / movements
+    for start in range(0, movements, BATCH):
+        db.execute(insert(StockMovement), [
+            {"product_id": rng.randrange(products), "warehouse_id": rng.randrange(warehouses),
+             "delta": rng.randint(-5, 10), "quantity": 0, "kind": "bench",
+             "created_at": START + timedelta(seconds=i * step)}
+            for i in range(start, min(start + BATCH, movements))
+        ])
+        db.commit()
+
+    # Daily snapshots, built the way the periodic job rolls them forward
+    for warehouse_id in range(warehouses):
+        quantities = {}
+        for day in range(1, days + 1):
+            taken_at = START + timedelta(days=day)
+            for product_id, delta in db.query(StockMovement.product_id, func.sum(StockMovement.delta)).filter(
+                StockMovement.warehouse_id == warehouse_id,
+                StockMovement.created_at > taken_at - timedelta(days=1),
+                StockMovement.created_at <= taken_at
+            ).group_by(StockMovement.product_id):
+                quantities[product_id] = quantities.get(product_id, 0) + delta
+            db.add(StockSnapshot(
+                warehouse_id=warehouse_id, taken_at=taken_at,
+                data={str(id): quantity for id, quantity in quantities.items() if quantity}
+            ))
+        db.commit()
+
+
+def report(name: str, timings):
+    timings.sort()
+    print(f"{name:10} p50={statistics.median(timings):.2f}ms "
+          f"p95={timings[int(len(timings) * 0.95) - 1]:.2f}ms "
+          f"p99={timings[int(len(timings) * 0.99) - 1]:.2f}ms")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--movements", type=int, default=10_000_000)
+    parser.add_argument("--warehouses", type=int, default=100)
+    parser.add_argument("--products", type=int, default=5000)
+    parser.add_argument("--days", type=int, default=90)
+    parser.add_argument("--queries", type=int, default=200)
+    parser.add_argument("--limit", type=int, default=100)
+    args = parser.parse_args()
+
+    db = SessionLocal()
+    seed(db, args.movements, args.warehouses, args.products, args.days)
+    print(f"movements={args.movements} dialect={engine.dialect.name}")
+
+    rng = random.Random(1)
+    timings = []
+    for _ in range(args.queries):
+        as_of = START + timedelta(seconds=rng.uniform(0, args.days * 86400))
+        started = time.perf_counter()
+        stock_as_of(db, rng.randrange(args.warehouses), as_of)
+        timings.append((time.perf_counter() - started) * 1000)
+    report("as_of", timings)
+
+    timings = []
+    for _ in range(args.queries):
+        # A page somewhere in the middle of the history
+        cursor = encode_cursor(rng.randrange(args.movements))
+        query = db.query(StockMovement).filter(StockMovement.warehouse_id == rng.randrange(args.warehouses))
+        started = time.perf_counter()
+        paginate_by_id(query, StockMovement.id, cursor, 0, args.limit).all()
+        timings.append((time.perf_counter() - started) * 1000)
+    report("movements", timings)
+    db.close()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,71 @@
+"""Login throughput at several password-hashing pool sizes.
+
+Runs the real app in process against a throwaway SQLite database:
+
+    python benchmarks/login_throughput.py --sizes 1 2 4 8 --requests 200
+"""
+import argparse
+import asyncio
+import os
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+os.environ.setdefault(
+    "DATABASE_URL", f"sqlite:///{os.path.join(tempfile.mkdtemp(), 'bench.db')}"
+)
+
+import httpx  # noqa: E402
+
+from database import Base, SessionLocal, engine  # noqa: E402
+from main import app  # noqa: E402
+from models.user import User  # noqa: E402
+from services.passwords import configure_executor, get_pwd_context  # noqa: E402
+
+EMAIL = "bench@example.com"
+PASSWORD = "bench-password"
+
+
+def seed_user():
+    Base.metadata.create_all(bind=engine)
+    db = SessionLocal()
+    try:
+        if not db.query(User).filter(User.email == EMAIL).first():
+            db.add(User(email=EMAIL, password=get_pwd_context().hash(PASSWORD), user_type="business"))
+            db.commit()
+    finally:
+        db.close()
+
+
+async def run(pool_size: int, requests: int, concurrency: int) -> float:
+    configure_executor(pool_size)
+    semaphore = asyncio.Semaphore(concurrency)
+    async with httpx.AsyncClient(app=app, base_url="http://bench") as client:
+        async def login():
+            async with semaphore:
+                response = await client.post(
+                    "/auth/login", data={"username": EMAIL, "password": PASSWORD}
+                )
+                response.raise_for_status()
+
+        started = time.perf_counter()
+        await asyncio.gather(*(login() for _ in range(requests)))
+        return requests / (time.perf_counter() - started)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--sizes", type=int, nargs="+", default=[1, 2, 4, 8])
+    parser.add_argument("--requests", type=int, default=200)
+    parser.add_argument("--concurrency", type=int, default=32)
+    args = parser.parse_args()
+
+    seed_user()
+    for size in args.sizes:
+        rps = asyncio.run(run(size, args.requests, args.concurrency))
+        print(f"pool_size={size:<3} logins/s={rps:8.1f}")
+
+
+if __name__ == "__main__":
+    main()
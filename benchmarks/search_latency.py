@@ -0,0 +1,114 @@
+"""Product search latency per mode on a large products table.
+
+Seeds `--products` rows with generated names (skipped when the table is
+already that large) and times `--queries` searches per mode. On PostgreSQL
+this measures the trigram/full-text indexes the 20 ms p99 target is set
+for; elsewhere it measures the in-memory test fallback, which is built once
+before timing starts and is not expected to meet the target at this size:
+
+    DATABASE_URL=postgresql://... python benchmarks/search_latency.py --products 1000000
+"""
+import argparse
+import os
+import random
+import statistics
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+os.environ.setdefault(
+    "DATABASE_URL", f"sqlite:///{os.path.join(tempfile.mkdtemp(), 'bench.db')}"
+)
+
+from sqlalchemy import func, insert  # noqa: E402
+
+from database import Base, SessionLocal, engine  # noqa: E402
+from models.product import Product  # noqa: E402
+from models.user import User  # noqa: E402
+from models.warehouse import Warehouse  # noqa: E402
+from services.search import search_products  # noqa: E402
+
+WAREHOUSES = 100
+BATCH = 10000
+WORDS = [
+    "steel", "bolt", "nut", "washer", "cable", "copper", "pipe", "valve", "pump", "motor",
+    "filter", "sensor", "panel", "switch", "relay", "bearing", "gear", "chain", "belt", "hose",
+    "bracket", "clamp", "drill", "blade", "screw", "anchor", "hinge", "spring", "seal", "gasket",
+]
+
+
+def product_name(rng: random.Random) -> str:
+    return " ".join(rng.sample(WORDS, 2)) + f" {rng.randint(1, 9999)}"
+
+
+def seed(db, products: int):
+    Base.metadata.create_all(bind=engine)
+    if db.query(func.count(Product.id)).scalar() >= products:
+        return
+    owner = User(email="bench-search@example.com", password="x", user_type="business")
+    db.add(owner)
+    db.flush()
+    db.execute(insert(Warehouse), [
+        {"name": f"bench-{i}", "location": "bench", "capacity": 10 ** 9,
+         "rental_price": 1.0, "warehouse_type": "bench", "owner_id": owner.id}
+        for i in range(WAREHOUSES)
+    ])
+    warehouse_ids = [id for (id,) in db.query(Warehouse.id).filter(Warehouse.owner_id == owner.id)]
+    rng = random.Random(0)
+    for start in range(0, products, BATCH):
+        db.execute(insert(Product), [
+            {"name": product_name(rng), "description": " ".join(rng.sample(WORDS, 4)),
+             "quantity": 1, "warehouse_id": warehouse_ids[i % WAREHOUSES]}
+            for i in range(start, min(start + BATCH, products))
+        ])
+        db.commit()
+
+
+def queries(mode: str, count: int, rng: random.Random):
+    for _ in range(count):
+        word = rng.choice(WORDS)
+        if mode == "prefix":
+            yield word[:rng.randint(2, len(word))]
+        elif mode == "fuzzy":
+            # One dropped letter, the typical typo
+            position = rng.randrange(len(word))
+            yield f"{word[:position]}{word[position + 1:]} {rng.choice(WORDS)}"
+        else:
+            yield f"{word} {rng.choice(WORDS)}"
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--products", type=int, default=1_000_000)
+    parser.add_argument("--queries", type=int, default=200)
+    parser.add_argument("--limit", type=int, default=20)
+    parser.add_argument("--target-ms", type=float, default=20.0)
+    args = parser.parse_args()
+
+    db = SessionLocal()
+    seed(db, args.products)
+    search_products(db, "warm up", limit=1)
+
+    rng = random.Random(1)
+    failed = False
+    print(f"products={args.products} dialect={engine.dialect.name}")
+    for mode in ("prefix", "fuzzy", "fulltext"):
+        timings = []
+        for query in queries(mode, args.queries, rng):
+            started = time.perf_counter()
+            search_products(db, query, mode=mode, limit=args.limit)
+            timings.append((time.perf_counter() - started) * 1000)
+        timings.sort()
+        p99 = timings[int(len(timings) * 0.99) - 1]
+        failed = failed or p99 > args.target_ms
+        print(f"{mode:9} p50={statistics.median(timings):.2f}ms "
+              f"p95={timings[int(len(timings) * 0.95) - 1]:.2f}ms p99={p99:.2f}ms")
+    db.close()
+    if failed:
+        print(f"p99 above the {args.target_ms}ms target")
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,86 @@
+"""Serialization cost of list responses: ORM + response_model vs column rows + orjson.
+
+For each size, loads `size` products from an in-memory SQLite database and
+times everything from the query to the response body:
+
+* orm: ORM instances validated through `List[ProductRead]` and encoded
+  with the stdlib `json`, which is what FastAPI did before
+* rows: `with_entities` column tuples dumped with services.serialization
+
+    python benchmarks/serialization.py --sizes 1000 10000 100000
+"""
+import argparse
+import asyncio
+import os
+import statistics
+import sys
+import time
+from datetime import datetime
+from typing import List
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+os.environ["DATABASE_URL"] = "sqlite://"
+
+from fastapi.responses import JSONResponse  # noqa: E402
+from fastapi.routing import serialize_response  # noqa: E402
+from fastapi.utils import create_response_field  # noqa: E402
+from sqlalchemy import create_engine, insert  # noqa: E402
+from sqlalchemy.orm import Session  # noqa: E402
+
+from database import Base  # noqa: E402
+from models.product import Product  # noqa: E402
+from models.user import User  # noqa: E402,F401
+from models.warehouse import Warehouse  # noqa: E402,F401
+from schemas.product import ProductRead  # noqa: E402
+from services.serialization import as_dicts, dumps, orjson  # noqa: E402
+from services.warehouse_loader import PRODUCT_COLUMNS  # noqa: E402
+
+RESPONSE_FIELD = create_response_field(name="response", type_=List[ProductRead])
+
+
+def orm_path(db: Session, size: int) -> bytes:
+    products = db.query(Product).order_by(Product.id).limit(size).all()
+    content = asyncio.run(serialize_response(field=RESPONSE_FIELD, response_content=products))
+    return JSONResponse(content).body
+
+
+def rows_path(db: Session, size: int) -> bytes:
+    rows = db.query(Product).with_entities(*PRODUCT_COLUMNS).order_by(Product.id).limit(size).all()
+    return dumps(as_dicts(rows))
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--sizes", type=int, nargs="+", default=[1000, 10000, 100000])
+    parser.add_argument("--repeat", type=int, default=5)
+    args = parser.parse_args()
+
+    engine = create_engine("sqlite://")
+    Base.metadata.create_all(bind=engine)
+    db = Session(engine)
+    db.execute(insert(Product), [
+        {"name": f"product-{i}", "description": "benchmark row", "quantity": i,
+         "is_active": True, "created_at": datetime.utcnow(), "warehouse_id": 1 + i % 100}
+        for i in range(max(args.sizes))
+    ])
+    db.commit()
+
+    print(f"encoder={'orjson' if orjson else 'json'}")
+    for size in args.sizes:
+        results = {}
+        for name, path in (("orm", orm_path), ("rows", rows_path)):
+            timings = []
+            for _ in range(args.repeat):
+                # A fresh session so ORM instances are really loaded every time
+                db.expunge_all()
+                started = time.perf_counter()
+                path(db, size)
+                timings.append((time.perf_counter() - started) * 1000)
+            results[name] = statistics.median(timings)
+        print(f"rows={size:>7} orm={results['orm']:.1f}ms rows={results['rows']:.1f}ms "
+              f"speedup={results['orm'] / results['rows']:.1f}x")
+    db.close()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,86 @@
+"""Single transfer latency on a large products table.
+
+Seeds `--products` rows (skipped when the table is already that large) and
+times `--transfers` random transfers through the transfer engine:
+
+    DATABASE_URL=postgresql://... python benchmarks/transfer_latency.py --products 1000000
+"""
+import argparse
+import os
+import random
+import statistics
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+os.environ.setdefault(
+    "DATABASE_URL", f"sqlite:///{os.path.join(tempfile.mkdtemp(), 'bench.db')}"
+)
+
+from sqlalchemy import func, insert  # noqa: E402
+
+from database import Base, SessionLocal, engine  # noqa: E402
+from models.product import Product  # noqa: E402
+from models.user import User  # noqa: E402
+from models.warehouse import Warehouse  # noqa: E402
+from schemas.product import ProductTransfer  # noqa: E402
+from services.transfers import transfer_stock  # noqa: E402
+
+WAREHOUSES = 100
+BATCH = 10000
+
+
+def seed(db, products: int):
+    Base.metadata.create_all(bind=engine)
+    if db.query(func.count(Product.id)).scalar() >= products:
+        return
+    owner = User(email="bench-owner@example.com", password="x", user_type="business")
+    db.add(owner)
+    db.flush()
+    db.execute(insert(Warehouse), [
+        {"name": f"bench-{i}", "location": "bench", "capacity": 10 ** 9,
+         "rental_price": 1.0, "warehouse_type": "bench", "owner_id": owner.id}
+        for i in range(WAREHOUSES)
+    ])
+    warehouse_ids = [id for (id,) in db.query(Warehouse.id).filter(Warehouse.owner_id == owner.id)]
+    for start in range(0, products, BATCH):
+        db.execute(insert(Product), [
+            {"name": f"sku-{i // WAREHOUSES}", "description": None, "quantity": 1000,
+             "warehouse_id": warehouse_ids[i % WAREHOUSES]}
+            for i in range(start, min(start + BATCH, products))
+        ])
+        db.commit()
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--products", type=int, default=1_000_000)
+    parser.add_argument("--transfers", type=int, default=1000)
+    args = parser.parse_args()
+
+    db = SessionLocal()
+    seed(db, args.products)
+    rows = db.query(Product.id, Product.warehouse_id).order_by(func.random()).limit(args.transfers).all()
+    warehouse_ids = [id for (id,) in db.query(Warehouse.id)]
+
+    timings = []
+    for product_id, warehouse_id in rows:
+        target = random.choice([id for id in warehouse_ids[:10] if id != warehouse_id])
+        started = time.perf_counter()
+        transfer_stock(db, ProductTransfer(
+            product_id=product_id, from_warehouse_id=warehouse_id,
+            to_warehouse_id=target, quantity=1
+        ))
+        timings.append((time.perf_counter() - started) * 1000)
+    db.close()
+
+    timings.sort()
+    print(f"products={args.products} transfers={len(timings)}")
+    print(f"p50={statistics.median(timings):.2f}ms "
+          f"p95={timings[int(len(timings) * 0.95) - 1]:.2f}ms "
+          f"p99={timings[int(len(timings) * 0.99) - 1]:.2f}ms")
+
+
+if __name__ == "__main__":
+    main()
@@ -1,16 +1,115 @@
-from sqlalchemy import create_engine
+from typing import Any, Callable
+
+from sqlalchemy import DDL, String, create_engine, event, func, text, type_coerce
+from sqlalchemy.engine import make_url
 from sqlalchemy.ext.declarative import declarative_base
-from sqlalchemy.orm import sessionmaker
+from sqlalchemy.orm import Session, sessionmaker
+from sqlalchemy.pool import NullPool
+from starlette.concurrency import run_in_threadpool
+
+from config import (
+    ASYNC_DATABASE_URL,
+    DATABASE_URL,
+    DB_ASYNC,
+    DB_MAX_OVERFLOW,
+    DB_PGBOUNCER,
+    DB_POOL_PRE_PING,
+    DB_POOL_RECYCLE,
+    DB_POOL_SIZE,
+    DB_POOL_TIMEOUT,
+    DB_POOL_USE_LIFO,
+)
+from services.pool_metrics import InstrumentedAsyncQueuePool, InstrumentedQueuePool
+
+
+def engine_options(url, pool_class):
+    """Pool settings from config.py for a sync or async engine."""
+    url = make_url(url)
+    if url.get_backend_name() == "sqlite" and url.database in (None, "", ":memory:"):
+        # In-memory SQLite needs SQLAlchemy's single-connection pool
+        return {}
+    if DB_PGBOUNCER:
+        # PgBouncer does the pooling; keep nothing open between checkouts
+        options = {"poolclass": NullPool, "pool_pre_ping": DB_POOL_PRE_PING}
+        if url.get_driver_name() == "asyncpg":
+            # Server-side prepared statements break under transaction pooling
+            options["connect_args"] = {"statement_cache_size": 0}
+        return options
+    return {
+        "poolclass": pool_class,
+        "pool_size": DB_POOL_SIZE,
+        "max_overflow": DB_MAX_OVERFLOW,
+        "pool_timeout": DB_POOL_TIMEOUT,
+        "pool_recycle": DB_POOL_RECYCLE,
+        "pool_pre_ping": DB_POOL_PRE_PING,
+        "pool_use_lifo": DB_POOL_USE_LIFO,
+    }
 
-from config import DATABASE_URL
 
 # SQLAlchemy bağlantısı
-engine = create_engine(DATABASE_URL)
+engine = create_engine(DATABASE_URL, **engine_options(DATABASE_URL, InstrumentedQueuePool))
 SessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=engine)
 
+# Async mod: asyncpg/aiosqlite üzerinden AsyncEngine
+async_engine = None
+AsyncSessionLocal = None
+if DB_ASYNC:
+    from sqlalchemy.ext.asyncio import async_sessionmaker, create_async_engine
+
+    async_url = make_url(ASYNC_DATABASE_URL)
+    if DB_PGBOUNCER and async_url.get_driver_name() == "asyncpg":
+        # SQLAlchemy's own prepared statement cache must be off as well
+        async_url = async_url.update_query_dict({"prepared_statement_cache_size": "0"})
+    async_engine = create_async_engine(
+        async_url, **engine_options(async_url, InstrumentedAsyncQueuePool)
+    )
+    # Objects are serialized after the session work finished, outside the
+    # greenlet, so they must not expire on commit
+    AsyncSessionLocal = async_sessionmaker(
+        async_engine, autocommit=False, autoflush=False, expire_on_commit=False
+    )
+
 # Base model class
 Base = declarative_base()
 
+# Trigram indexes declared on the models need the pg_trgm extension
+event.listen(
+    Base.metadata,
+    "before_create",
+    DDL("CREATE EXTENSION IF NOT EXISTS pg_trgm").execute_if(dialect="postgresql")
+)
+
+
+def search_document(*columns):
+    """Full-text document over `columns`, usable both in a GIN index and in queries.
+
+    Constants are rendered as inline SQL text so the expression in a query is
+    exactly the indexed one (and the index still finds its table).
+    """
+    def sql(value):
+        return type_coerce(text(value), String)
+
+    document = func.coalesce(columns[0], sql("''"))
+    for column in columns[1:]:
+        document = document + sql("' '") + func.coalesce(column, sql("''"))
+    return func.to_tsvector(text("'simple'"), document)
+
+
+def begin_write(db: Session) -> None:
+    """Take the write lock up front on SQLite, which ignores FOR UPDATE.
+
+    pysqlite only opens a transaction at the first INSERT/UPDATE/DELETE, so
+    rows read before it could change underneath; BEGIN IMMEDIATE keeps them
+    stable the way row locks do on PostgreSQL. Must run before the first
+    write of the transaction.
+    """
+    if db.get_bind().dialect.name != "sqlite":
+        return
+    connection = db.connection().connection.dbapi_connection
+    if not getattr(connection, "in_transaction", False):
+        db.execute(text("BEGIN IMMEDIATE"))
+
+
 # Database session için Dependency
 def get_db():
     db = SessionLocal()
@@ -19,6 +118,40 @@ def get_db():
     finally:
         db.close() 
 
+
+class Database:
+    """Request-scoped handle that runs session work in the configured mode.
+
+    Handlers pass a plain function taking a `Session`. In sync mode it runs
+    on the threadpool; in async mode it runs through `AsyncSession.run_sync`
+    on the event loop, so every query goes through asyncpg without blocking
+    a thread.
+    """
+
+    def __init__(self, session):
+        self.session = session
+
+    async def run(self, fn: Callable[..., Any], *args, **kwargs) -> Any:
+        if DB_ASYNC:
+            return await self.session.run_sync(fn, *args, **kwargs)
+        return await run_in_threadpool(fn, self.session, *args, **kwargs)
+
+    async def close(self):
+        """Return the connection to the pool; the handle stays usable."""
+        if DB_ASYNC:
+            await self.session.close()
+        else:
+            await run_in_threadpool(self.session.close)
+
+
+# Async handler'lar için Dependency
+async def get_database():
+    database = Database(AsyncSessionLocal() if DB_ASYNC else SessionLocal())
+    try:
+        yield database
+    finally:
+        await database.close()
+
 # --- Veritabanı bağlantı testi ---
 if __name__ == "__main__":
     try:
@@ -1,3 +1,5 @@
+import asyncio
+
 from fastapi import FastAPI, Depends, HTTPException
 from fastapi.middleware.cors import CORSMiddleware
 from sqlalchemy.orm import Session
@@ -6,21 +8,50 @@ from database import get_db
 from models.user import User
 from models.warehouse import Warehouse
 from models.product import Product  # Import Product model
-from database import Base, engine
-from routers import auth, warehouse, product, user
-from fastapi.staticfiles import StaticFiles
-
+from models.warehouse_stock import WarehouseStock
+from models.stock_movement import StockMovement, StockSnapshot
+from models.job import Job
+from config import FORECAST_INTERVAL_SECONDS, JOB_WORKERS, STOCK_SNAPSHOT_INTERVAL_SECONDS
+from database import async_engine, engine
+from routers import auth, warehouse, product, user, uploads, changes, jobs
+from services.change_feed import change_broker
+from services.dataloader import MISSING_IDS_HEADER
+from services.forecasting import forecaster, refresh_periodically
+from services.ledger import snapshot_periodically
+from services.idempotency import REPLAYED_HEADER, IdempotencyMiddleware
+from services.jobs import job_runner
+from services.pagination import NEXT_CURSOR_HEADER
+from services.passwords import shutdown_executor
+from services.pool_metrics import pool_status
+from services.readiness import readiness
+from services.instrumentation import MetricsMiddleware, instrument_engine
+from services.metrics import render_metrics
+from services.serialization import JSONResponseClass
+from services.uploads import UploadLimitMiddleware
+from fastapi.responses import PlainTextResponse
 
-Base.metadata.create_all(bind=engine)
+# The schema is created and upgraded by scripts/migrate.py, once per deploy,
+# so starting a worker does not touch the database
 
-app = FastAPI(title="Smart Stock API", description="Stock Management API built with FastAPI")
-app.mount("/uploads", StaticFiles(directory="uploads"), name="uploads")
+app = FastAPI(
+    title="Smart Stock API",
+    description="Stock Management API built with FastAPI",
+    default_response_class=JSONResponseClass
+)
 
 # Include routers
 app.include_router(auth.router)
 app.include_router(warehouse.router)
 app.include_router(product.router)
 app.include_router(user.router)
+app.include_router(uploads.router)
+app.include_router(changes.router)
+app.include_router(jobs.router)
+
+# Innermost, so replayed responses still get CORS headers
+app.add_middleware(IdempotencyMiddleware)
+# Before the multipart form of an upload is spooled
+app.add_middleware(UploadLimitMiddleware)
 
 # CORS middleware setup
 app.add_middleware(
@@ -29,7 +60,38 @@ app.add_middleware(
     allow_credentials=True,
     allow_methods=["*"],
     allow_headers=["*"],
+    expose_headers=[NEXT_CURSOR_HEADER, REPLAYED_HEADER, MISSING_IDS_HEADER],
 )
+app.add_middleware(MetricsMiddleware)
+
+instrument_engine(engine, "sync")
+if async_engine is not None:
+    instrument_engine(async_engine.sync_engine, "async")
+
+async def warm_up():
+    await readiness.warm_up()
+    # Jobs are claimed only once the schema they live in is known to exist
+    if JOB_WORKERS > 0:
+        job_runner.start()
+
+@app.on_event("startup")
+async def startup():
+    change_broker.start()
+    asyncio.ensure_future(warm_up())
+    if STOCK_SNAPSHOT_INTERVAL_SECONDS > 0:
+        asyncio.ensure_future(snapshot_periodically(STOCK_SNAPSHOT_INTERVAL_SECONDS))
+    if FORECAST_INTERVAL_SECONDS > 0 and forecaster.available:
+        asyncio.ensure_future(refresh_periodically(FORECAST_INTERVAL_SECONDS))
+
+@app.on_event("shutdown")
+async def shutdown():
+    change_broker.stop()
+    if JOB_WORKERS > 0:
+        # Waits for running jobs; long ones are interrupted and requeued
+        await asyncio.get_running_loop().run_in_executor(None, job_runner.stop)
+    shutdown_executor()
+    if async_engine is not None:
+        await async_engine.dispose()
 
 @app.get("/")
 def read_root():
@@ -39,6 +101,27 @@ def read_root():
 def health_check():
     return {"status": "healthy"}
 
+@app.get("/ready")
+def ready():
+    # Unlike /health, only 200 once the pools are warm and the schema is current
+    return JSONResponseClass(readiness.report(), status_code=200 if readiness.ready else 503)
+
+@app.get("/health/pool")
+def pool_health():
+    pools = {"sync": pool_status(engine.pool)}
+    if async_engine is not None:
+        pools["async"] = pool_status(async_engine.pool)
+    return pools
+
+@app.get("/metrics", response_class=PlainTextResponse)
+def metrics():
+    # Prometheus text exposition format
+    return PlainTextResponse(render_metrics(), media_type="text/plain; version=0.0.4")
+
 if __name__ == "__main__":
     import uvicorn
+    import migrations
+
+    # Development server: migrate first, as a deploy would
+    migrations.upgrade(engine)
     uvicorn.run("main:app", host="0.0.0.0", port=8000, reload=True) 
\ No newline at end of file
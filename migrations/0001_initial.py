@@ -0,0 +1,52 @@
+"""Baseline: the users, warehouses and products tables as first deployed.
+
+Written out here rather than taken from the models, so a fresh database
+goes through the same steps as one created before migrations existed,
+whose tables this leaves alone. Everything added since comes in the
+later migrations.
+"""
+from datetime import datetime
+
+from sqlalchemy import Boolean, Column, DateTime, Float, ForeignKey, Integer, MetaData, String, Table
+
+metadata = MetaData()
+Table(
+    "users", metadata,
+    Column("id", Integer, primary_key=True, index=True),
+    Column("email", String, unique=True, index=True),
+    Column("password", String, nullable=False),
+    Column("full_name", String, nullable=True),
+    Column("office_address", String, nullable=True),
+    Column("phone_number", String, nullable=True),
+    Column("image_path", String, nullable=True),
+    Column("user_type", String),
+    Column("is_active", Boolean, default=True),
+    Column("created_at", DateTime, default=datetime.utcnow),
+)
+Table(
+    "warehouses", metadata,
+    Column("id", Integer, primary_key=True, index=True),
+    Column("name", String, index=True),
+    Column("location", String),
+    Column("capacity", Integer),
+    Column("rental_price", Float),
+    Column("warehouse_type", String),
+    Column("used_by_company", String, nullable=True),
+    Column("is_available", Boolean, default=True),
+    Column("created_at", DateTime, default=datetime.utcnow),
+    Column("owner_id", Integer, ForeignKey("users.id")),
+)
+Table(
+    "products", metadata,
+    Column("id", Integer, primary_key=True, index=True),
+    Column("name", String, index=True),
+    Column("description", String, nullable=True),
+    Column("quantity", Integer, default=0),
+    Column("is_active", Boolean, default=True),
+    Column("created_at", DateTime, default=datetime.utcnow),
+    Column("warehouse_id", Integer, ForeignKey("warehouses.id")),
+)
+
+
+def upgrade(connection):
+    metadata.create_all(bind=connection)
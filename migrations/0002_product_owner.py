@@ -0,0 +1,42 @@
+"""products.owner_id for tenant scoping, copied from each product's warehouse.
+
+Also repairs rows whose owner drifted from their warehouse (products
+without one keep theirs), then builds the owner indexes of both tables.
+The tables are described as they are at this version, not imported from
+the models, which keep changing.
+"""
+from sqlalchemy import Column, ForeignKey, Index, Integer, MetaData, Table, inspect, select, text, update
+
+from migrations import create_indexes
+
+metadata = MetaData()
+users = Table("users", metadata, Column("id", Integer, primary_key=True))
+warehouses = Table(
+    "warehouses", metadata,
+    Column("id", Integer, primary_key=True),
+    Column("owner_id", Integer, ForeignKey("users.id")),
+    Index("ix_warehouses_owner_id_id", "owner_id", "id"),
+)
+products = Table(
+    "products", metadata,
+    Column("id", Integer, primary_key=True),
+    Column("warehouse_id", Integer, ForeignKey("warehouses.id")),
+    Column("owner_id", Integer, ForeignKey("users.id"), nullable=True),
+    Index("ix_products_owner_id_id", "owner_id", "id"),
+    Index("ix_products_owner_id_warehouse_id_id", "owner_id", "warehouse_id", "id"),
+)
+
+OWNER_INDEXES = ("ix_warehouses_owner_id_id", "ix_products_owner_id_id", "ix_products_owner_id_warehouse_id_id")
+
+
+def upgrade(connection):
+    if "owner_id" not in {column["name"] for column in inspect(connection).get_columns("products")}:
+        connection.execute(text("ALTER TABLE products ADD COLUMN owner_id INTEGER REFERENCES users (id)"))
+
+    owner = select(warehouses.c.owner_id).where(warehouses.c.id == products.c.warehouse_id).scalar_subquery()
+    connection.execute(
+        update(products)
+        .where(products.c.warehouse_id.isnot(None), products.c.owner_id.is_distinct_from(owner))
+        .values(owner_id=owner)
+    )
+    create_indexes(connection, (warehouses, products), OWNER_INDEXES)
@@ -0,0 +1,57 @@
+"""Unique product identity: (warehouse, name, description) per product.
+
+Existing duplicates (NULL and '' descriptions count as the same) are
+folded into their lowest id with the summed quantity before the unique
+index is built. The products table is described as it is at this
+version, not imported from the models.
+"""
+from sqlalchemy import (
+    Column, ForeignKey, Index, Integer, MetaData, String, Table, delete, func, literal_column, select, update
+)
+
+from migrations import create_indexes
+
+metadata = MetaData()
+Table("warehouses", metadata, Column("id", Integer, primary_key=True))
+products = Table(
+    "products", metadata,
+    Column("id", Integer, primary_key=True),
+    Column("name", String),
+    Column("description", String, nullable=True),
+    Column("quantity", Integer),
+    Column("warehouse_id", Integer, ForeignKey("warehouses.id")),
+)
+PRODUCT_IDENTITY = (
+    products.c.warehouse_id,
+    products.c.name,
+    func.coalesce(products.c.description, literal_column("''")),
+)
+Index("uq_products_warehouse_name_description", *PRODUCT_IDENTITY, unique=True)
+
+
+def merge_duplicates(connection) -> int:
+    groups = connection.execute(
+        select(*PRODUCT_IDENTITY).group_by(*PRODUCT_IDENTITY).having(func.count(products.c.id) > 1)
+    ).all()
+    removed = 0
+    for warehouse_id, name, description in groups:
+        rows = connection.execute(
+            select(products.c.id, products.c.quantity).where(
+                products.c.warehouse_id == warehouse_id,
+                products.c.name == name,
+                PRODUCT_IDENTITY[2] == description
+            ).order_by(products.c.id)
+        ).all()
+        keeper, duplicates = rows[0].id, [row.id for row in rows[1:]]
+        connection.execute(
+            update(products).where(products.c.id == keeper)
+            .values(quantity=sum(row.quantity or 0 for row in rows))
+        )
+        connection.execute(delete(products).where(products.c.id.in_(duplicates)))
+        removed += len(duplicates)
+    return removed
+
+
+def upgrade(connection):
+    merge_duplicates(connection)
+    create_indexes(connection, (products,), ("uq_products_warehouse_name_description",))
@@ -0,0 +1,51 @@
+"""Keyset pagination index of products and the PostgreSQL search indexes."""
+from sqlalchemy import Column, Index, Integer, MetaData, String, Table, text
+
+from database import search_document
+from migrations import create_indexes
+
+metadata = MetaData()
+products = Table(
+    "products", metadata,
+    Column("id", Integer, primary_key=True),
+    Column("name", String),
+    Column("description", String),
+    Column("warehouse_id", Integer),
+    Index("ix_products_warehouse_id_id", "warehouse_id", "id"),
+)
+warehouses = Table(
+    "warehouses", metadata,
+    Column("id", Integer, primary_key=True),
+    Column("name", String),
+    Column("location", String),
+)
+# The expressions must stay those of services.search for the planner to use the indexes
+Index(
+    "ix_products_name_trgm", products.c.name,
+    postgresql_using="gin", postgresql_ops={"name": "gin_trgm_ops"}
+)
+Index(
+    "ix_products_search_document", search_document(products.c.name, products.c.description),
+    postgresql_using="gin"
+)
+Index(
+    "ix_warehouses_name_trgm", warehouses.c.name,
+    postgresql_using="gin", postgresql_ops={"name": "gin_trgm_ops"}
+)
+Index(
+    "ix_warehouses_search_document", search_document(warehouses.c.name, warehouses.c.location),
+    postgresql_using="gin"
+)
+
+SEARCH_INDEXES = (
+    "ix_products_name_trgm", "ix_products_search_document",
+    "ix_warehouses_name_trgm", "ix_warehouses_search_document",
+)
+
+
+def upgrade(connection):
+    create_indexes(connection, (products,), ("ix_products_warehouse_id_id",))
+    if connection.dialect.name == "postgresql":
+        # Other databases search with the in-memory index
+        connection.execute(text("CREATE EXTENSION IF NOT EXISTS pg_trgm"))
+        create_indexes(connection, (products, warehouses), SEARCH_INDEXES)
@@ -0,0 +1,42 @@
+"""Per-warehouse stock counters, backfilled from the products table.
+
+Counters already kept by a running deployment are recomputed as well, so
+whatever drifted before this migration is repaired too.
+"""
+from datetime import datetime
+
+from sqlalchemy import (
+    BigInteger, Column, DateTime, ForeignKey, Integer, MetaData, Table, case, delete, func, insert, literal, select
+)
+
+metadata = MetaData()
+warehouses = Table("warehouses", metadata, Column("id", Integer, primary_key=True))
+products = Table(
+    "products", metadata,
+    Column("id", Integer, primary_key=True),
+    Column("quantity", Integer),
+    Column("warehouse_id", Integer, ForeignKey("warehouses.id")),
+)
+warehouse_stock = Table(
+    "warehouse_stock", metadata,
+    Column("warehouse_id", Integer, ForeignKey("warehouses.id", ondelete="CASCADE"), primary_key=True),
+    Column("total_quantity", BigInteger, default=0, nullable=False),
+    Column("sku_count", Integer, default=0, nullable=False),
+    Column("updated_at", DateTime, default=datetime.utcnow, onupdate=datetime.utcnow),
+)
+
+
+def upgrade(connection):
+    warehouse_stock.create(connection, checkfirst=True)
+    totals = select(
+        warehouses.c.id,
+        func.coalesce(func.sum(products.c.quantity), 0),
+        func.coalesce(func.sum(case((products.c.quantity > 0, 1), else_=0)), 0),
+        literal(datetime.utcnow(), DateTime),
+    ).select_from(
+        warehouses.outerjoin(products, products.c.warehouse_id == warehouses.c.id)
+    ).group_by(warehouses.c.id)
+    connection.execute(delete(warehouse_stock))
+    connection.execute(insert(warehouse_stock).from_select(
+        ["warehouse_id", "total_quantity", "sku_count", "updated_at"], totals
+    ))
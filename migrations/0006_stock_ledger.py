@@ -0,0 +1,35 @@
+"""The stock movement ledger and its periodic snapshots.
+
+Stock moved before this migration has no movements; the first snapshot
+taken afterwards is the starting point of point-in-time reads.
+"""
+from datetime import datetime
+
+from sqlalchemy import JSON, BigInteger, Column, DateTime, Index, Integer, MetaData, String, Table
+
+metadata = MetaData()
+Table(
+    "stock_movements", metadata,
+    Column("id", BigInteger().with_variant(Integer, "sqlite"), primary_key=True),
+    Column("product_id", Integer, nullable=False),
+    Column("warehouse_id", Integer, nullable=False),
+    Column("delta", Integer, nullable=False),
+    Column("quantity", Integer, nullable=False),
+    Column("kind", String(20), nullable=False),
+    Column("created_at", DateTime, default=datetime.utcnow, nullable=False),
+    Index("ix_stock_movements_warehouse_id_created_at", "warehouse_id", "created_at"),
+    Index("ix_stock_movements_warehouse_id_id", "warehouse_id", "id"),
+    Index("ix_stock_movements_product_id_id", "product_id", "id"),
+)
+Table(
+    "stock_snapshots", metadata,
+    Column("id", Integer, primary_key=True),
+    Column("warehouse_id", Integer, nullable=False),
+    Column("taken_at", DateTime, nullable=False),
+    Column("data", JSON, nullable=False),
+    Index("ix_stock_snapshots_warehouse_id_taken_at", "warehouse_id", "taken_at"),
+)
+
+
+def upgrade(connection):
+    metadata.create_all(bind=connection)
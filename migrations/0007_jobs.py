@@ -0,0 +1,33 @@
+"""The jobs table, the queue of the background workers."""
+from datetime import datetime
+
+from sqlalchemy import JSON, Column, DateTime, ForeignKey, Index, Integer, MetaData, String, Table, Text
+
+metadata = MetaData()
+Table("users", metadata, Column("id", Integer, primary_key=True))
+jobs = Table(
+    "jobs", metadata,
+    Column("id", Integer, primary_key=True),
+    Column("type", String(50), nullable=False),
+    Column("status", String(20), nullable=False, default="queued"),
+    Column("payload", JSON, nullable=False),
+    Column("result", JSON, nullable=True),
+    Column("error", Text, nullable=True),
+    Column("attempts", Integer, nullable=False, default=0),
+    Column("max_attempts", Integer, nullable=False),
+    Column("progress_done", Integer, nullable=False, default=0),
+    Column("progress_total", Integer, nullable=True),
+    Column("owner_id", Integer, ForeignKey("users.id"), nullable=True),
+    Column("run_after", DateTime, nullable=False, default=datetime.utcnow),
+    Column("worker", String(100), nullable=True),
+    Column("heartbeat_at", DateTime, nullable=True),
+    Column("created_at", DateTime, default=datetime.utcnow),
+    Column("started_at", DateTime, nullable=True),
+    Column("finished_at", DateTime, nullable=True),
+    Index("ix_jobs_status_run_after", "status", "run_after"),
+    Index("ix_jobs_owner_id_id", "owner_id", "id"),
+)
+
+
+def upgrade(connection):
+    jobs.create(connection, checkfirst=True)
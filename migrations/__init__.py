@@ -0,0 +1,80 @@
+"""Schema migrations, applied once per deploy by scripts/migrate.py.
+
+Every module named NNNN_description.py in this package is a migration
+with an `upgrade(connection)` function; they run in version order, each
+recorded in schema_migrations, all in one transaction. On PostgreSQL an
+advisory lock serializes concurrent runs, so starting several deploy
+jobs at once is harmless.
+"""
+import importlib
+import pkgutil
+import re
+from datetime import datetime
+from typing import Iterable, List, Tuple
+
+from sqlalchemy import Column, DateTime, Integer, MetaData, String, Table, inspect, insert, select, text
+from sqlalchemy.schema import CreateIndex
+
+# Kept out of Base.metadata, the models never see it
+schema_migrations = Table(
+    "schema_migrations",
+    MetaData(),
+    Column("version", Integer, primary_key=True),
+    Column("name", String(100), nullable=False),
+    Column("applied_at", DateTime, nullable=False),
+)
+
+MIGRATION_NAME = re.compile(r"^(\d{4})_\w+$")
+# pg_advisory_xact_lock key, any constant shared by all runners
+LOCK_KEY = 7_421_031
+
+
+def migrations() -> List[Tuple[int, str]]:
+    """(version, module name) of every migration, oldest first."""
+    found = []
+    for module in pkgutil.iter_modules(__path__):
+        match = MIGRATION_NAME.match(module.name)
+        if match:
+            found.append((int(match.group(1)), module.name))
+    return sorted(found)
+
+
+def applied_versions(connection) -> set:
+    if not inspect(connection).has_table(schema_migrations.name):
+        return set()
+    return set(connection.scalars(select(schema_migrations.c.version)))
+
+
+def pending(connection) -> List[str]:
+    """Names of the migrations the database has not had yet."""
+    applied = applied_versions(connection)
+    return [name for version, name in migrations() if version not in applied]
+
+
+def create_indexes(connection, tables: Iterable[Table], names: Iterable[str]) -> None:
+    """Create the named indexes of `tables` that the database lacks."""
+    names = set(names)
+    for table in tables:
+        for index in table.indexes:
+            if index.name in names:
+                # Reflection cannot see expression indexes, so checkfirst would miss them
+                connection.execute(CreateIndex(index, if_not_exists=True))
+
+
+def upgrade(engine) -> List[str]:
+    """Apply every pending migration; returns the names of those applied."""
+    done = []
+    with engine.begin() as connection:
+        if connection.dialect.name == "postgresql":
+            connection.execute(text("SELECT pg_advisory_xact_lock(:key)"), {"key": LOCK_KEY})
+        schema_migrations.create(connection, checkfirst=True)
+        applied = applied_versions(connection)
+        for version, name in migrations():
+            if version in applied:
+                continue
+            importlib.import_module(f"{__name__}.{name}").upgrade(connection)
+            connection.execute(insert(schema_migrations).values(
+                version=version, name=name, applied_at=datetime.utcnow()
+            ))
+            done.append(name)
+    return done
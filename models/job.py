@@ -0,0 +1,43 @@
+from sqlalchemy import JSON, Column, DateTime, ForeignKey, Index, Integer, String, Text
+from datetime import datetime
+
+from database import Base
+
+QUEUED = "queued"
+RUNNING = "running"
+SUCCEEDED = "succeeded"
+FAILED = "failed"
+
+
+class Job(Base):
+    """Work run by the background workers instead of inside a request.
+
+    Rows are the queue: a worker claims a queued job whose `run_after`
+    has passed, or a running one whose worker stopped sending heartbeats.
+    """
+
+    __tablename__ = "jobs"
+    __table_args__ = (
+        # Claiming: WHERE status = ? AND run_after <= ? ORDER BY run_after
+        Index("ix_jobs_status_run_after", "status", "run_after"),
+        Index("ix_jobs_owner_id_id", "owner_id", "id"),
+    )
+
+    id = Column(Integer, primary_key=True)
+    type = Column(String(50), nullable=False)
+    status = Column(String(20), nullable=False, default=QUEUED)
+    payload = Column(JSON, nullable=False)
+    result = Column(JSON, nullable=True)
+    error = Column(Text, nullable=True)
+    attempts = Column(Integer, nullable=False, default=0)
+    max_attempts = Column(Integer, nullable=False)
+    progress_done = Column(Integer, nullable=False, default=0)
+    progress_total = Column(Integer, nullable=True)
+    # User who enqueued the job; it runs scoped to that tenant
+    owner_id = Column(Integer, ForeignKey("users.id"), nullable=True)
+    run_after = Column(DateTime, nullable=False, default=datetime.utcnow)
+    worker = Column(String(100), nullable=True)
+    heartbeat_at = Column(DateTime, nullable=True)
+    created_at = Column(DateTime, default=datetime.utcnow)
+    started_at = Column(DateTime, nullable=True)
+    finished_at = Column(DateTime, nullable=True)
@@ -1,12 +1,19 @@
-from sqlalchemy import Boolean, Column, Integer, String, DateTime, ForeignKey
+from sqlalchemy import Boolean, Column, Integer, String, DateTime, ForeignKey, Index, func, literal_column
 from sqlalchemy.orm import relationship
 from datetime import datetime
 
-from database import Base
+from database import Base, search_document
 
 
 class Product(Base):
     __tablename__ = "products"
+    __table_args__ = (
+        # Keyset pagination inside a warehouse: WHERE warehouse_id = ? AND id > ?
+        Index("ix_products_warehouse_id_id", "warehouse_id", "id"),
+        # Owner scoping: WHERE owner_id = ? AND id > ?, and per warehouse inside it
+        Index("ix_products_owner_id_id", "owner_id", "id"),
+        Index("ix_products_owner_id_warehouse_id_id", "owner_id", "warehouse_id", "id"),
+    )
 
     id = Column(Integer, primary_key=True, index=True)
     name = Column(String, index=True)
@@ -17,6 +24,29 @@ class Product(Base):
     
     # Foreign key
     warehouse_id = Column(Integer, ForeignKey("warehouses.id"))
+    # Copy of the warehouse's owner_id, kept in sync by services.tenancy
+    owner_id = Column(Integer, ForeignKey("users.id"), nullable=True)
     
     # Relationship
-    warehouse = relationship("Warehouse", back_populates="products") 
\ No newline at end of file
+    warehouse = relationship("Warehouse", back_populates="products")
+
+
+# A product is identified by its name and description inside a warehouse.
+# NULL descriptions are folded to '' so they collide like any other value.
+PRODUCT_IDENTITY = (
+    Product.warehouse_id,
+    Product.name,
+    func.coalesce(Product.description, literal_column("''")),
+)
+Index("uq_products_warehouse_name_description", *PRODUCT_IDENTITY, unique=True)
+
+# Search: trigram index for prefix/fuzzy matching on the name and a full-text
+# index over name and description. Other databases use the in-memory index.
+PRODUCT_SEARCH_DOCUMENT = search_document(Product.name, Product.description)
+Index(
+    "ix_products_name_trgm", Product.name,
+    postgresql_using="gin", postgresql_ops={"name": "gin_trgm_ops"}
+).ddl_if(dialect="postgresql")
+Index(
+    "ix_products_search_document", PRODUCT_SEARCH_DOCUMENT, postgresql_using="gin"
+).ddl_if(dialect="postgresql")
@@ -0,0 +1,52 @@
+from sqlalchemy import JSON, BigInteger, Column, Integer, String, DateTime, Index
+from datetime import datetime
+
+from database import Base
+
+# 64-bit ids on real databases; SQLite only autoincrements INTEGER keys
+MovementId = BigInteger().with_variant(Integer, "sqlite")
+
+
+class StockMovement(Base):
+    """Append-only ledger of stock changes.
+
+    No foreign keys on purpose: movements outlive the products and
+    warehouses they mention.
+    """
+
+    __tablename__ = "stock_movements"
+    __table_args__ = (
+        # Point-in-time replay: WHERE warehouse_id = ? AND created_at > ? AND created_at <= ?
+        Index("ix_stock_movements_warehouse_id_created_at", "warehouse_id", "created_at"),
+        # History pages: WHERE warehouse_id = ? AND id > ?
+        Index("ix_stock_movements_warehouse_id_id", "warehouse_id", "id"),
+        Index("ix_stock_movements_product_id_id", "product_id", "id"),
+    )
+
+    id = Column(MovementId, primary_key=True)
+    product_id = Column(Integer, nullable=False)
+    warehouse_id = Column(Integer, nullable=False)
+    delta = Column(Integer, nullable=False)
+    # Quantity of the product right after the movement
+    quantity = Column(Integer, nullable=False)
+    kind = Column(String(20), nullable=False)
+    created_at = Column(DateTime, default=datetime.utcnow, nullable=False)
+
+
+class StockSnapshot(Base):
+    """Quantities of every product of a warehouse at `taken_at`.
+
+    Covers exactly the movements created up to `taken_at`, so the stock at
+    any later time is this snapshot plus the movements after it.
+    """
+
+    __tablename__ = "stock_snapshots"
+    __table_args__ = (
+        Index("ix_stock_snapshots_warehouse_id_taken_at", "warehouse_id", "taken_at"),
+    )
+
+    id = Column(Integer, primary_key=True)
+    warehouse_id = Column(Integer, nullable=False)
+    taken_at = Column(DateTime, nullable=False)
+    # {"<product_id>": quantity}, products with no stock left out
+    data = Column(JSON, nullable=False)
@@ -1,12 +1,16 @@
-from sqlalchemy import Boolean, Column, Integer, String, DateTime, Float, ForeignKey
+from sqlalchemy import Boolean, Column, Integer, String, DateTime, Float, ForeignKey, Index
 from sqlalchemy.orm import relationship
 from datetime import datetime
 
-from database import Base
+from database import Base, search_document
 
 
 class Warehouse(Base):
     __tablename__ = "warehouses"
+    __table_args__ = (
+        # Owner scoping with keyset pagination: WHERE owner_id = ? AND id > ?
+        Index("ix_warehouses_owner_id_id", "owner_id", "id"),
+    )
 
     id = Column(Integer, primary_key=True, index=True)
     name = Column(String, index=True)
@@ -21,4 +25,15 @@ class Warehouse(Base):
     
     # Relationship
     products = relationship("Product", back_populates="warehouse")
-    owner = relationship("User", back_populates="warehouses") 
\ No newline at end of file
+    owner = relationship("User", back_populates="warehouses")
+
+
+# Search: see the product indexes
+WAREHOUSE_SEARCH_DOCUMENT = search_document(Warehouse.name, Warehouse.location)
+Index(
+    "ix_warehouses_name_trgm", Warehouse.name,
+    postgresql_using="gin", postgresql_ops={"name": "gin_trgm_ops"}
+).ddl_if(dialect="postgresql")
+Index(
+    "ix_warehouses_search_document", WAREHOUSE_SEARCH_DOCUMENT, postgresql_using="gin"
+).ddl_if(dialect="postgresql")
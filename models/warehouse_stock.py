@@ -0,0 +1,16 @@
+from sqlalchemy import BigInteger, Column, Integer, DateTime, ForeignKey
+from datetime import datetime
+
+from database import Base
+
+
+class WarehouseStock(Base):
+    """Running stock totals per warehouse, kept in step with every stock write."""
+
+    __tablename__ = "warehouse_stock"
+
+    warehouse_id = Column(Integer, ForeignKey("warehouses.id", ondelete="CASCADE"), primary_key=True)
+    total_quantity = Column(BigInteger, default=0, nullable=False)
+    # Products in the warehouse with a positive quantity
+    sku_count = Column(Integer, default=0, nullable=False)
+    updated_at = Column(DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
@@ -1,30 +1,25 @@
 from fastapi import APIRouter, Depends, Form, UploadFile, File, HTTPException, status
 from fastapi.security import OAuth2PasswordBearer, OAuth2PasswordRequestForm
 from sqlalchemy.orm import Session
-from passlib.context import CryptContext
 from jose import JWTError, jwt
+from starlette.concurrency import run_in_threadpool
 from datetime import datetime, timedelta
-import os
 
-from database import get_db
+from database import Database, get_database
 from models.user import User
 from schemas.user import UserCreate, UserRead, Token, TokenData
 from config import SECRET_KEY, ALGORITHM, ACCESS_TOKEN_EXPIRE_MINUTES
-
-import shutil
-import uuid
+from services.auth_cache import cached_claims, principal_cache
+from services.tenancy import set_tenant
+from services.passwords import hash_password, verify_and_upgrade
+from services.jobs import enqueue
+from services.uploads import discard_upload, save_upload
 
 router = APIRouter(prefix="/auth", tags=["authentication"])
 
-# Password hashing
-pwd_context = CryptContext(schemes=["bcrypt"], deprecated="auto")
 oauth2_scheme = OAuth2PasswordBearer(tokenUrl="/auth/login")
 
 
-def verify_password(plain_password, hashed_password):
-    return pwd_context.verify(plain_password, hashed_password)
-
-
 def create_access_token(data: dict, expires_delta: timedelta = None):
     to_encode = data.copy()
     if expires_delta:
@@ -36,15 +31,19 @@ def create_access_token(data: dict, expires_delta: timedelta = None):
     return encoded_jwt
 
 
-async def get_current_user(token: str = Depends(oauth2_scheme), db: Session = Depends(get_db)):
+def decode_token(token: str) -> dict:
+    return jwt.decode(token, SECRET_KEY, algorithms=[ALGORITHM])
+
+
+async def get_current_user(token: str = Depends(oauth2_scheme), database: Database = Depends(get_database)):
     credentials_exception = HTTPException(
         status_code=status.HTTP_401_UNAUTHORIZED,
         detail="Could not validate credentials",
         headers={"WWW-Authenticate": "Bearer"},
     )
     try:
-        # Decode JWT token
-        payload = jwt.decode(token, SECRET_KEY, algorithms=[ALGORITHM])
+        # Decode JWT token (memoized per token)
+        payload = cached_claims(token, decode_token)
         email: str = payload.get("sub")
         if email is None:
             raise credentials_exception
@@ -52,8 +51,11 @@ async def get_current_user(token: str = Depends(oauth2_scheme), db: Session = De
     except JWTError:
         raise credentials_exception
     
-    # Get user from database
-    user = db.query(User).filter(User.email == token_data.email).first()
+    # Get user from the principal cache, falling back to the database
+    user = principal_cache.get(token_data.email)
+    if user is None:
+        user = await database.run(find_user, token_data.email)
+        principal_cache.set(token_data.email, user)
     if user is None:
         raise credentials_exception
     
@@ -65,14 +67,20 @@ async def get_current_user(token: str = Depends(oauth2_scheme), db: Session = De
             headers={"WWW-Authenticate": "Bearer"},
         )
     
+    # Every later query of this request only sees the user's own data
+    set_tenant(database.session, user.id)
     return user
 
 
+def find_user(db: Session, email: str):
+    return db.query(User).filter(User.email == email).first()
+
+
 VALID_USER_TYPES = {"e_commerce", "business", "warehouse_investor"}
 
 
 @router.post("/register", response_model=UserRead, status_code=status.HTTP_201_CREATED)
-def register(
+async def register(
     email: str = Form(...),
     password: str = Form(...),
     full_name: str = Form(None),
@@ -80,67 +88,77 @@ def register(
     phone_number: str = Form(None),
     image: UploadFile = File(None),
     user_type: str = Form(...),
-    db: Session = Depends(get_db)
+    database: Database = Depends(get_database)
 ):
     if user_type not in VALID_USER_TYPES:
         raise HTTPException(
             status_code=status.HTTP_400_BAD_REQUEST,
             detail="Invalid user type. Must be 'e_commerce', 'business', or 'warehouse_investor'."
         )
-    existing_user = db.query(User).filter(User.email == email).first()
+    existing_user = await database.run(find_user, email)
 
     if existing_user:
         raise HTTPException(
             status_code=status.HTTP_400_BAD_REQUEST,
             detail="Email already registered"
         )
-    
-    # Hash the password
-    hashed_password = pwd_context.hash(password)
-    
-    # Create new user
+    # Release the pooled connection while the upload and bcrypt run
+    await database.close()
 
+    # Store the avatar under its content hash; a job makes the thumbnails
+    stored = None
     image_path = None
-    if image:
-        filename = f"{uuid.uuid4().hex}_{image.filename}"
-        upload_dir = "uploads"
-        os.makedirs(upload_dir, exist_ok=True)
-        file_location = os.path.join(upload_dir, filename)
-        with open(file_location, "wb") as f:
-            shutil.copyfileobj(image.file, f)
-        image_path = file_location
+    if image and image.filename:
+        stored = await save_upload(image)
+        image_path = stored.path
 
-    hashed_password = pwd_context.hash(password)
+    try:
+        # Hash the password on the password-hashing pool
+        hashed_password = await hash_password(password)
+
+        # Create new user
+        new_user = User(
+            email=email,
+            password=hashed_password,
+            full_name=full_name,
+            office_address=office_address,
+            phone_number=phone_number,
+            user_type=user_type,
+            image_path=image_path,
+            is_active=True,
+            created_at=datetime.utcnow()
+        )
 
-    
-    new_user = User(
-        email=email,
-        password=hashed_password,
-        full_name=full_name,
-        office_address=office_address,
-        phone_number=phone_number,
-        user_type=user_type,
-        image_path=image_path,
-        is_active=True,
-        created_at=datetime.utcnow()
+        # Add to database
+        def create(db: Session):
+            db.add(new_user)
+            if stored is not None:
+                db.flush()
+                enqueue(db, "uploads.variants", vars(stored), owner_id=new_user.id)
+            db.commit()
+            db.refresh(new_user)
+            return new_user
 
-    )
-    
-    # Add to database
-    db.add(new_user)
-    db.commit()
-    db.refresh(new_user)
-    
-    return new_user
+        return await database.run(create)
+    except BaseException:
+        # No user points at the file, do not leave it behind
+        if stored is not None:
+            await run_in_threadpool(discard_upload, stored)
+        raise
 
 
 @router.post("/login", response_model=Token)
-def login(form_data: OAuth2PasswordRequestForm = Depends(), db: Session = Depends(get_db)):
+async def login(form_data: OAuth2PasswordRequestForm = Depends(), database: Database = Depends(get_database)):
     # Find user by email
-    user = db.query(User).filter(User.email == form_data.username).first()
+    user = await database.run(find_user, form_data.username)
+    # Release the pooled connection while bcrypt runs
+    await database.close()
     
     # Check if user exists and password is correct
-    if not user or not verify_password(form_data.password, user.password):
+    password_ok, upgraded_hash = False, None
+    if user:
+        password_ok, upgraded_hash = await verify_and_upgrade(form_data.password, user.password)
+    if not password_ok:
         raise HTTPException(
             status_code=status.HTTP_401_UNAUTHORIZED,
             detail="Incorrect email or password",
@@ -155,6 +173,14 @@ def login(form_data: OAuth2PasswordRequestForm = Depends(), db: Session = Depend
             headers={"WWW-Authenticate": "Bearer"},
         )
     
+    # Store the stronger hash if the hashing settings changed since signup
+    if upgraded_hash:
+        def upgrade(db: Session):
+            db.query(User).filter(User.id == user.id).update({User.password: upgraded_hash})
+            db.commit()
+
+        await database.run(upgrade)
+    
     # Create access token with user email in subject
     access_token_expires = timedelta(minutes=ACCESS_TOKEN_EXPIRE_MINUTES)
     access_token = create_access_token(
@@ -0,0 +1,124 @@
+import asyncio
+import json
+from typing import List, Optional
+
+from fastapi import APIRouter, Depends, HTTPException, Query, Request, WebSocket, WebSocketDisconnect, status
+from fastapi.responses import StreamingResponse
+from fastapi.security import OAuth2PasswordBearer
+from sqlalchemy.orm import Session
+
+from config import CHANGE_FEED_HEARTBEAT_SECONDS
+from database import Database, get_database
+from models.warehouse import Warehouse
+from routers.auth import get_current_user
+from services.change_feed import change_broker, stream_events
+from services.tenancy import current_tenant
+
+router = APIRouter(prefix="/changes", tags=["changes"])
+
+# EventSource and browser WebSockets cannot send headers, so the token may
+# also come as a query parameter
+optional_bearer = OAuth2PasswordBearer(tokenUrl="/auth/login", auto_error=False)
+
+
+async def authenticate(
+    header_token: Optional[str],
+    query_token: Optional[str],
+    database: Database,
+    warehouse_ids: Optional[List[int]] = None
+) -> Optional[List[int]]:
+    """Check the token and return the warehouses the caller may follow
+    (None for all of them)."""
+    token = header_token or query_token
+    if not token:
+        raise HTTPException(
+            status_code=status.HTTP_401_UNAUTHORIZED,
+            detail="Not authenticated",
+            headers={"WWW-Authenticate": "Bearer"},
+        )
+    await get_current_user(token, database)
+    if current_tenant(database.session) is not None:
+        # Warehouses created after subscribing need a new subscription
+        warehouse_ids = await database.run(visible_warehouses, warehouse_ids)
+    # Streams are long-lived, do not keep a pooled connection for them
+    await database.close()
+    return warehouse_ids
+
+
+def visible_warehouses(db: Session, warehouse_ids: Optional[List[int]]) -> List[int]:
+    query = db.query(Warehouse.id)
+    if warehouse_ids:
+        query = query.filter(Warehouse.id.in_(warehouse_ids))
+    return [id for (id,) in query]
+
+
+@router.get("/stream")
+async def stream_changes(
+    request: Request,
+    warehouse_id: Optional[List[int]] = Query(None),
+    token: Optional[str] = None,
+    header_token: Optional[str] = Depends(optional_bearer),
+    database: Database = Depends(get_database)
+):
+    """Server-Sent Events feed of committed stock changes."""
+    warehouse_id = await authenticate(header_token, token, database, warehouse_id)
+    subscription = change_broker.subscribe(warehouse_id)
+
+    async def events():
+        try:
+            async for batch in stream_events(subscription):
+                if await request.is_disconnected():
+                    break
+                if not batch:
+                    yield ": heartbeat\n\n"
+                for event in batch:
+                    yield f"event: {event['type']}\ndata: {json.dumps(event)}\n\n"
+        finally:
+            change_broker.unsubscribe(subscription)
+
+    return StreamingResponse(
+        events(),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"}
+    )
+
+
+@router.websocket("/ws")
+async def changes_websocket(
+    websocket: WebSocket,
+    warehouse_id: Optional[List[int]] = Query(None),
+    token: Optional[str] = None,
+    database: Database = Depends(get_database)
+):
+    """WebSocket feed of committed stock changes, one JSON array per message."""
+    try:
+        warehouse_id = await authenticate(
+            websocket.headers.get("authorization", "").removeprefix("Bearer ") or None, token, database, warehouse_id
+        )
+    except HTTPException:
+        await websocket.close(code=status.WS_1008_POLICY_VIOLATION)
+        return
+    await websocket.accept()
+    subscription = change_broker.subscribe(warehouse_id)
+    closed = asyncio.ensure_future(wait_closed(websocket))
+    try:
+        while True:
+            # Sending is awaited, so a slow client builds up coalesced events
+            # in its subscription rather than unbounded buffers
+            batch = asyncio.ensure_future(subscription.next_batch(CHANGE_FEED_HEARTBEAT_SECONDS))
+            await asyncio.wait({batch, closed}, return_when=asyncio.FIRST_COMPLETED)
+            if closed.done():
+                batch.cancel()
+                break
+            await websocket.send_text(json.dumps(batch.result()))
+    except WebSocketDisconnect:
+        pass
+    finally:
+        closed.cancel()
+        change_broker.unsubscribe(subscription)
+
+
+async def wait_closed(websocket: WebSocket):
+    # Clients do not send anything; reading only notices the disconnect
+    while (await websocket.receive())["type"] != "websocket.disconnect":
+        pass
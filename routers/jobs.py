@@ -0,0 +1,61 @@
+from fastapi import APIRouter, Depends, HTTPException, Response, status
+from fastapi.exceptions import RequestValidationError
+from pydantic import ValidationError
+from pydantic.error_wrappers import ErrorWrapper
+from sqlalchemy.orm import Session
+
+from database import Database, get_database
+from models.job import Job
+from models.user import User
+from routers.auth import get_current_user
+from schemas.job import JobCreate, JobRead
+from services.jobs import enqueue, job_types
+
+router = APIRouter(prefix="/jobs", tags=["jobs"])
+
+
+def job_location(job_id: int) -> str:
+    return f"/jobs/{job_id}"
+
+
+def create_job(db: Session, type: str, payload, owner_id: int) -> JobRead:
+    job = enqueue(db, type, payload, owner_id=owner_id)
+    db.commit()
+    return JobRead.from_orm(job)
+
+
+@router.post("/", response_model=JobRead, status_code=status.HTTP_202_ACCEPTED)
+async def enqueue_job(
+    job: JobCreate,
+    response: Response,
+    database: Database = Depends(get_database),
+    current_user: User = Depends(get_current_user)
+):
+    job_type = job_types.get(job.type)
+    if job_type is None or job_type.schema is None:
+        raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail=f"Unknown job type: {job.type}")
+    # Rejected now rather than failing on the worker
+    try:
+        payload = job_type.schema.parse_obj(job.payload)
+    except ValidationError as error:
+        raise RequestValidationError([ErrorWrapper(error, ("body", "payload"))])
+
+    created = await database.run(create_job, job.type, payload, current_user.id)
+    response.headers["Location"] = job_location(created.id)
+    return created
+
+
+@router.get("/{job_id}", response_model=JobRead)
+async def get_job(
+    job_id: int,
+    database: Database = Depends(get_database),
+    current_user: User = Depends(get_current_user)
+):
+    def load(db: Session):
+        # Jobs are only visible to the user who enqueued them
+        return db.query(Job).filter(Job.id == job_id, Job.owner_id == current_user.id).first()
+
+    job = await database.run(load)
+    if job is None:
+        raise HTTPException(status_code=404, detail="Job not found")
+    return job
@@ -1,191 +1,302 @@
-from fastapi import APIRouter, Depends, HTTPException, status
+from fastapi import APIRouter, Depends, File, HTTPException, Query, Request, Response, UploadFile, status
+from fastapi.responses import StreamingResponse
+from sqlalchemy.exc import IntegrityError
 from sqlalchemy.orm import Session
 from typing import List, Optional
-from pydantic import BaseModel
 
-from database import get_db
+from config import FORECAST_LEAD_TIME_DAYS
+from database import Database, get_database, get_db
 from models.product import Product
 from models.warehouse import Warehouse
-from schemas.product import ProductCreate, ProductRead
+from schemas.product import (
+    BulkProductTransfer,
+    ProductBatch,
+    ProductBatchGet,
+    ProductCreate,
+    ProductForecast,
+    ProductImportResult,
+    ProductRead,
+    ProductTransfer,
+)
 from routers.auth import get_current_user
 from models.user import User
+from services import search
+from services.dataloader import MISSING_IDS_HEADER, DataLoader, batch_result, get_product_loader, parse_ids
+from services.forecasting import forecaster
+from services.pagination import paginate_by_id, set_next_cursor
+from services.product_io import MEDIA_TYPES, detect_format, import_product_rows, stream_product_rows
+from services.response_cache import bump_product, response_cache
+from services.search import SEARCH_MODE_PATTERN
+from services.serialization import as_dicts
+from services.stock_changes import record_stock_change
+from services.tenancy import set_tenant
+from services.transfers import bulk_transfer_stock, transfer_stock
+from services.warehouse_loader import PRODUCT_COLUMNS
 
 router = APIRouter(prefix="/products", tags=["products"])
 
 
-class ProductTransfer(BaseModel):
-    product_id: int
-    from_warehouse_id: int
-    to_warehouse_id: int
-    quantity: int
+def flush_product(db: Session):
+    try:
+        db.flush()
+    except IntegrityError:
+        db.rollback()
+        raise HTTPException(
+            status_code=status.HTTP_409_CONFLICT,
+            detail="Product with the same name and description already exists in this warehouse"
+        )
 
 
 @router.post("/transfer", response_model=ProductRead)
-def transfer_product(
+async def transfer_product(
     transfer: ProductTransfer,
-    db: Session = Depends(get_db),
+    database: Database = Depends(get_database),
     current_user: User = Depends(get_current_user)
 ):
-    # Check if source warehouse exists and has the product
-    source_product = db.query(Product).filter(
-        Product.id == transfer.product_id,
-        Product.warehouse_id == transfer.from_warehouse_id
-    ).first()
-    
-    if not source_product:
-        raise HTTPException(
-            status_code=status.HTTP_400_BAD_REQUEST,
-            detail="Product not found in source warehouse"
-        )
-    
-    # Check if there's enough quantity
-    if source_product.quantity < transfer.quantity:
-        raise HTTPException(
-            status_code=status.HTTP_400_BAD_REQUEST,
-            detail="Not enough quantity in source warehouse"
-        )
-    
-    # Check if target warehouse exists
-    target_warehouse = db.query(Warehouse).filter(
-        Warehouse.id == transfer.to_warehouse_id
-    ).first()
-    
-    if not target_warehouse:
-        raise HTTPException(
-            status_code=status.HTTP_400_BAD_REQUEST,
-            detail="Target warehouse not found"
-        )
-    
-    # Check if product with same name and description exists in target warehouse
-    target_product = db.query(Product).filter(
-        Product.warehouse_id == transfer.to_warehouse_id,
-        Product.name == source_product.name,
-        Product.description == source_product.description
-    ).first()
-    
-    # Update source product quantity
-    source_product.quantity -= transfer.quantity
-    
-    if target_product:
-        # Update existing product quantity
-        target_product.quantity += transfer.quantity
-        result_product = target_product
-    else:
-        # Create new product in target warehouse
-        new_product = Product(
-            name=source_product.name,
-            description=source_product.description,
-            quantity=transfer.quantity,
-            warehouse_id=transfer.to_warehouse_id,
-            is_active=True
-        )
-        db.add(new_product)
-        result_product = new_product
-    
-    # Save changes
-    db.commit()
-    db.refresh(result_product)
-    
-    return result_product
+    return await database.run(transfer_stock, transfer)
+
+
+@router.post("/transfer/bulk", response_model=List[ProductRead])
+async def bulk_transfer_products(
+    bulk: BulkProductTransfer,
+    database: Database = Depends(get_database),
+    current_user: User = Depends(get_current_user)
+):
+    # All transfers are applied in one transaction, in request order
+    return await database.run(bulk_transfer_stock, bulk.transfers)
 
 
 @router.post("/", response_model=ProductRead, status_code=status.HTTP_201_CREATED)
-def create_product(
+async def create_product(
     product: ProductCreate,
-    db: Session = Depends(get_db),
+    database: Database = Depends(get_database),
     current_user: User = Depends(get_current_user)
 ):
-    # Check if warehouse exists
-    warehouse = db.query(Warehouse).filter(Warehouse.id == product.warehouse_id).first()
-    if not warehouse:
-        raise HTTPException(
-            status_code=status.HTTP_400_BAD_REQUEST,
-            detail="Warehouse not found"
+    def create(db: Session):
+        # Check if warehouse exists
+        warehouse = db.query(Warehouse).filter(Warehouse.id == product.warehouse_id).first()
+        if not warehouse:
+            raise HTTPException(
+                status_code=status.HTTP_400_BAD_REQUEST,
+                detail="Warehouse not found"
+            )
+        
+        # Create new product
+        new_product = Product(**product.dict())
+        
+        # Add to database
+        db.add(new_product)
+        flush_product(db)
+        record_stock_change(
+            db, new_product.id, new_product.warehouse_id,
+            new_product.quantity, new_product.quantity, "create"
         )
-    
-    # Create new product
-    new_product = Product(**product.dict())
-    
-    # Add to database
-    db.add(new_product)
-    db.commit()
-    db.refresh(new_product)
-    
-    return new_product
+        db.commit()
+        bump_product(new_product.id, new_product.warehouse_id)
+        db.refresh(new_product)
+        
+        return new_product
+
+    return await database.run(create)
 
 
 @router.get("/", response_model=List[ProductRead])
-def list_products(
+async def list_products(
+    request: Request,
+    response: Response,
     skip: int = 0,
     limit: int = 100,
+    cursor: Optional[str] = None,
+    warehouse_id: Optional[int] = None,
+    ids: Optional[str] = Query(None, description="Comma separated ids, returned in this order"),
+    database: Database = Depends(get_database),
+    loader: DataLoader = Depends(get_product_loader),
+    current_user: User = Depends(get_current_user)
+):
+    if ids is not None:
+        requested = parse_ids(ids)
+
+        async def produce_batch():
+            # Found products in request order, misses listed in a header
+            items = await loader.load_many(requested)
+            missing = batch_result(requested, items)["missing"]
+            if missing:
+                response.headers[MISSING_IDS_HEADER] = ",".join(map(str, missing))
+            return [item for item in items if item is not None]
+
+        return await response_cache.respond(request, current_user, ["products"], produce_batch, response)
+
+    def load(db: Session):
+        # Column tuples only: no ORM instances and no second validation pass
+        query = db.query(Product).with_entities(*PRODUCT_COLUMNS)
+        if warehouse_id:
+            query = query.filter(Product.warehouse_id == warehouse_id)
+        return paginate_by_id(query, Product.id, cursor, skip, limit).all()
+
+    async def produce():
+        rows = await database.run(load)
+        set_next_cursor(response, rows, limit)
+        return as_dicts(rows)
+
+    return await response_cache.respond(request, current_user, ["products"], produce, response)
+
+
+@router.post("/batch-get", response_model=ProductBatch)
+async def batch_get_products(
+    batch: ProductBatchGet,
+    loader: DataLoader = Depends(get_product_loader),
+    current_user: User = Depends(get_current_user)
+):
+    # One IN query for all ids
+    return batch_result(batch.ids, await loader.load_many(batch.ids))
+
+
+@router.get("/search", response_model=List[ProductRead])
+async def search_products(
+    q: str = Query(..., min_length=1, max_length=200),
+    mode: str = Query("prefix", regex=SEARCH_MODE_PATTERN),
     warehouse_id: Optional[int] = None,
+    skip: int = Query(0, ge=0),
+    limit: int = Query(20, ge=1, le=100),
+    database: Database = Depends(get_database),
+    current_user: User = Depends(get_current_user)
+):
+    # Ranked best match first, so pages are offset-based
+    return await database.run(search.search_products, q, mode, skip, limit, warehouse_id)
+
+
+@router.post("/import", response_model=ProductImportResult)
+def import_products(
+    file: UploadFile = File(...),
+    format: Optional[str] = Query(None, regex="^(csv|ndjson)$"),
     db: Session = Depends(get_db),
     current_user: User = Depends(get_current_user)
 ):
-    query = db.query(Product)
-    if warehouse_id:
-        query = query.filter(Product.warehouse_id == warehouse_id)
-    products = query.offset(skip).limit(limit).all()
-    return products
+    # Parsing is CPU-bound, so imports always run on the threadpool with a
+    # sync session, even in async mode
+    set_tenant(db, current_user.id)
+    fmt = format or detect_format(file.filename, file.content_type)
+    return import_product_rows(db, file.file, fmt)
+
+
+@router.get("/export")
+def export_products(
+    format: str = Query("csv", regex="^(csv|ndjson)$"),
+    warehouse_id: Optional[int] = None,
+    current_user: User = Depends(get_current_user)
+):
+    return StreamingResponse(
+        stream_product_rows(format, warehouse_id, current_user.id),
+        media_type=MEDIA_TYPES[format],
+        headers={"Content-Disposition": f"attachment; filename=products.{format}"}
+    )
 
 
 @router.get("/{product_id}", response_model=ProductRead)
-def get_product(
+async def get_product(
     product_id: int,
-    db: Session = Depends(get_db),
+    request: Request,
+    database: Database = Depends(get_database),
     current_user: User = Depends(get_current_user)
 ):
-    product = db.query(Product).filter(Product.id == product_id).first()
-    if product is None:
+    def load(db: Session):
+        return db.query(Product).filter(Product.id == product_id).first()
+
+    async def produce():
+        product = await database.run(load)
+        if product is None:
+            raise HTTPException(status_code=404, detail="Product not found")
+        return ProductRead.from_orm(product)
+
+    return await response_cache.respond(request, current_user, [f"product:{product_id}"], produce)
+
+
+@router.get("/{product_id}/forecast", response_model=ProductForecast)
+async def get_product_forecast(
+    product_id: int,
+    lead_time_days: Optional[float] = Query(None, gt=0, le=365),
+    database: Database = Depends(get_database),
+    current_user: User = Depends(get_current_user)
+):
+    def visible(db: Session):
+        return db.query(Product.id).filter(Product.id == product_id).first() is not None
+
+    if not await database.run(visible):
         raise HTTPException(status_code=404, detail="Product not found")
-    return product
+    model = await forecaster.fresh()
+    forecast = model.forecast(product_id, lead_time_days)
+    if forecast is None:
+        raise HTTPException(status_code=404, detail="No stock history for this product yet")
+    return ProductForecast(
+        **forecast,
+        lead_time_days=lead_time_days or FORECAST_LEAD_TIME_DAYS,
+        computed_at=model.refreshed_at
+    )
 
 
 @router.put("/{product_id}", response_model=ProductRead)
-def update_product(
+async def update_product(
     product_id: int,
     product_update: ProductCreate,
-    db: Session = Depends(get_db),
+    database: Database = Depends(get_database),
     current_user: User = Depends(get_current_user)
 ):
-    # Get product
-    product = db.query(Product).filter(Product.id == product_id).first()
-    if product is None:
-        raise HTTPException(status_code=404, detail="Product not found")
-    
-    # Check if new warehouse exists
-    if product_update.warehouse_id != product.warehouse_id:
-        warehouse = db.query(Warehouse).filter(Warehouse.id == product_update.warehouse_id).first()
-        if not warehouse:
-            raise HTTPException(
-                status_code=status.HTTP_400_BAD_REQUEST,
-                detail="Warehouse not found"
+    def update(db: Session):
+        # Get product
+        product = db.query(Product).filter(Product.id == product_id).first()
+        if product is None:
+            raise HTTPException(status_code=404, detail="Product not found")
+        
+        # Check if new warehouse exists
+        if product_update.warehouse_id != product.warehouse_id:
+            warehouse = db.query(Warehouse).filter(Warehouse.id == product_update.warehouse_id).first()
+            if not warehouse:
+                raise HTTPException(
+                    status_code=status.HTTP_400_BAD_REQUEST,
+                    detail="Warehouse not found"
+                )
+        
+        # Update product fields
+        old_warehouse_id, old_quantity = product.warehouse_id, product.quantity
+        for field, value in product_update.dict().items():
+            setattr(product, field, value)
+        
+        # Save changes
+        flush_product(db)
+        if product.warehouse_id != old_warehouse_id:
+            record_stock_change(db, product.id, old_warehouse_id, -old_quantity, 0, "update")
+            record_stock_change(db, product.id, product.warehouse_id, product.quantity, product.quantity, "update")
+        elif product.quantity != old_quantity:
+            record_stock_change(
+                db, product.id, product.warehouse_id,
+                product.quantity - old_quantity, product.quantity, "update"
             )
-    
-    # Update product fields
-    for field, value in product_update.dict().items():
-        setattr(product, field, value)
-    
-    # Save changes
-    db.commit()
-    db.refresh(product)
-    
-    return product
+        db.commit()
+        bump_product(product.id, old_warehouse_id, product.warehouse_id)
+        db.refresh(product)
+        
+        return product
+
+    return await database.run(update)
 
 
 @router.delete("/{product_id}", status_code=status.HTTP_204_NO_CONTENT)
-def delete_product(
+async def delete_product(
     product_id: int,
-    db: Session = Depends(get_db),
+    database: Database = Depends(get_database),
     current_user: User = Depends(get_current_user)
 ):
-    # Get product
-    product = db.query(Product).filter(Product.id == product_id).first()
-    if product is None:
-        raise HTTPException(status_code=404, detail="Product not found")
-    
-    # Delete product
-    db.delete(product)
-    db.commit()
-    
+    def delete(db: Session):
+        # Get product
+        product = db.query(Product).filter(Product.id == product_id).first()
+        if product is None:
+            raise HTTPException(status_code=404, detail="Product not found")
+        
+        # Delete product
+        record_stock_change(db, product.id, product.warehouse_id, -product.quantity, 0, "delete")
+        db.delete(product)
+        db.commit()
+        bump_product(product_id, product.warehouse_id)
+
+    await database.run(delete)
     return None 
\ No newline at end of file
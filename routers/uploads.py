@@ -0,0 +1,60 @@
+import os
+import re
+from typing import Optional
+
+from fastapi import APIRouter, HTTPException, Request, Response, status
+from fastapi.responses import FileResponse
+
+from config import AVATAR_SIZES, UPLOAD_DIR
+from services.uploads import variant_path
+
+router = APIRouter(prefix="/uploads", tags=["uploads"])
+
+# Uploads stored under their sha256 never change, anything else may be replaced
+CONTENT_HASHED = re.compile(r"^[0-9a-f]{64}(_\d+)?\.\w+$")
+IMMUTABLE_CACHE = "public, max-age=31536000, immutable"
+REVALIDATE_CACHE = "public, no-cache"
+
+
+def entity_tag(filename: str, stat: os.stat_result) -> str:
+    if CONTENT_HASHED.match(filename):
+        return f'"{os.path.splitext(filename)[0]}"'
+    return f'"{stat.st_mtime_ns:x}-{stat.st_size:x}"'
+
+
+def etag_matches(if_none_match: Optional[str], etag: str) -> bool:
+    if not if_none_match:
+        return False
+    if if_none_match.strip() == "*":
+        return True
+    # Weak comparison, as required for If-None-Match
+    return any(tag.strip().removeprefix("W/") == etag for tag in if_none_match.split(","))
+
+
+@router.get("/{filename}")
+async def get_upload(filename: str, request: Request, size: Optional[int] = None):
+    # Only plain file names inside the upload directory are served
+    if os.path.basename(filename) != filename or filename.startswith("."):
+        raise HTTPException(status_code=404, detail="File not found")
+    path = os.path.join(UPLOAD_DIR, filename)
+    # Until the background job made the variant the original is served, and
+    # must not be cached for good under the variant's URL
+    cacheable = bool(CONTENT_HASHED.match(filename))
+    if size is not None and size in AVATAR_SIZES:
+        if os.path.isfile(variant_path(path, size)):
+            path = variant_path(path, size)
+            filename = os.path.basename(path)
+        else:
+            cacheable = False
+
+    if not os.path.isfile(path):
+        raise HTTPException(status_code=404, detail="File not found")
+    stat = os.stat(path)
+
+    headers = {
+        "ETag": entity_tag(filename, stat),
+        "Cache-Control": IMMUTABLE_CACHE if cacheable else REVALIDATE_CACHE,
+    }
+    if etag_matches(request.headers.get("if-none-match"), headers["ETag"]):
+        return Response(status_code=status.HTTP_304_NOT_MODIFIED, headers=headers)
+    return FileResponse(path, headers=headers, stat_result=stat)
@@ -1,28 +1,40 @@
-from fastapi import APIRouter, Depends, HTTPException, status
+from fastapi import APIRouter, Depends, HTTPException, Query, status
 from sqlalchemy.orm import Session
 from typing import List
 
-from database import get_db
+from database import Database, get_database
 from models.user import User
+from models.warehouse import Warehouse
 from schemas.warehouse import WarehouseRead
 from routers.auth import get_current_user
+from services.serialization import JSONResponseClass
+from services.warehouse_loader import PRODUCT_MODE_PATTERN, WAREHOUSE_COLUMNS, warehouse_rows
 
 router = APIRouter(prefix="/users", tags=["users"])
 
 
 @router.get("/{user_id}/warehouses", response_model=List[WarehouseRead])
-def get_user_warehouses(
+async def get_user_warehouses(
     user_id: int,
-    db: Session = Depends(get_db),
+    products: str = Query("full", regex=PRODUCT_MODE_PATTERN),
+    products_limit: int = Query(100, ge=1, le=1000),
+    database: Database = Depends(get_database),
     current_user: User = Depends(get_current_user)
 ):
-    # Find user
-    user = db.query(User).filter(User.id == user_id).first()
-    if user is None:
-        raise HTTPException(
-            status_code=status.HTTP_404_NOT_FOUND,
-            detail="User not found"
-        )
-    
-    # Return user's warehouses
-    return user.warehouses 
\ No newline at end of file
+    def load(db: Session):
+        # Find user
+        user = db.query(User).filter(User.id == user_id).first()
+        if user is None:
+            raise HTTPException(
+                status_code=status.HTTP_404_NOT_FOUND,
+                detail="User not found"
+            )
+        
+        # Return user's warehouses with their products loaded in one batch
+        rows = db.query(Warehouse).with_entities(*WAREHOUSE_COLUMNS).filter(
+            Warehouse.owner_id == user.id
+        ).order_by(Warehouse.id).all()
+        return warehouse_rows(db, rows, mode=products, limit=products_limit)
+
+    # Plain rows are encoded as they are, without a second validation pass
+    return JSONResponseClass(await database.run(load)) 
\ No newline at end of file
@@ -1,101 +1,372 @@
-from fastapi import APIRouter, Depends, HTTPException, status
+from fastapi import APIRouter, Depends, HTTPException, Query, Request, Response, status
+from fastapi.encoders import jsonable_encoder
 from sqlalchemy.orm import Session
 from typing import List, Optional
+from datetime import datetime, timezone
 
-from database import get_db
+from config import FORECAST_LEAD_TIME_DAYS
+from database import Database, get_database
+from models.product import Product
 from models.warehouse import Warehouse
-from schemas.warehouse import WarehouseCreate, WarehouseRead
+from models.stock_movement import StockMovement
+from schemas.job import JobRead, WarehouseDeletePayload
+from schemas.product import ProductForecast
+from schemas.warehouse import (
+    AllocationRequest, AllocationResult, OwnerStockSummary, ProductStockAt, StockMovementRead,
+    WarehouseAllocation, WarehouseBatch, WarehouseBatchGet, WarehouseCreate, WarehouseRead,
+    WarehouseStats, WarehouseStockAt
+)
 from routers.auth import get_current_user
+from routers.jobs import create_job, job_location
 from models.user import User
+from services import search
+from services.dataloader import MISSING_IDS_HEADER, DataLoader, batch_result, get_warehouse_loader, parse_ids
+from services.forecasting import forecaster
+from services.ledger import stock_as_of
+from services.pagination import paginate_by_id, set_next_cursor
+from services.placement import allocate
+from services.response_cache import bump_warehouse, response_cache
+from services.search import SEARCH_MODE_PATTERN
+from services.serialization import JSONResponseClass
+from services.stock_counters import (
+    STATS_ORDER_PATTERN, owner_rollup, top_warehouses, warehouse_stats_query
+)
+from services.tenancy import current_tenant
+from services.warehouses import remove_warehouse
+from services.warehouse_loader import (
+    PRODUCT_MODE_PATTERN, WAREHOUSE_COLUMNS, attach_products, warehouse_rows
+)
 
 router = APIRouter(prefix="/warehouses", tags=["warehouses"])
 
 
+def check_ledger_access(db: Session, warehouse_id: int):
+    # The ledger has no owner column; under tenant scoping the warehouse
+    # itself must still be visible to the caller
+    if current_tenant(db) is not None and db.query(Warehouse.id).filter(Warehouse.id == warehouse_id).first() is None:
+        raise HTTPException(status_code=404, detail="Warehouse not found")
+
+
 @router.post("/", response_model=WarehouseRead, status_code=status.HTTP_201_CREATED)
-def create_warehouse(
+async def create_warehouse(
     warehouse: WarehouseCreate,
-    db: Session = Depends(get_db),
+    database: Database = Depends(get_database),
     current_user: User = Depends(get_current_user)
 ):
-    # Create new warehouse with all fields from schema
-    new_warehouse = Warehouse(
-        name=warehouse.name,
-        location=warehouse.location,
-        capacity=warehouse.capacity,
-        rental_price=warehouse.rental_price,
-        warehouse_type=warehouse.warehouse_type,
-        used_by_company=warehouse.used_by_company,
-        is_available=warehouse.is_available,
-        owner_id=current_user.id  # Set the owner to current user
-    )
-    
-    # Add to database
-    db.add(new_warehouse)
-    db.commit()
-    db.refresh(new_warehouse)
-    
-    return new_warehouse
+    def create(db: Session):
+        # Create new warehouse with all fields from schema
+        new_warehouse = Warehouse(
+            name=warehouse.name,
+            location=warehouse.location,
+            capacity=warehouse.capacity,
+            rental_price=warehouse.rental_price,
+            warehouse_type=warehouse.warehouse_type,
+            used_by_company=warehouse.used_by_company,
+            is_available=warehouse.is_available,
+            owner_id=current_user.id  # Set the owner to current user
+        )
+        
+        # Add to database
+        db.add(new_warehouse)
+        db.commit()
+        bump_warehouse(new_warehouse.id)
+        db.refresh(new_warehouse)
+        
+        return attach_products(db, [new_warehouse])[0]
+
+    return await database.run(create)
 
 
 @router.get("/", response_model=List[WarehouseRead])
-def list_warehouses(
+async def list_warehouses(
+    request: Request,
+    response: Response,
+    skip: int = 0,
+    limit: int = 100,
+    cursor: Optional[str] = None,
+    products: str = Query("full", regex=PRODUCT_MODE_PATTERN),
+    products_limit: int = Query(100, ge=1, le=1000),
+    ids: Optional[str] = Query(None, description="Comma separated ids, returned in this order"),
+    database: Database = Depends(get_database),
+    loader: DataLoader = Depends(get_warehouse_loader),
+    current_user: User = Depends(get_current_user)
+):
+    if ids is not None:
+        requested = parse_ids(ids)
+
+        async def produce_batch():
+            # Found warehouses in request order, misses listed in a header
+            items = await loader.load_many(requested)
+            missing = batch_result(requested, items)["missing"]
+            if missing:
+                response.headers[MISSING_IDS_HEADER] = ",".join(map(str, missing))
+            return [item for item in items if item is not None]
+
+        return await response_cache.respond(request, current_user, ["warehouses"], produce_batch, response)
+
+    def load(db: Session):
+        rows = paginate_by_id(
+            db.query(Warehouse).with_entities(*WAREHOUSE_COLUMNS), Warehouse.id, cursor, skip, limit
+        ).all()
+        set_next_cursor(response, rows, limit)
+        # Load products for the whole page at once instead of once per warehouse
+        return warehouse_rows(db, rows, mode=products, limit=products_limit)
+
+    return await response_cache.respond(
+        request, current_user, ["warehouses"], lambda: database.run(load), response
+    )
+
+
+@router.post("/allocate", response_model=AllocationResult)
+async def allocate_warehouses(
+    allocation: AllocationRequest,
+    database: Database = Depends(get_database),
+    current_user: User = Depends(get_current_user)
+):
+    # Served from the in-memory capacity index, not a scan of all warehouses
+    def load(db: Session):
+        return allocate(
+            db, allocation.quantity, current_tenant(db), allocation.warehouse_type, allocation.location,
+            allocation.max_price, allocation.split, allocation.limit
+        )
+
+    allocations = [
+        WarehouseAllocation(warehouse_id=id, rental_price=price, free_capacity=free, quantity=quantity)
+        for id, price, free, quantity in await database.run(load)
+    ]
+    if allocation.split:
+        unallocated = allocation.quantity - sum(allocation.quantity for allocation in allocations)
+    else:
+        unallocated = 0 if allocations else allocation.quantity
+    return AllocationResult(allocations=allocations, unallocated=unallocated)
+
+
+@router.post("/batch-get", response_model=WarehouseBatch)
+async def batch_get_warehouses(
+    batch: WarehouseBatchGet,
+    loader: DataLoader = Depends(get_warehouse_loader),
+    current_user: User = Depends(get_current_user)
+):
+    # One IN query for the warehouses and one for their products
+    return batch_result(batch.ids, await loader.load_many(batch.ids))
+
+
+@router.get("/search", response_model=List[WarehouseRead])
+async def search_warehouses(
+    q: str = Query(..., min_length=1, max_length=200),
+    mode: str = Query("prefix", regex=SEARCH_MODE_PATTERN),
+    skip: int = Query(0, ge=0),
+    limit: int = Query(20, ge=1, le=100),
+    database: Database = Depends(get_database),
+    current_user: User = Depends(get_current_user)
+):
+    def load(db: Session):
+        # Typeahead results carry no products
+        return attach_products(db, search.search_warehouses(db, q, mode, skip, limit), mode="none")
+
+    return await database.run(load)
+
+
+@router.get("/stats", response_model=List[WarehouseStats])
+async def warehouse_stats(
+    response: Response,
     skip: int = 0,
     limit: int = 100,
-    db: Session = Depends(get_db),
+    cursor: Optional[str] = None,
+    database: Database = Depends(get_database),
     current_user: User = Depends(get_current_user)
 ):
-    warehouses = db.query(Warehouse).offset(skip).limit(limit).all()
-    return warehouses
+    # Totals come from the warehouse_stock counters, no product scan needed
+    def load(db: Session):
+        return paginate_by_id(warehouse_stats_query(db), Warehouse.id, cursor, skip, limit).all()
+
+    rows = await database.run(load)
+    set_next_cursor(response, rows, limit)
+    return rows
+
+
+@router.get("/stats/top", response_model=List[WarehouseStats])
+async def top_warehouse_stats(
+    n: int = Query(10, ge=1, le=100),
+    by: str = Query("quantity", regex=STATS_ORDER_PATTERN),
+    database: Database = Depends(get_database),
+    current_user: User = Depends(get_current_user)
+):
+    return await database.run(top_warehouses, n, by)
+
+
+@router.get("/stats/owners", response_model=List[OwnerStockSummary])
+async def owner_stock_stats(
+    database: Database = Depends(get_database),
+    current_user: User = Depends(get_current_user)
+):
+    rows = await database.run(owner_rollup)
+    return [
+        OwnerStockSummary(
+            owner_id=row.owner_id,
+            warehouse_count=row.warehouse_count,
+            total_quantity=row.total_quantity or 0,
+            sku_count=row.sku_count or 0,
+            total_capacity=row.total_capacity,
+            utilization=row.total_quantity / row.total_capacity if row.total_capacity else None
+        )
+        for row in rows
+    ]
 
 
 @router.get("/{warehouse_id}", response_model=WarehouseRead)
-def get_warehouse(
+async def get_warehouse(
+    warehouse_id: int,
+    request: Request,
+    database: Database = Depends(get_database),
+    current_user: User = Depends(get_current_user)
+):
+    def load(db: Session):
+        warehouse = db.query(Warehouse).filter(Warehouse.id == warehouse_id).first()
+        if warehouse is None:
+            raise HTTPException(status_code=404, detail="Warehouse not found")
+        return WarehouseRead.from_orm(attach_products(db, [warehouse])[0])
+
+    return await response_cache.respond(
+        request, current_user, [f"warehouse:{warehouse_id}"], lambda: database.run(load)
+    )
+
+
+@router.get("/{warehouse_id}/stock", response_model=WarehouseStockAt)
+async def get_warehouse_stock(
     warehouse_id: int,
-    db: Session = Depends(get_db),
+    as_of: Optional[datetime] = None,
+    database: Database = Depends(get_database),
     current_user: User = Depends(get_current_user)
 ):
-    warehouse = db.query(Warehouse).filter(Warehouse.id == warehouse_id).first()
-    if warehouse is None:
+    # The ledger stores naive UTC timestamps
+    if as_of is None:
+        as_of = datetime.utcnow()
+    elif as_of.tzinfo is not None:
+        as_of = as_of.astimezone(timezone.utc).replace(tzinfo=None)
+
+    def load(db: Session):
+        check_ledger_access(db, warehouse_id)
+        return stock_as_of(db, warehouse_id, as_of)
+
+    quantities = await database.run(load)
+    return WarehouseStockAt(
+        warehouse_id=warehouse_id,
+        as_of=as_of,
+        total_quantity=sum(quantities.values()),
+        products=[ProductStockAt(product_id=id, quantity=quantity) for id, quantity in quantities.items()]
+    )
+
+
+@router.get("/{warehouse_id}/movements", response_model=List[StockMovementRead])
+async def list_warehouse_movements(
+    warehouse_id: int,
+    response: Response,
+    skip: int = 0,
+    limit: int = Query(100, ge=1, le=1000),
+    cursor: Optional[str] = None,
+    product_id: Optional[int] = None,
+    database: Database = Depends(get_database),
+    current_user: User = Depends(get_current_user)
+):
+    # Movements of deleted warehouses stay readable for audits, unless
+    # tenant scoping hides them along with the warehouse
+    def load(db: Session):
+        check_ledger_access(db, warehouse_id)
+        query = db.query(StockMovement).filter(StockMovement.warehouse_id == warehouse_id)
+        if product_id is not None:
+            query = query.filter(StockMovement.product_id == product_id)
+        return paginate_by_id(query, StockMovement.id, cursor, skip, limit).all()
+
+    movements = await database.run(load)
+    set_next_cursor(response, movements, limit)
+    return movements
+
+
+@router.get("/{warehouse_id}/reorder-suggestions", response_model=List[ProductForecast])
+async def warehouse_reorder_suggestions(
+    warehouse_id: int,
+    lead_time_days: Optional[float] = Query(None, gt=0, le=365),
+    limit: int = Query(100, ge=1, le=1000),
+    database: Database = Depends(get_database),
+    current_user: User = Depends(get_current_user)
+):
+    def visible(db: Session):
+        return db.query(Warehouse.id).filter(Warehouse.id == warehouse_id).first() is not None
+
+    if not await database.run(visible):
         raise HTTPException(status_code=404, detail="Warehouse not found")
-    return warehouse
+    # Products at or below their reorder point, soonest stock-out first
+    model = await forecaster.fresh()
+    return [
+        ProductForecast(
+            **suggestion,
+            lead_time_days=lead_time_days or FORECAST_LEAD_TIME_DAYS,
+            computed_at=model.refreshed_at
+        )
+        for suggestion in model.suggestions(warehouse_id, lead_time_days, limit)
+    ]
 
 
 @router.put("/{warehouse_id}", response_model=WarehouseRead)
-def update_warehouse(
+async def update_warehouse(
     warehouse_id: int,
     warehouse_update: WarehouseCreate,
-    db: Session = Depends(get_db),
+    database: Database = Depends(get_database),
     current_user: User = Depends(get_current_user)
 ):
-    # Get warehouse
-    warehouse = db.query(Warehouse).filter(Warehouse.id == warehouse_id).first()
-    if warehouse is None:
-        raise HTTPException(status_code=404, detail="Warehouse not found")
-    
-    # Update all warehouse fields from the update data
-    for field, value in warehouse_update.dict().items():
-        setattr(warehouse, field, value)
-    
-    # Save changes
-    db.commit()
-    db.refresh(warehouse)
-    
-    return warehouse
-
-
-@router.delete("/{warehouse_id}", status_code=status.HTTP_204_NO_CONTENT)
-def delete_warehouse(
+    def update(db: Session):
+        # Get warehouse
+        warehouse = db.query(Warehouse).filter(Warehouse.id == warehouse_id).first()
+        if warehouse is None:
+            raise HTTPException(status_code=404, detail="Warehouse not found")
+        
+        # Update all warehouse fields from the update data
+        for field, value in warehouse_update.dict().items():
+            setattr(warehouse, field, value)
+        
+        # Save changes
+        db.commit()
+        bump_warehouse(warehouse_id)
+        db.refresh(warehouse)
+        
+        return attach_products(db, [warehouse])[0]
+
+    return await database.run(update)
+
+
+@router.delete(
+    "/{warehouse_id}",
+    status_code=status.HTTP_204_NO_CONTENT,
+    responses={status.HTTP_202_ACCEPTED: {"model": JobRead}}
+)
+async def delete_warehouse(
     warehouse_id: int,
-    db: Session = Depends(get_db),
+    background: bool = False,
+    database: Database = Depends(get_database),
     current_user: User = Depends(get_current_user)
 ):
-    # Get warehouse
-    warehouse = db.query(Warehouse).filter(Warehouse.id == warehouse_id).first()
-    if warehouse is None:
-        raise HTTPException(status_code=404, detail="Warehouse not found")
-    
-    # Delete warehouse
-    db.delete(warehouse)
-    db.commit()
-    
-    return None 
\ No newline at end of file
+    """Delete a warehouse; its products stay, without a warehouse.
+
+    With `background=true` the deletion runs as a job in batches and the
+    response is 202 with the job, to poll at its Location.
+    """
+    if background:
+        def schedule(db: Session):
+            if db.query(Warehouse.id).filter(Warehouse.id == warehouse_id).first() is None:
+                raise HTTPException(status_code=404, detail="Warehouse not found")
+            return create_job(db, "warehouse.delete", WarehouseDeletePayload(warehouse_id=warehouse_id), current_user.id)
+
+        job = await database.run(schedule)
+        return JSONResponseClass(
+            jsonable_encoder(job),
+            status_code=status.HTTP_202_ACCEPTED,
+            headers={"Location": job_location(job.id)}
+        )
+
+    def delete(db: Session):
+        if not remove_warehouse(db, warehouse_id):
+            raise HTTPException(status_code=404, detail="Warehouse not found")
+
+    await database.run(delete)
+    return None
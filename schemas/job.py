@@ -0,0 +1,32 @@
+from pydantic import BaseModel
+from typing import Any, Dict, Optional
+from datetime import datetime
+
+
+class JobCreate(BaseModel):
+    type: str
+    payload: Dict[str, Any] = {}
+
+
+class JobRead(BaseModel):
+    id: int
+    type: str
+    status: str
+    attempts: int
+    max_attempts: int
+    progress_done: int
+    progress_total: Optional[int] = None
+    result: Optional[Any] = None
+    # Last failure; kept while a retry is pending
+    error: Optional[str] = None
+    run_after: datetime
+    created_at: datetime
+    started_at: Optional[datetime] = None
+    finished_at: Optional[datetime] = None
+
+    class Config:
+        orm_mode = True
+
+
+class WarehouseDeletePayload(BaseModel):
+    warehouse_id: int
@@ -1,7 +1,9 @@
-from pydantic import BaseModel
-from typing import Optional
+from pydantic import BaseModel, Field
+from typing import List, Optional
 from datetime import datetime
 
+from config import BATCH_MAX_IDS, BULK_TRANSFER_MAX_ITEMS
+
 
 class ProductCreate(BaseModel):
     name: str
@@ -17,7 +19,57 @@ class ProductRead(BaseModel):
     quantity: int
     is_active: bool
     created_at: datetime
-    warehouse_id: int
+    # None once the product's warehouse was deleted
+    warehouse_id: Optional[int] = None
 
     class Config:
-        orm_mode = True 
\ No newline at end of file
+        orm_mode = True 
+
+
+class ProductBatchGet(BaseModel):
+    ids: List[int] = Field(..., min_items=1, max_items=BATCH_MAX_IDS)
+
+
+class ProductBatch(BaseModel):
+    # One entry per requested id, in request order; None where it was not found
+    items: List[Optional[ProductRead]]
+    missing: List[int]
+
+
+class ProductForecast(BaseModel):
+    product_id: int
+    warehouse_id: Optional[int] = None
+    quantity: int
+    # Daily outbound quantities
+    moving_average: float
+    smoothed_demand: float
+    demand_std: float
+    safety_stock: float
+    reorder_point: float
+    # None when there is no demand
+    days_until_stockout: Optional[float] = None
+    suggested_order: int
+    lead_time_days: float
+    computed_at: datetime
+
+
+class ProductTransfer(BaseModel):
+    product_id: int
+    from_warehouse_id: int
+    to_warehouse_id: int
+    quantity: int = Field(..., gt=0)
+
+
+class BulkProductTransfer(BaseModel):
+    transfers: List[ProductTransfer] = Field(..., min_items=1, max_items=BULK_TRANSFER_MAX_ITEMS)
+
+
+class ProductImportError(BaseModel):
+    row: int
+    error: str
+
+
+class ProductImportResult(BaseModel):
+    imported: int
+    failed: int
+    errors: List[ProductImportError] = []
@@ -1,7 +1,8 @@
-from pydantic import BaseModel
+from pydantic import BaseModel, Field
 from typing import Optional, List
 from datetime import datetime
 
+from config import BATCH_MAX_IDS
 from schemas.product import ProductRead
 
 
@@ -15,6 +16,11 @@ class WarehouseCreate(BaseModel):
     is_available: Optional[bool] = True
 
 
+class WarehouseProductSummary(BaseModel):
+    product_count: int
+    total_quantity: int
+
+
 class WarehouseRead(BaseModel):
     id: int
     name: str
@@ -26,6 +32,89 @@ class WarehouseRead(BaseModel):
     is_available: bool
     created_at: datetime
     products: List[ProductRead] = []
+    product_summary: Optional[WarehouseProductSummary] = None
 
     class Config:
-        orm_mode = True
\ No newline at end of file
+        orm_mode = True
+
+
+class WarehouseBatchGet(BaseModel):
+    ids: List[int] = Field(..., min_items=1, max_items=BATCH_MAX_IDS)
+
+
+class WarehouseBatch(BaseModel):
+    # One entry per requested id, in request order; None where it was not found
+    items: List[Optional[WarehouseRead]]
+    missing: List[int]
+
+
+class AllocationRequest(BaseModel):
+    quantity: int = Field(..., gt=0)
+    warehouse_type: Optional[str] = None
+    location: Optional[str] = None
+    max_price: Optional[float] = Field(None, ge=0)
+    # Spread the quantity over several warehouses, cheapest first
+    split: bool = False
+    # Alternatives to return, or the most warehouses a split may use
+    limit: int = Field(1, ge=1, le=50)
+
+
+class WarehouseAllocation(BaseModel):
+    warehouse_id: int
+    rental_price: float
+    free_capacity: int
+    quantity: int
+
+
+class AllocationResult(BaseModel):
+    allocations: List[WarehouseAllocation]
+    # Part of the quantity no warehouse had room for
+    unallocated: int
+
+
+class WarehouseStats(BaseModel):
+    id: int
+    name: str
+    owner_id: Optional[int] = None
+    capacity: Optional[int] = None
+    total_quantity: int
+    sku_count: int
+    # total_quantity / capacity, None when the capacity is unknown
+    utilization: Optional[float] = None
+
+    class Config:
+        orm_mode = True
+
+
+class OwnerStockSummary(BaseModel):
+    owner_id: Optional[int] = None
+    warehouse_count: int
+    total_quantity: int
+    sku_count: int
+    total_capacity: int
+    utilization: Optional[float] = None
+
+
+class StockMovementRead(BaseModel):
+    id: int
+    product_id: int
+    warehouse_id: int
+    delta: int
+    quantity: int
+    kind: str
+    created_at: datetime
+
+    class Config:
+        orm_mode = True
+
+
+class ProductStockAt(BaseModel):
+    product_id: int
+    quantity: int
+
+
+class WarehouseStockAt(BaseModel):
+    warehouse_id: int
+    as_of: datetime
+    total_quantity: int
+    products: List[ProductStockAt] = []
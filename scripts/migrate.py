@@ -0,0 +1,33 @@
+"""Bring the database schema up to date.
+
+Run once per deploy, before starting the API workers, which no longer
+touch the schema themselves:
+
+    python scripts/migrate.py [--status]
+"""
+import argparse
+import os
+import sys
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import migrations  # noqa: E402
+from database import engine  # noqa: E402
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--status", action="store_true", help="only list pending migrations")
+    args = parser.parse_args()
+
+    if args.status:
+        with engine.connect() as connection:
+            pending = migrations.pending(connection)
+        print("\n".join(pending) if pending else "Up to date")
+        return
+    applied = migrations.upgrade(engine)
+    print("\n".join(f"Applied {name}" for name in applied) if applied else "Up to date")
+
+
+if __name__ == "__main__":
+    main()
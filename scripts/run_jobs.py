@@ -0,0 +1,42 @@
+"""Run background jobs outside the API processes.
+
+The API starts JOB_WORKERS worker threads itself; set JOB_WORKERS=0 there
+and run this instead to keep heavy jobs off the API machines.
+
+    python scripts/run_jobs.py [--workers N]
+"""
+import argparse
+import os
+import sys
+import threading
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from config import JOB_WORKERS  # noqa: E402
+from models.user import User  # noqa: E402,F401
+from models.warehouse import Warehouse  # noqa: E402,F401
+from models.product import Product  # noqa: E402,F401
+from models.job import Job  # noqa: E402,F401
+# Importing the services registers their job types
+from services import transfers, uploads, warehouses  # noqa: E402,F401
+from services.jobs import JobRunner, job_types  # noqa: E402
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--workers", type=int, default=max(JOB_WORKERS, 1))
+    args = parser.parse_args()
+
+    runner = JobRunner(workers=args.workers)
+    runner.start()
+    print(f"Running {', '.join(sorted(job_types))} jobs on {args.workers} workers, Ctrl+C to stop")
+    try:
+        threading.Event().wait()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        runner.stop()
+
+
+if __name__ == "__main__":
+    main()
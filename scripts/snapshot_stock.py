@@ -0,0 +1,35 @@
+"""Take per-warehouse stock snapshots so point-in-time queries stay bounded.
+
+The API already does this every STOCK_SNAPSHOT_INTERVAL_SECONDS; this script
+is for cron-driven deployments (interval 0) or a one-off backfill.
+
+    python scripts/snapshot_stock.py [--warehouse-id ID ...]
+"""
+import argparse
+import os
+import sys
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from database import SessionLocal  # noqa: E402
+from models.user import User  # noqa: E402,F401
+from models.warehouse import Warehouse  # noqa: E402,F401
+from models.product import Product  # noqa: E402,F401
+from services.ledger import take_snapshots  # noqa: E402
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--warehouse-id", type=int, action="append")
+    args = parser.parse_args()
+
+    db = SessionLocal()
+    try:
+        taken = take_snapshots(db, args.warehouse_id)
+    finally:
+        db.close()
+    print(f"{taken} snapshots taken")
+
+
+if __name__ == "__main__":
+    main()
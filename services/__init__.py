@@ -0,0 +1 @@
+# Services package initialization
\ No newline at end of file
@@ -0,0 +1,159 @@
+import threading
+import time
+from collections import OrderedDict
+from typing import Any, Callable, Dict, Optional
+
+from sqlalchemy import event, inspect
+
+from config import AUTH_CACHE_ENABLED, AUTH_CACHE_MAX_SIZE, AUTH_CACHE_TTL_SECONDS
+from models.user import User
+from services.metrics import register_collector
+
+
+class CacheBackend:
+    """Storage used by the principal cache.
+
+    The default backend lives in process memory. Several workers can share
+    principals by plugging in a backend backed by an external store.
+    """
+
+    def get(self, key: str) -> Optional[Any]:
+        raise NotImplementedError
+
+    def set(self, key: str, value: Any, ttl: float) -> None:
+        raise NotImplementedError
+
+    def delete(self, key: str) -> None:
+        raise NotImplementedError
+
+    def clear(self) -> None:
+        raise NotImplementedError
+
+
+class InMemoryBackend(CacheBackend):
+    """Thread-safe LRU cache whose entries expire after their TTL."""
+
+    def __init__(self, max_size: int):
+        self.max_size = max_size
+        self._entries: "OrderedDict[str, tuple]" = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key):
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                return None
+            expires_at, value = entry
+            if expires_at <= time.monotonic():
+                del self._entries[key]
+                return None
+            self._entries.move_to_end(key)
+            return value
+
+    def set(self, key, value, ttl):
+        if ttl <= 0:
+            return
+        with self._lock:
+            self._entries[key] = (time.monotonic() + ttl, value)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_size:
+                self._entries.popitem(last=False)
+
+    def delete(self, key):
+        with self._lock:
+            self._entries.pop(key, None)
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+    def __len__(self):
+        return len(self._entries)
+
+
+class PrincipalCache:
+    """Caches authenticated users by token subject (the user's email).
+
+    Only plain column values are stored; every hit returns a fresh detached
+    `User` so no ORM state is shared between requests.
+    """
+
+    def __init__(self, backend: CacheBackend, ttl: float, enabled: bool = True):
+        self.backend = backend
+        self.ttl = ttl
+        self.enabled = enabled
+        self.hits = 0
+        self.misses = 0
+
+    def get(self, subject: str) -> Optional[User]:
+        data = self.backend.get(subject) if self.enabled else None
+        if data is None:
+            self.misses += 1
+            return None
+        self.hits += 1
+        return User(**data)
+
+    def set(self, subject: str, user: Optional[User]) -> None:
+        # Inactive or missing users are never cached so they are re-checked
+        if self.enabled and user is not None and user.is_active:
+            self.backend.set(subject, _snapshot(user), self.ttl)
+
+    def invalidate(self, subject: str) -> None:
+        self.backend.delete(subject)
+
+    def clear(self) -> None:
+        self.backend.clear()
+
+    def stats(self) -> Dict[str, int]:
+        return {"hits": self.hits, "misses": self.misses}
+
+
+def _snapshot(user: User) -> Dict[str, Any]:
+    return {attr.key: getattr(user, attr.key) for attr in inspect(User).column_attrs}
+
+
+principal_cache = PrincipalCache(
+    InMemoryBackend(AUTH_CACHE_MAX_SIZE),
+    ttl=AUTH_CACHE_TTL_SECONDS,
+    enabled=AUTH_CACHE_ENABLED
+)
+
+register_collector(lambda: [
+    "# TYPE auth_principal_cache_hits_total counter",
+    f"auth_principal_cache_hits_total {principal_cache.hits}",
+    "# TYPE auth_principal_cache_misses_total counter",
+    f"auth_principal_cache_misses_total {principal_cache.misses}",
+])
+
+# Decoded JWT claims per raw token; tokens are never shared between workers
+_claims_cache = InMemoryBackend(AUTH_CACHE_MAX_SIZE)
+
+
+def set_backend(backend: CacheBackend) -> None:
+    """Swap the principal storage, e.g. for one shared by several workers."""
+    principal_cache.backend = backend
+
+
+def cached_claims(token: str, decode: Callable[[str], dict]) -> dict:
+    """Return the verified claims of `token`, decoding it at most once per TTL."""
+    if not AUTH_CACHE_ENABLED:
+        return decode(token)
+    payload = _claims_cache.get(token)
+    if payload is None:
+        payload = decode(token)
+        ttl = AUTH_CACHE_TTL_SECONDS
+        if isinstance(payload.get("exp"), (int, float)):
+            # Never serve a token from the cache past its own expiry
+            ttl = min(ttl, payload["exp"] - time.time())
+        _claims_cache.set(token, payload, ttl)
+    return payload
+
+
+@event.listens_for(User, "after_update")
+@event.listens_for(User, "after_delete")
+def _invalidate_changed_user(mapper, connection, target):
+    # Drop both the current and the previous email when it was changed
+    history = inspect(target).attrs.email.history
+    for email in {target.email, *history.deleted}:
+        if email:
+            principal_cache.invalidate(email)
@@ -0,0 +1,230 @@
+import asyncio
+import json
+import logging
+import select
+import threading
+from collections import OrderedDict
+from typing import Dict, Iterable, List, Optional, Set
+
+from sqlalchemy import text
+from sqlalchemy.engine import make_url
+from sqlalchemy.orm import Session
+
+from config import (
+    CHANGE_FEED_BROKER, CHANGE_FEED_DATABASE_URL, CHANGE_FEED_HEARTBEAT_SECONDS, CHANGE_FEED_MAX_PENDING
+)
+from services.metrics import register_collector
+from services.stock_changes import StockChange, on_stock_committed, on_stock_committing
+
+logger = logging.getLogger("smart_stock.change_feed")
+
+CHANNEL = "stock_changes"
+# NOTIFY payloads must stay below 8000 bytes
+MAX_PAYLOAD = 7500
+# Sent instead of the dropped events when a client fell too far behind
+RESYNC = {"type": "resync"}
+
+
+def to_event(change: StockChange) -> Dict:
+    return {
+        "type": "stock",
+        "product_id": change.product_id,
+        "warehouse_id": change.warehouse_id,
+        "delta": change.delta,
+        "quantity": change.quantity,
+        "kind": change.kind,
+    }
+
+
+class Subscription:
+    """Pending events of one client, coalesced per product and warehouse.
+
+    While a client is busy receiving, newer events for the same product
+    replace the pending one (deltas are summed), so a slow client gets the
+    latest quantity instead of the full history. Once more than
+    `max_pending` products are waiting the oldest are dropped and the
+    client is told to resync.
+    """
+
+    def __init__(self, warehouses: Optional[Set[int]], max_pending: int):
+        self.warehouses = warehouses
+        self.max_pending = max_pending
+        self._pending: "OrderedDict[tuple, Dict]" = OrderedDict()
+        self._ready = asyncio.Event()
+        self._overflowed = False
+
+    def push(self, event: Dict) -> None:
+        if event is RESYNC:
+            self._overflowed = True
+        elif self.warehouses is None or event["warehouse_id"] in self.warehouses:
+            key = (event["product_id"], event["warehouse_id"])
+            previous = self._pending.pop(key, None)
+            if previous is not None:
+                event = {**event, "delta": previous["delta"] + event["delta"]}
+            self._pending[key] = event
+            if len(self._pending) > self.max_pending:
+                self._pending.popitem(last=False)
+                self._overflowed = True
+        else:
+            return
+        self._ready.set()
+
+    async def next_batch(self, timeout: float) -> List[Dict]:
+        """Wait up to `timeout` seconds and take everything pending ([] on timeout)."""
+        try:
+            await asyncio.wait_for(self._ready.wait(), timeout)
+        except asyncio.TimeoutError:
+            return []
+        self._ready.clear()
+        batch = list(self._pending.values())
+        self._pending.clear()
+        if self._overflowed:
+            self._overflowed = False
+            batch.insert(0, RESYNC)
+        return batch
+
+
+class ChangeBroker:
+    """Fans committed stock changes out to the subscribers of this process."""
+
+    def __init__(self, max_pending: int = CHANGE_FEED_MAX_PENDING):
+        self.max_pending = max_pending
+        self._subscriptions: Set[Subscription] = set()
+        self._loop: Optional[asyncio.AbstractEventLoop] = None
+        self.delivered = 0
+
+    def subscribe(self, warehouses: Optional[Iterable[int]] = None) -> Subscription:
+        self._loop = asyncio.get_running_loop()
+        subscription = Subscription(set(warehouses) if warehouses is not None else None, self.max_pending)
+        self._subscriptions.add(subscription)
+        return subscription
+
+    def unsubscribe(self, subscription: Subscription) -> None:
+        self._subscriptions.discard(subscription)
+
+    @property
+    def subscriber_count(self) -> int:
+        return len(self._subscriptions)
+
+    def deliver(self, events: List[Dict]) -> None:
+        """Hand events to local subscribers; safe to call from any thread."""
+        if not self._subscriptions or self._loop is None:
+            return
+        self._loop.call_soon_threadsafe(self._dispatch, events)
+
+    def _dispatch(self, events: List[Dict]) -> None:
+        for subscription in list(self._subscriptions):
+            for event in events:
+                subscription.push(event)
+        self.delivered += len(events)
+
+    def committing(self, db: Session, changes: List[StockChange]) -> None:
+        pass
+
+    def committed(self, changes: List[StockChange]) -> None:
+        self.deliver([to_event(change) for change in changes])
+
+    def start(self) -> None:
+        pass
+
+    def stop(self) -> None:
+        pass
+
+
+class PostgresBroker(ChangeBroker):
+    """Shares changes between workers with LISTEN/NOTIFY.
+
+    The NOTIFY is issued inside the writing transaction, so PostgreSQL only
+    delivers it when that transaction commits. Every worker, the writing one
+    included, receives the events on its own listening connection.
+    """
+
+    def __init__(self, url: str, **kwargs):
+        super().__init__(**kwargs)
+        self.url = make_url(url).set(drivername="postgresql")
+        self._stopped = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+
+    def committing(self, db, changes):
+        events = [json.dumps(to_event(change), separators=(",", ":")) for change in changes]
+        payloads, current = [], []
+        for event in events:
+            if current and sum(map(len, current)) + len(event) + len(current) + 2 > MAX_PAYLOAD:
+                payloads.append(current)
+                current = []
+            current.append(event)
+        payloads.append(current)
+        for payload in payloads:
+            db.execute(
+                text("SELECT pg_notify(:channel, :payload)"),
+                {"channel": CHANNEL, "payload": "[" + ",".join(payload) + "]"}
+            )
+
+    def committed(self, changes):
+        # Delivered through the listening connection instead
+        pass
+
+    def start(self):
+        self._stopped.clear()
+        self._thread = threading.Thread(target=self._listen, name="change-feed-listener", daemon=True)
+        self._thread.start()
+
+    def stop(self):
+        self._stopped.set()
+        if self._thread is not None:
+            self._thread.join(timeout=5)
+
+    def _listen(self):
+        import psycopg2
+
+        connected_before = False
+        while not self._stopped.is_set():
+            connection = None
+            try:
+                connection = psycopg2.connect(self.url.render_as_string(hide_password=False))
+                connection.set_session(autocommit=True)
+                connection.cursor().execute(f"LISTEN {CHANNEL}")
+                if connected_before:
+                    # Notifications sent while disconnected are lost
+                    self.deliver([RESYNC])
+                connected_before = True
+                while not self._stopped.is_set():
+                    if select.select([connection], [], [], 1.0) == ([], [], []):
+                        continue
+                    connection.poll()
+                    while connection.notifies:
+                        self.deliver(json.loads(connection.notifies.pop(0).payload))
+            except Exception:
+                logger.exception("Change feed listener failed, reconnecting")
+                self._stopped.wait(1.0)
+            finally:
+                if connection is not None:
+                    connection.close()
+
+
+def _create_broker() -> ChangeBroker:
+    kind = CHANGE_FEED_BROKER
+    if kind == "auto":
+        kind = "postgres" if make_url(CHANGE_FEED_DATABASE_URL).get_backend_name() == "postgresql" else "memory"
+    if kind == "postgres":
+        return PostgresBroker(CHANGE_FEED_DATABASE_URL)
+    return ChangeBroker()
+
+
+change_broker = _create_broker()
+on_stock_committing(lambda db, changes: change_broker.committing(db, changes))
+on_stock_committed(lambda changes: change_broker.committed(changes))
+
+
+async def stream_events(subscription: Subscription):
+    """Yield batches of events for a subscriber; [] is a heartbeat."""
+    while True:
+        yield await subscription.next_batch(CHANGE_FEED_HEARTBEAT_SECONDS)
+
+
+register_collector(lambda: [
+    "# TYPE change_feed_subscribers gauge",
+    f"change_feed_subscribers {change_broker.subscriber_count}",
+    "# TYPE change_feed_events_delivered_total counter",
+    f"change_feed_events_delivered_total {change_broker.delivered}",
+])
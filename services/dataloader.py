@@ -0,0 +1,111 @@
+import asyncio
+from typing import Awaitable, Callable, Dict, Generic, Hashable, Iterable, List, Optional, TypeVar
+
+from fastapi import Depends, HTTPException, Query, status
+from sqlalchemy.orm import Session
+
+from config import BATCH_MAX_IDS
+from database import Database, get_database
+from models.product import Product
+from models.warehouse import Warehouse
+from services.warehouse_loader import PRODUCT_COLUMNS, PRODUCT_MODE_PATTERN, WAREHOUSE_COLUMNS, warehouse_rows
+
+# Lists the requested ids that were not found on `?ids=` list requests
+MISSING_IDS_HEADER = "X-Missing-Ids"
+
+K = TypeVar("K", bound=Hashable)
+V = TypeVar("V")
+
+
+class DataLoader(Generic[K, V]):
+    """Collects the keys loaded during one loop iteration into one batch call.
+
+    `batch_load` receives the distinct keys and returns the values it found
+    by key; missing keys resolve to None. Values are memoized, so a loader
+    must not outlive the request it belongs to. Batches run one at a time
+    because they share the request's session.
+    """
+
+    def __init__(self, batch_load: Callable[[List[K]], Awaitable[Dict[K, V]]], max_batch_size: int = BATCH_MAX_IDS):
+        self.batch_load = batch_load
+        self.max_batch_size = max_batch_size
+        self._futures: Dict[K, asyncio.Future] = {}
+        self._queue: List[K] = []
+        self._lock = asyncio.Lock()
+
+    def load(self, key: K) -> "asyncio.Future[Optional[V]]":
+        future = self._futures.get(key)
+        if future is None:
+            loop = asyncio.get_running_loop()
+            future = self._futures[key] = loop.create_future()
+            if not self._queue:
+                loop.call_soon(self._dispatch)
+            self._queue.append(key)
+        return future
+
+    async def load_many(self, keys: Iterable[K]) -> List[Optional[V]]:
+        return list(await asyncio.gather(*[self.load(key) for key in keys]))
+
+    def _dispatch(self):
+        keys, self._queue = self._queue, []
+        for start in range(0, len(keys), self.max_batch_size):
+            asyncio.ensure_future(self._run(keys[start:start + self.max_batch_size]))
+
+    async def _run(self, keys: List[K]):
+        try:
+            async with self._lock:
+                found = await self.batch_load(keys)
+        except Exception as exc:
+            for key in keys:
+                # Failed keys are loaded again by the next call
+                self._futures.pop(key).set_exception(exc)
+            return
+        for key in keys:
+            self._futures[key].set_result(found.get(key))
+
+
+def parse_ids(ids: str) -> List[int]:
+    """Parse a comma separated `ids` parameter, keeping the request order."""
+    try:
+        parsed = [int(id) for id in ids.split(",") if id.strip()]
+    except ValueError:
+        raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail="ids must be comma separated integers")
+    if not parsed:
+        raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail="ids must not be empty")
+    check_batch_size(parsed)
+    return parsed
+
+
+def batch_result(ids: List[int], items: List[Optional[Dict]]) -> Dict:
+    return {"items": items, "missing": [id for id, item in zip(ids, items) if item is None]}
+
+
+def check_batch_size(ids: List[int]) -> None:
+    if len(ids) > BATCH_MAX_IDS:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail=f"At most {BATCH_MAX_IDS} ids can be requested at once"
+        )
+
+
+def load_products(db: Session, ids: List[int]) -> Dict[int, Dict]:
+    rows = db.query(Product).with_entities(*PRODUCT_COLUMNS).filter(Product.id.in_(ids))
+    return {row.id: row._asdict() for row in rows}
+
+
+def load_warehouses(db: Session, ids: List[int], mode: str = "full", limit: Optional[int] = None) -> Dict[int, Dict]:
+    rows = db.query(Warehouse).with_entities(*WAREHOUSE_COLUMNS).filter(Warehouse.id.in_(ids)).all()
+    return {warehouse["id"]: warehouse for warehouse in warehouse_rows(db, rows, mode=mode, limit=limit)}
+
+
+# Request-scoped loaders: FastAPI resolves a dependency once per request
+def get_product_loader(database: Database = Depends(get_database)) -> DataLoader[int, Dict]:
+    return DataLoader(lambda ids: database.run(load_products, ids))
+
+
+def get_warehouse_loader(
+    products: str = Query("full", regex=PRODUCT_MODE_PATTERN),
+    products_limit: int = Query(100, ge=1, le=1000),
+    database: Database = Depends(get_database)
+) -> DataLoader[int, Dict]:
+    return DataLoader(lambda ids: database.run(load_warehouses, ids, products, products_limit))
@@ -0,0 +1,338 @@
+import asyncio
+import importlib.util
+import logging
+import threading
+from datetime import datetime, timedelta
+from typing import Dict, List, Optional
+
+from fastapi import HTTPException, status
+from sqlalchemy import func, select
+from starlette.concurrency import run_in_threadpool
+
+from config import (
+    FORECAST_BATCH_SIZE, FORECAST_HISTORY_DAYS, FORECAST_LEAD_TIME_DAYS, FORECAST_MOVING_AVERAGE_DAYS,
+    FORECAST_REVIEW_DAYS, FORECAST_SERVICE_LEVEL_Z, FORECAST_SMOOTHING
+)
+from database import SessionLocal
+from models.product import Product
+from models.stock_movement import StockMovement
+from services.stock_changes import on_stock_committed
+
+# Imported on first use, it would add ~100ms to every worker's startup;
+# forecasts are unavailable without it
+np = None
+
+logger = logging.getLogger("smart_stock.forecasting")
+
+EPOCH = datetime(1970, 1, 1)
+# Removing a product, or its warehouse, is not demand for it
+NOT_DEMAND = ("delete", "warehouse_delete")
+
+
+def _load_numpy() -> None:
+    global np
+    if np is None:
+        import numpy
+        np = numpy
+
+
+def day_number(moment: datetime) -> int:
+    return (moment - EPOCH).days
+
+
+class DemandModel:
+    """Daily demand statistics of every product, held as NumPy columns.
+
+    Demand is the outbound stock of a day (negative ledger deltas). Every
+    product has one row; closing a day updates all rows at once: a ring
+    buffer for the moving average and the level and variance of simple
+    exponential smoothing. Nothing loops over products in Python, and the
+    model only ever needs the movements it has not seen yet.
+    """
+
+    def __init__(
+        self,
+        start_day: int,
+        moving_average_days: int = FORECAST_MOVING_AVERAGE_DAYS,
+        smoothing: float = FORECAST_SMOOTHING,
+        history_days: int = FORECAST_HISTORY_DAYS
+    ):
+        _load_numpy()
+        self.day = start_day
+        self.moving_average_days = moving_average_days
+        self.smoothing = smoothing
+        self.history_days = history_days
+        self.closed_days = 0
+        self.product_ids = np.zeros(0, dtype=np.int64)
+        self.warehouse_ids = np.zeros(0, dtype=np.int64)
+        self.quantity = np.zeros(0, dtype=np.int64)
+        self.window = np.zeros((0, moving_average_days), dtype=np.float32)
+        self.level = np.zeros(0)
+        self.variance = np.zeros(0)
+        # Demand of the day that is still open
+        self.today = np.zeros(0)
+
+    def __len__(self):
+        return len(self.product_ids)
+
+    def load_products(self, product_ids, warehouse_ids, quantities) -> None:
+        """Set the current warehouse and quantity of products (ids unique)."""
+        positions = self.positions(product_ids)
+        self.warehouse_ids[positions] = warehouse_ids
+        self.quantity[positions] = quantities
+
+    def positions(self, product_ids):
+        """Rows of `product_ids`, adding rows for products not seen before."""
+        if (product_ids[1:] > product_ids[:-1]).all():
+            # Already sorted and unique, as products are loaded
+            unique, inverse = product_ids, slice(None)
+        else:
+            # Sorted needles keep the binary searches cache friendly
+            unique, inverse = np.unique(product_ids, return_inverse=True)
+            inverse = inverse.reshape(-1)
+        positions = np.searchsorted(self.product_ids, unique)
+        known = positions < len(self.product_ids)
+        known[known] = self.product_ids[positions[known]] == unique[known]
+        if not known.all():
+            self._add(unique[~known])
+            positions = np.searchsorted(self.product_ids, unique)
+        return positions[inverse]
+
+    def _add(self, new_ids):
+        # Both sides are sorted and disjoint, so a stable sort merges them
+        merged = np.sort(np.concatenate([self.product_ids, new_ids]), kind="stable")
+        old = np.searchsorted(merged, self.product_ids)
+
+        def grow(column, fill=0):
+            grown = np.full((len(merged),) + column.shape[1:], fill, dtype=column.dtype)
+            grown[old] = column
+            return grown
+
+        self.warehouse_ids = grow(self.warehouse_ids, -1)
+        self.quantity = grow(self.quantity)
+        self.window = grow(self.window)
+        self.level = grow(self.level)
+        self.variance = grow(self.variance)
+        self.today = grow(self.today)
+        self.product_ids = merged
+
+    def close_day(self) -> None:
+        demand = self.today
+        self.window[:, self.closed_days % self.moving_average_days] = demand
+        error = demand - self.level
+        self.level += self.smoothing * error
+        self.variance = (1 - self.smoothing) * (self.variance + self.smoothing * error * error)
+        self.today = np.zeros_like(demand)
+        self.closed_days += 1
+        self.day += 1
+
+    def advance_to(self, day: int) -> None:
+        # Days older than the history window would be smoothed away anyway
+        if day - self.day > self.history_days:
+            self.day = day - self.history_days
+        while self.day < day:
+            self.close_day()
+
+    def ingest(self, product_ids, warehouse_ids, deltas, quantities, days, removed) -> None:
+        """Apply a batch of ledger movements, in ledger order.
+
+        All arguments are equally long arrays; `removed` flags movements
+        that deleted their product.
+        """
+        if not len(product_ids):
+            return
+        positions = self.positions(product_ids)
+        demand = (deltas < 0) & ~removed
+        for day in np.unique(days):
+            if day > self.day:
+                self.advance_to(int(day))
+            # Late movements of an already closed day count for the open one
+            rows = demand & (days == day)
+            self.today += np.bincount(positions[rows], weights=-deltas[rows], minlength=len(self.today))
+
+        # The last movement of each product carries its current state
+        reverse = positions[::-1]
+        unique, first = np.unique(reverse, return_index=True)
+        last = len(positions) - 1 - first
+        self.quantity[unique] = quantities[last]
+        self.warehouse_ids[unique] = np.where(removed[last], -1, warehouse_ids[last])
+
+    def metrics(self, rows=None, lead_time: float = FORECAST_LEAD_TIME_DAYS,
+                review: float = FORECAST_REVIEW_DAYS, z: float = FORECAST_SERVICE_LEVEL_Z) -> Dict:
+        """Forecast columns for `rows` (all products when None)."""
+        rows = slice(None) if rows is None else rows
+        observed = min(self.closed_days, self.moving_average_days)
+        quantity = self.quantity[rows]
+        daily = self.level[rows]
+        moving_average = self.window[rows, :observed].mean(axis=1) if observed else np.zeros_like(daily)
+        deviation = np.sqrt(self.variance[rows])
+        safety_stock = z * deviation * np.sqrt(lead_time)
+        reorder_point = daily * lead_time + safety_stock
+        with np.errstate(divide="ignore"):
+            days_left = np.where(daily > 0, quantity / np.where(daily > 0, daily, 1), np.inf)
+        suggested = np.where(
+            quantity <= reorder_point, np.ceil(reorder_point + daily * review - quantity), 0
+        ).clip(min=0)
+        return {
+            "product_id": self.product_ids[rows],
+            "warehouse_id": self.warehouse_ids[rows],
+            "quantity": quantity,
+            "moving_average": moving_average,
+            "smoothed_demand": daily,
+            "demand_std": deviation,
+            "safety_stock": safety_stock,
+            "reorder_point": reorder_point,
+            "days_until_stockout": days_left,
+            "suggested_order": suggested,
+        }
+
+
+def _record(columns: Dict, index: int) -> Dict:
+    record = {}
+    for name, column in columns.items():
+        value = column[index].item()
+        if isinstance(value, float) and not np.isfinite(value):
+            value = None
+        record[name] = value
+    record["warehouse_id"] = None if record["warehouse_id"] < 0 else record["warehouse_id"]
+    return record
+
+
+class Forecaster:
+    """Keeps a DemandModel in step with the stock ledger.
+
+    The first refresh loads every product and replays FORECAST_HISTORY_DAYS
+    of movements; later ones only read movements past the last one seen,
+    in columnar batches. Committed stock changes mark the model stale, so a
+    forecast requested after them refreshes it first.
+    """
+
+    def __init__(self):
+        self.model: Optional[DemandModel] = None
+        self.last_movement_id = 0
+        self.refreshed_at: Optional[datetime] = None
+        self.stale = True
+        self._metrics: Optional[Dict] = None
+        self._lock = threading.Lock()
+
+    @property
+    def available(self) -> bool:
+        # Checked without importing it
+        return np is not None or importlib.util.find_spec("numpy") is not None
+
+    def refresh(self, now: Optional[datetime] = None) -> None:
+        now = now or datetime.utcnow()
+        with self._lock:
+            self.stale = False
+            db = SessionLocal()
+            try:
+                if self.model is None:
+                    self._build(db, now)
+                self._read_movements(db)
+                self.model.advance_to(day_number(now))
+            except BaseException:
+                self.stale = True
+                raise
+            finally:
+                db.close()
+            self._metrics = self.model.metrics()
+            self.refreshed_at = now
+
+    def _build(self, db, now: datetime):
+        start = now - timedelta(days=FORECAST_HISTORY_DAYS)
+        model = DemandModel(day_number(start))
+        products = db.execute(
+            select(Product.id, Product.warehouse_id, Product.quantity).order_by(Product.id)
+        ).yield_per(FORECAST_BATCH_SIZE)
+        for batch in products.partitions():
+            ids, warehouses, quantities = zip(*batch)
+            model.load_products(
+                np.array(ids, dtype=np.int64),
+                np.array([-1 if id is None else id for id in warehouses], dtype=np.int64),
+                np.array([quantity or 0 for quantity in quantities], dtype=np.int64)
+            )
+        # Replay starts just before the history window
+        self.last_movement_id = db.query(func.max(StockMovement.id)).filter(
+            StockMovement.created_at < start
+        ).scalar() or 0
+        self.model = model
+
+    def _read_movements(self, db):
+        movements = db.execute(
+            select(
+                StockMovement.id, StockMovement.product_id, StockMovement.warehouse_id,
+                StockMovement.delta, StockMovement.quantity, StockMovement.kind, StockMovement.created_at
+            ).where(StockMovement.id > self.last_movement_id).order_by(StockMovement.id)
+        ).yield_per(FORECAST_BATCH_SIZE)
+        for batch in movements.partitions():
+            ids, products, warehouses, deltas, quantities, kinds, created = zip(*batch)
+            self.model.ingest(
+                np.array(products, dtype=np.int64),
+                np.array(warehouses, dtype=np.int64),
+                np.array(deltas, dtype=np.int64),
+                np.array(quantities, dtype=np.int64),
+                np.array(created, dtype="datetime64[D]").astype(np.int64),
+                np.isin(np.array(kinds), NOT_DEMAND)
+            )
+            self.last_movement_id = ids[-1]
+
+    def ensure_fresh(self) -> None:
+        if self.stale or self.model is None:
+            self.refresh()
+
+    async def fresh(self) -> "Forecaster":
+        """The forecaster with every committed movement applied, for handlers."""
+        if not self.available:
+            raise HTTPException(
+                status_code=status.HTTP_503_SERVICE_UNAVAILABLE,
+                detail="Forecasting needs numpy, which is not installed"
+            )
+        if self.stale or self.model is None:
+            await run_in_threadpool(self.ensure_fresh)
+        return self
+
+    def forecast(self, product_id: int, lead_time: Optional[float] = None) -> Optional[Dict]:
+        with self._lock:
+            model = self.model
+            position = int(np.searchsorted(model.product_ids, product_id))
+            if position >= len(model) or model.product_ids[position] != product_id:
+                return None
+            if lead_time is None:
+                return _record(self._metrics, position)
+            return _record(model.metrics(np.array([position]), lead_time), 0)
+
+    def suggestions(self, warehouse_id: int, lead_time: Optional[float] = None, limit: int = 100) -> List[Dict]:
+        """Products of a warehouse at or below their reorder point, soonest stock-out first."""
+        with self._lock:
+            rows = np.flatnonzero(self.model.warehouse_ids == warehouse_id)
+            if lead_time is None:
+                columns = {name: column[rows] for name, column in self._metrics.items()}
+            else:
+                columns = self.model.metrics(rows, lead_time)
+            due = np.flatnonzero(columns["suggested_order"] > 0)
+            due = due[np.argsort(columns["days_until_stockout"][due], kind="stable")][:limit]
+            return [_record(columns, index) for index in due]
+
+
+forecaster = Forecaster()
+
+
+def _mark_stale(changes):
+    forecaster.stale = True
+
+
+on_stock_committed(_mark_stale)
+
+
+async def refresh_periodically(interval: float) -> None:
+    """Fold new ledger movements into the model every `interval` seconds.
+
+    The first build waits one interval (or the first forecast request), so
+    starting a worker does not read the ledger.
+    """
+    while True:
+        await asyncio.sleep(interval)
+        try:
+            await run_in_threadpool(forecaster.refresh)
+        except Exception:
+            logger.exception("Demand forecast refresh failed")
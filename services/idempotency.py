@@ -0,0 +1,305 @@
+import asyncio
+import hashlib
+import json
+import threading
+import time
+from collections import OrderedDict
+from dataclasses import dataclass, field
+from typing import Dict, List, Optional, Tuple
+
+from jose import JWTError, jwt
+
+from config import (
+    ALGORITHM, IDEMPOTENCY_MAX_ENTRIES, IDEMPOTENCY_TTL_SECONDS, IDEMPOTENCY_WAIT_SECONDS, SECRET_KEY
+)
+from services.auth_cache import cached_claims
+from services.metrics import register_collector
+
+HEADER = "idempotency-key"
+REPLAYED_HEADER = "Idempotent-Replayed"
+MAX_KEY_LENGTH = 255
+# Writes retried by clients on timeouts
+IDEMPOTENT_ROUTES = {
+    ("POST", "/products/"),
+    ("POST", "/products/transfer"),
+    ("POST", "/products/transfer/bulk"),
+    ("POST", "/warehouses/"),
+    ("POST", "/jobs/"),
+}
+
+
+@dataclass
+class StoredResponse:
+    status: int
+    headers: List[Tuple[bytes, bytes]]
+    body: bytes
+
+
+@dataclass
+class IdempotencyRecord:
+    # sha256 of method, path, query and body; the principal is part of the key
+    fingerprint: bytes
+    response: Optional[StoredResponse] = None
+    # Set once the first request finished, successfully or not
+    done: asyncio.Event = field(default_factory=asyncio.Event)
+
+    @property
+    def size(self) -> int:
+        if self.response is None:
+            return len(self.fingerprint)
+        return len(self.fingerprint) + len(self.response.body) + sum(
+            len(name) + len(value) for name, value in self.response.headers
+        )
+
+
+class IdempotencyStore:
+    """Storage for the responses of requests sent with an Idempotency-Key.
+
+    `begin` atomically claims a key for a new request or returns the record
+    already holding it. The in-memory store is per process; deployments
+    with several workers should plug in a shared store.
+    """
+
+    def begin(self, key: str, fingerprint: bytes) -> Tuple[IdempotencyRecord, bool]:
+        raise NotImplementedError
+
+    def complete(self, key: str, response: StoredResponse) -> None:
+        raise NotImplementedError
+
+    def release(self, key: str) -> None:
+        raise NotImplementedError
+
+    async def wait(self, record: IdempotencyRecord, timeout: float) -> bool:
+        try:
+            await asyncio.wait_for(record.done.wait(), timeout)
+        except asyncio.TimeoutError:
+            return False
+        return True
+
+
+class InMemoryIdempotencyStore(IdempotencyStore):
+    """Records bounded by count and expiring TTL seconds after they were claimed.
+
+    Keys of requests still running are kept past both limits until the
+    request completes or releases them.
+    """
+
+    def __init__(self, max_entries: int, ttl: float):
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self.size = 0
+        self._entries: "OrderedDict[str, tuple]" = OrderedDict()
+        self._lock = threading.Lock()
+
+    def begin(self, key, fingerprint):
+        now = time.monotonic()
+        with self._lock:
+            self._evict(now)
+            item = self._entries.get(key)
+            if item is not None:
+                return item[1], False
+            record = IdempotencyRecord(fingerprint)
+            self._entries[key] = (now + self.ttl, record)
+            self.size += record.size
+            self._evict(now)
+            return record, True
+
+    def complete(self, key, response):
+        with self._lock:
+            item = self._entries.get(key)
+            if item is None:
+                return
+            record = item[1]
+            self.size -= record.size
+            record.response = response
+            self.size += record.size
+            record.done.set()
+
+    def release(self, key):
+        with self._lock:
+            item = self._entries.get(key)
+            self._remove(key)
+        if item is not None:
+            item[1].done.set()
+
+    def _evict(self, now: float):
+        # Entries are kept in claim order, so expired ones are at the front.
+        # Records still in progress are skipped: dropping one would let a
+        # retry claim the key and run the write a second time.
+        stale = []
+        for key, (expires_at, record) in self._entries.items():
+            if expires_at > now and len(self._entries) - len(stale) <= self.max_entries:
+                break
+            if record.done.is_set():
+                stale.append(key)
+        for key in stale:
+            self._remove(key)
+
+    def _remove(self, key: str):
+        item = self._entries.pop(key, None)
+        if item is not None:
+            self.size -= item[1].size
+
+    def __len__(self):
+        return len(self._entries)
+
+
+store: IdempotencyStore = InMemoryIdempotencyStore(IDEMPOTENCY_MAX_ENTRIES, IDEMPOTENCY_TTL_SECONDS)
+replays = 0
+conflicts = 0
+
+
+def set_store(backend: IdempotencyStore) -> None:
+    """Swap the record storage, e.g. for one shared by several workers."""
+    global store
+    store = backend
+
+
+def _principal(headers: Dict[bytes, bytes]) -> Optional[str]:
+    scheme, _, token = headers.get(b"authorization", b"").decode("latin-1").partition(" ")
+    if scheme.lower() != "bearer" or not token:
+        return None
+    try:
+        return cached_claims(token, lambda token: jwt.decode(token, SECRET_KEY, algorithms=[ALGORITHM])).get("sub")
+    except JWTError:
+        return None
+
+
+def _fingerprint(scope, body: bytes) -> bytes:
+    digest = hashlib.sha256()
+    for part in (scope["method"], scope["path"], scope.get("query_string", b"").decode("latin-1")):
+        digest.update(part.encode())
+        digest.update(b"\0")
+    digest.update(body)
+    return digest.digest()
+
+
+async def _send_json(send, status: int, detail: str):
+    body = json.dumps({"detail": detail}).encode()
+    await send({
+        "type": "http.response.start",
+        "status": status,
+        "headers": [(b"content-type", b"application/json"), (b"content-length", str(len(body)).encode())],
+    })
+    await send({"type": "http.response.body", "body": body})
+
+
+async def _replay(send, response: StoredResponse):
+    await send({
+        "type": "http.response.start",
+        "status": response.status,
+        "headers": response.headers + [(REPLAYED_HEADER.lower().encode(), b"true")],
+    })
+    await send({"type": "http.response.body", "body": response.body})
+
+
+class IdempotencyMiddleware:
+    """Runs a retried write at most once per Idempotency-Key.
+
+    Keys are scoped to the authenticated user. The first request with a key
+    runs normally and its response is kept for IDEMPOTENCY_TTL_SECONDS;
+    retries are answered from that record without touching the database.
+    A retry arriving while the first request is still running waits up to
+    IDEMPOTENCY_WAIT_SECONDS and then gets 409, and reusing a key for a
+    different request gets 422. Server errors are not kept, so the client
+    can retry them.
+    """
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        global replays, conflicts
+        if scope["type"] != "http" or (scope["method"], scope["path"]) not in IDEMPOTENT_ROUTES:
+            return await self.app(scope, receive, send)
+        headers = dict(scope["headers"])
+        key = headers.get(HEADER.encode(), b"").decode("latin-1").strip()
+        principal = _principal(headers) if key else None
+        if not key or principal is None:
+            # Unauthenticated requests are rejected by the route itself
+            return await self.app(scope, receive, send)
+        if len(key) > MAX_KEY_LENGTH:
+            return await _send_json(send, 400, f"Idempotency-Key is longer than {MAX_KEY_LENGTH} characters")
+
+        chunks = []
+        while True:
+            message = await receive()
+            if message["type"] == "http.disconnect":
+                return
+            chunks.append(message.get("body", b""))
+            if not message.get("more_body"):
+                break
+        body = b"".join(chunks)
+        fingerprint = _fingerprint(scope, body)
+        key = f"{principal}|{key}"
+
+        while True:
+            record, claimed = store.begin(key, fingerprint)
+            if claimed:
+                break
+            if record.fingerprint != fingerprint:
+                return await _send_json(send, 422, "Idempotency-Key was already used for a different request")
+            if record.response is None and not await store.wait(record, IDEMPOTENCY_WAIT_SECONDS):
+                conflicts += 1
+                return await _send_json(send, 409, "A request with this Idempotency-Key is still in progress")
+            if record.response is not None:
+                replays += 1
+                return await _replay(send, record.response)
+            # The first attempt failed and released the key, run this one instead
+
+        started: Optional[dict] = None
+        response_chunks = []
+
+        async def send_wrapper(message):
+            nonlocal started
+            if message["type"] == "http.response.start":
+                started = message
+            elif message["type"] == "http.response.body":
+                response_chunks.append(message.get("body", b""))
+            await send(message)
+
+        try:
+            await self.app(scope, _replay_body(body, receive), send_wrapper)
+        except BaseException:
+            store.release(key)
+            raise
+        if started is None or started["status"] >= 500:
+            store.release(key)
+        else:
+            store.complete(key, StoredResponse(
+                started["status"], list(started.get("headers", [])), b"".join(response_chunks)
+            ))
+
+
+def _replay_body(body: bytes, receive):
+    """Hand the already read body to the app, then pass through disconnects."""
+    sent = False
+
+    async def replay():
+        nonlocal sent
+        if not sent:
+            sent = True
+            return {"type": "http.request", "body": body, "more_body": False}
+        return await receive()
+
+    return replay
+
+
+def _collect():
+    lines = [
+        "# TYPE idempotency_replays_total counter",
+        f"idempotency_replays_total {replays}",
+        "# TYPE idempotency_conflicts_total counter",
+        f"idempotency_conflicts_total {conflicts}",
+    ]
+    if isinstance(store, InMemoryIdempotencyStore):
+        lines += [
+            "# TYPE idempotency_entries gauge",
+            f"idempotency_entries {len(store)}",
+            "# TYPE idempotency_bytes gauge",
+            f"idempotency_bytes {store.size}",
+        ]
+    return lines
+
+
+register_collector(_collect)
@@ -0,0 +1,135 @@
+import logging
+import time
+from contextvars import ContextVar
+from typing import List, Optional, Tuple
+
+from sqlalchemy import event
+from sqlalchemy.engine import Engine
+
+from config import SLOW_REQUEST_MS
+from services.metrics import Counter, Gauge, HistogramFamily, histogram_lines, register_collector
+from services.pool_metrics import pool_status
+
+logger = logging.getLogger("smart_stock.slow_requests")
+
+ROUTE_LABELS = ("method", "route")
+
+requests_total = Counter(
+    "http_requests_total", "HTTP requests by route and status", ("method", "route", "status")
+)
+request_duration = HistogramFamily(
+    "http_request_duration_seconds", "Request latency", ROUTE_LABELS
+)
+requests_in_flight = Gauge("http_requests_in_flight", "Requests currently being served")
+response_size = HistogramFamily(
+    "http_response_size_bytes", "Response body size", ROUTE_LABELS,
+    buckets=(100, 1000, 10_000, 100_000, 1_000_000, 10_000_000)
+)
+sql_statements = HistogramFamily(
+    "http_request_sql_statements", "SQL statements executed per request", ROUTE_LABELS,
+    buckets=(0, 1, 2, 3, 5, 10, 20, 50, 100)
+)
+sql_duration = HistogramFamily(
+    "http_request_sql_duration_seconds", "Time spent in SQL per request", ROUTE_LABELS
+)
+
+
+class RequestStats:
+    __slots__ = ("statements", "sql_seconds", "queries")
+
+    def __init__(self, capture_sql: bool):
+        self.statements = 0
+        self.sql_seconds = 0.0
+        # Only filled when the slow-request log is on
+        self.queries: Optional[List[Tuple[float, str]]] = [] if capture_sql else None
+
+
+_current: ContextVar[Optional[RequestStats]] = ContextVar("request_stats", default=None)
+
+
+def _before_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    if context is not None:
+        context._metrics_started = time.perf_counter()
+
+
+def _after_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    stats = _current.get()
+    if stats is not None and context is not None:
+        elapsed = time.perf_counter() - context._metrics_started
+        stats.statements += 1
+        stats.sql_seconds += elapsed
+        if stats.queries is not None:
+            stats.queries.append((elapsed, statement))
+
+
+def instrument_engine(engine: Engine, name: str) -> None:
+    """Count SQL per request on `engine` and expose its pool on /metrics."""
+    event.listen(engine, "before_cursor_execute", _before_cursor_execute)
+    event.listen(engine, "after_cursor_execute", _after_cursor_execute)
+
+    def collect():
+        status = pool_status(engine.pool)
+        labels = f'{{engine="{name}"}}'
+        for key in ("checked_out", "checked_in", "overflow", "timeouts"):
+            if key in status:
+                yield f"db_pool_{key}{labels} {status[key]}"
+        stats = getattr(engine.pool, "stats", None)
+        if stats is not None:
+            yield from histogram_lines("db_pool_wait_seconds", ("engine",), (name,), stats.wait)
+            yield from histogram_lines("db_pool_checkout_seconds", ("engine",), (name,), stats.checkout)
+
+    register_collector(collect)
+
+
+def _route_label(scope) -> str:
+    route = scope.get("route")
+    # Unmatched paths share one label so scanners cannot blow up cardinality
+    return getattr(route, "path", "other")
+
+
+class MetricsMiddleware:
+    """Pure ASGI middleware recording latency, sizes and SQL per route."""
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            return await self.app(scope, receive, send)
+
+        stats = RequestStats(capture_sql=SLOW_REQUEST_MS > 0)
+        token = _current.set(stats)
+        status_code = 500
+        body_size = 0
+
+        async def send_wrapper(message):
+            nonlocal status_code, body_size
+            if message["type"] == "http.response.start":
+                status_code = message["status"]
+            elif message["type"] == "http.response.body":
+                body_size += len(message.get("body", b""))
+            await send(message)
+
+        requests_in_flight.inc()
+        started = time.perf_counter()
+        try:
+            await self.app(scope, receive, send_wrapper)
+        finally:
+            elapsed = time.perf_counter() - started
+            requests_in_flight.dec()
+            _current.reset(token)
+
+            labels = (scope["method"], _route_label(scope))
+            requests_total.inc(labels + (str(status_code),))
+            request_duration.observe(labels, elapsed)
+            response_size.observe(labels, body_size)
+            sql_statements.observe(labels, stats.statements)
+            sql_duration.observe(labels, stats.sql_seconds)
+
+            if stats.queries is not None and elapsed * 1000 >= SLOW_REQUEST_MS:
+                logger.warning(
+                    "Slow request %s %s: %.1fms, %d SQL statements (%.1fms)\n%s",
+                    scope["method"], scope["path"], elapsed * 1000,
+                    stats.statements, stats.sql_seconds * 1000,
+                    "\n".join(f"  [{seconds * 1000:.1f}ms] {sql}" for seconds, sql in stats.queries)
+                )
@@ -0,0 +1,353 @@
+import logging
+import os
+import random
+import socket
+import threading
+import time
+from collections import Counter
+from concurrent.futures import ThreadPoolExecutor
+from dataclasses import dataclass
+from datetime import datetime, timedelta
+from typing import Any, Callable, Dict, Optional, Set, Type
+
+from fastapi import HTTPException
+from fastapi.encoders import jsonable_encoder
+from pydantic import BaseModel, ValidationError
+from sqlalchemy import and_, event, func, or_, update
+from sqlalchemy.orm import Session
+
+from config import (
+    JOB_CONCURRENCY, JOB_MAX_ATTEMPTS, JOB_POLL_SECONDS, JOB_RETRY_BASE_SECONDS, JOB_RETRY_MAX_SECONDS,
+    JOB_STALE_SECONDS, JOB_WORKERS
+)
+from database import SessionLocal
+from models.job import FAILED, QUEUED, RUNNING, SUCCEEDED, Job
+from services.metrics import register_collector
+from services.tenancy import set_tenant
+
+logger = logging.getLogger("smart_stock.jobs")
+
+# Set on a session that enqueued jobs, so its commit wakes the workers
+WAKE_KEY = "jobs_enqueued"
+
+
+class JobFailed(Exception):
+    """Raised by a handler for errors that retrying cannot fix."""
+
+
+class JobInterrupted(Exception):
+    """Raised from JobContext.progress while the runner shuts down."""
+
+
+@dataclass
+class JobType:
+    name: str
+    handler: Callable[[Session, Any, "JobContext"], Optional[Dict]]
+    concurrency: int
+    max_attempts: int
+    # Payload model; types without one cannot be enqueued through the API
+    schema: Optional[Type[BaseModel]] = None
+
+
+job_types: Dict[str, JobType] = {}
+
+
+def job_type(
+    name: str,
+    concurrency: int = 1,
+    max_attempts: int = JOB_MAX_ATTEMPTS,
+    schema: Optional[Type[BaseModel]] = None
+):
+    """Register the handler of a job type, called as handler(db, payload, context).
+
+    `db` is scoped to the tenant that enqueued the job. The handler commits
+    its own work and may return a JSON-serializable result. At most
+    `concurrency` jobs of the type run at once per process, unless
+    JOB_CONCURRENCY says otherwise.
+    """
+    def register(handler):
+        job_types[name] = JobType(name, handler, JOB_CONCURRENCY.get(name, concurrency), max_attempts, schema)
+        return handler
+
+    return register
+
+
+def enqueue(db: Session, type: str, payload: Dict, owner_id: Optional[int] = None, delay: float = 0) -> Job:
+    """Add a job in the current transaction; workers pick it up once it commits."""
+    job = Job(
+        type=type,
+        payload=jsonable_encoder(payload),
+        owner_id=owner_id,
+        status=QUEUED,
+        max_attempts=job_types[type].max_attempts,
+        run_after=datetime.utcnow() + timedelta(seconds=delay)
+    )
+    db.add(job)
+    db.flush()
+    db.info[WAKE_KEY] = True
+    return job
+
+
+def retry_delay(attempt: int) -> float:
+    """Exponential backoff with jitter, so failed jobs do not retry in lockstep."""
+    delay = min(JOB_RETRY_MAX_SECONDS, JOB_RETRY_BASE_SECONDS * 2 ** (attempt - 1))
+    return random.uniform(delay / 2, delay)
+
+
+def _is_permanent(error: Exception) -> bool:
+    if isinstance(error, (JobFailed, ValidationError)):
+        return True
+    # Handlers reuse the request code paths; client errors will not go away,
+    # conflicts with concurrent writers may
+    return isinstance(error, HTTPException) and error.status_code < 500 and error.status_code != 409
+
+
+def _describe(error: Exception) -> str:
+    if isinstance(error, HTTPException):
+        return str(error.detail)
+    return str(error) or type(error).__name__
+
+
+class JobContext:
+    """Handed to a handler to report progress while it runs."""
+
+    def __init__(self, runner: "JobRunner", job_id: int, attempt: int):
+        self.runner = runner
+        self.job_id = job_id
+        self.attempt = attempt
+
+    def progress(self, done: int, total: Optional[int] = None) -> None:
+        """Record progress; also the point where a shutdown interrupts the job.
+
+        Handlers must have committed what `done` covers, since an
+        interrupted job starts over on another attempt.
+        """
+        values = {"progress_done": done, "heartbeat_at": datetime.utcnow()}
+        if total is not None:
+            values["progress_total"] = total
+        self.runner._update(self.job_id, **values)
+        if self.runner.stopping:
+            raise JobInterrupted()
+
+
+class JobRunner:
+    """Runs queued jobs on a pool of worker threads.
+
+    A dispatcher thread claims jobs with conditional UPDATEs, so several
+    processes can share the jobs table, keeping each type under its
+    concurrency limit, and refreshes the heartbeats of running jobs. A
+    failed job is retried with exponential backoff until its attempts are
+    used up; one whose process died is taken over once its heartbeat is
+    older than JOB_STALE_SECONDS.
+    """
+
+    def __init__(
+        self,
+        workers: int = JOB_WORKERS,
+        poll_seconds: float = JOB_POLL_SECONDS,
+        stale_seconds: float = JOB_STALE_SECONDS
+    ):
+        self.workers = workers
+        self.poll_seconds = poll_seconds
+        self.stale_seconds = stale_seconds
+        self.name = f"{socket.gethostname()}:{os.getpid()}"
+        self.running: Counter = Counter()
+        self.finished: Counter = Counter()
+        self._jobs: Set[int] = set()
+        self._lock = threading.Lock()
+        self._wake = threading.Event()
+        self._stopped = threading.Event()
+        self._executor: Optional[ThreadPoolExecutor] = None
+        self._thread: Optional[threading.Thread] = None
+
+    @property
+    def stopping(self) -> bool:
+        return self._stopped.is_set()
+
+    def start(self) -> None:
+        self._stopped.clear()
+        self._executor = ThreadPoolExecutor(max_workers=self.workers, thread_name_prefix="job-worker")
+        self._thread = threading.Thread(target=self._dispatch, name="job-dispatcher", daemon=True)
+        self._thread.start()
+
+    def stop(self, timeout: float = 10) -> None:
+        """Stop claiming jobs and wait for the running ones to finish or be interrupted."""
+        self._stopped.set()
+        self._wake.set()
+        if self._thread is not None:
+            self._thread.join(timeout)
+            self._thread = None
+        if self._executor is not None:
+            self._executor.shutdown(wait=True)
+            self._executor = None
+
+    def wake(self) -> None:
+        self._wake.set()
+
+    def _dispatch(self):
+        last_heartbeat = 0.0
+        while not self._stopped.is_set():
+            self._wake.clear()
+            claimed = 0
+            try:
+                if time.monotonic() - last_heartbeat > self.stale_seconds / 3:
+                    self._heartbeat()
+                    last_heartbeat = time.monotonic()
+                claimed = self._claim()
+            except Exception:
+                logger.exception("Job dispatcher failed")
+            if not claimed:
+                self._wake.wait(self.poll_seconds)
+
+    def _claimable(self, types, now: datetime):
+        return and_(
+            Job.type.in_(types),
+            or_(
+                and_(Job.status == QUEUED, Job.run_after <= now),
+                # Its worker stopped sending heartbeats
+                and_(Job.status == RUNNING, Job.heartbeat_at < now - timedelta(seconds=self.stale_seconds))
+            )
+        )
+
+    def _claim(self) -> int:
+        with self._lock:
+            free = self.workers - len(self._jobs)
+            types = [name for name, type in job_types.items() if self.running[name] < type.concurrency]
+        if free <= 0 or not types:
+            return 0
+        now = datetime.utcnow()
+        claimable = self._claimable(types, now)
+        claimed = 0
+        db = SessionLocal()
+        try:
+            candidates = db.query(Job.id, Job.type).filter(claimable).order_by(Job.run_after, Job.id).limit(free * 4).all()
+            for id, type in candidates:
+                if claimed >= free:
+                    break
+                with self._lock:
+                    if self.running[type] >= job_types[type].concurrency:
+                        continue
+                # Another worker may have claimed it since the SELECT
+                taken = db.execute(
+                    update(Job).where(Job.id == id, claimable).values(
+                        status=RUNNING, worker=self.name, attempts=Job.attempts + 1,
+                        started_at=now, heartbeat_at=now
+                    ).execution_options(synchronize_session=False)
+                ).rowcount
+                db.commit()
+                if taken:
+                    with self._lock:
+                        self.running[type] += 1
+                        self._jobs.add(id)
+                    self._executor.submit(self._run, id, type)
+                    claimed += 1
+        finally:
+            db.close()
+        return claimed
+
+    def _heartbeat(self):
+        with self._lock:
+            ids = list(self._jobs)
+        if ids:
+            db = SessionLocal()
+            try:
+                db.execute(
+                    update(Job).where(Job.id.in_(ids), Job.worker == self.name, Job.status == RUNNING)
+                    .values(heartbeat_at=datetime.utcnow()).execution_options(synchronize_session=False)
+                )
+                db.commit()
+            finally:
+                db.close()
+
+    def _update(self, job_id: int, **values) -> bool:
+        # Only while this worker still owns the job; one taken over is left alone
+        db = SessionLocal()
+        try:
+            updated = db.execute(
+                update(Job).where(Job.id == job_id, Job.worker == self.name, Job.status == RUNNING)
+                .values(**values).execution_options(synchronize_session=False)
+            ).rowcount
+            db.commit()
+            return bool(updated)
+        finally:
+            db.close()
+
+    def _finish(self, job_id: int, type: str, status: str, **values) -> None:
+        self._update(job_id, status=status, finished_at=datetime.utcnow(), **values)
+        with self._lock:
+            self.finished[type, status] += 1
+
+    def _run(self, job_id: int, type: str):
+        job_type = job_types[type]
+        attempt, max_attempts = 1, job_type.max_attempts
+        db = SessionLocal()
+        try:
+            job = db.get(Job, job_id)
+            attempt, max_attempts = job.attempts, job.max_attempts
+            owner_id, payload = job.owner_id, job.payload
+            db.rollback()
+            if attempt > max_attempts:
+                # Its earlier workers died while running it
+                raise JobFailed("Job was abandoned by its workers too often")
+            set_tenant(db, owner_id)
+            if job_type.schema is not None:
+                payload = job_type.schema.parse_obj(payload)
+            result = job_type.handler(db, payload, JobContext(self, job_id, attempt))
+            db.commit()
+            self._finish(
+                job_id, type, SUCCEEDED, result=jsonable_encoder(result), error=None,
+                progress_done=func.coalesce(Job.progress_total, Job.progress_done)
+            )
+        except JobInterrupted:
+            db.rollback()
+            # Not the job's fault, the attempt does not count
+            self._update(job_id, status=QUEUED, worker=None, attempts=Job.attempts - 1, run_after=datetime.utcnow())
+        except Exception as error:
+            db.rollback()
+            message = _describe(error)
+            if _is_permanent(error) or attempt >= max_attempts:
+                logger.warning("Job %s (%s) failed after %s attempts: %s", job_id, type, attempt, message)
+                self._finish(job_id, type, FAILED, error=message)
+            else:
+                logger.info("Job %s (%s) failed, retrying: %s", job_id, type, message)
+                self._update(
+                    job_id, status=QUEUED, worker=None, error=message,
+                    run_after=datetime.utcnow() + timedelta(seconds=retry_delay(attempt))
+                )
+        finally:
+            db.close()
+            with self._lock:
+                self.running[type] -= 1
+                self._jobs.discard(job_id)
+            self._wake.set()
+
+
+job_runner = JobRunner()
+
+
+@event.listens_for(Session, "after_commit")
+def _wake_workers(db: Session):
+    if db.info.pop(WAKE_KEY, None):
+        job_runner.wake()
+
+
+@event.listens_for(Session, "after_rollback")
+def _forget_wake(db: Session):
+    db.info.pop(WAKE_KEY, None)
+
+
+def _collect():
+    with job_runner._lock:
+        running = dict(job_runner.running)
+        finished = dict(job_runner.finished)
+    lines = ["# TYPE jobs_running gauge"]
+    lines += [f'jobs_running{{type="{type}"}} {count}' for type, count in sorted(running.items())]
+    lines.append("# TYPE jobs_finished_total counter")
+    lines += [
+        f'jobs_finished_total{{type="{type}",status="{status}"}} {count}'
+        for (type, status), count in sorted(finished.items())
+    ]
+    return lines
+
+
+register_collector(_collect)
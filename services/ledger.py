@@ -0,0 +1,105 @@
+import asyncio
+import logging
+from datetime import datetime, timedelta
+from typing import Dict, Iterable, Optional
+
+from sqlalchemy import func
+from sqlalchemy.orm import Session
+from starlette.concurrency import run_in_threadpool
+
+from config import STOCK_SNAPSHOT_LAG_SECONDS
+from database import SessionLocal
+from models.product import Product
+from models.stock_movement import StockMovement, StockSnapshot
+from models.warehouse import Warehouse
+
+logger = logging.getLogger("smart_stock.ledger")
+
+
+def latest_snapshot(db: Session, warehouse_id: int, at: Optional[datetime] = None) -> Optional[StockSnapshot]:
+    query = db.query(StockSnapshot).filter(StockSnapshot.warehouse_id == warehouse_id)
+    if at is not None:
+        query = query.filter(StockSnapshot.taken_at <= at)
+    return query.order_by(StockSnapshot.taken_at.desc(), StockSnapshot.id.desc()).first()
+
+
+def stock_as_of(db: Session, warehouse_id: int, as_of: datetime) -> Dict[int, int]:
+    """Quantity per product of a warehouse at `as_of`.
+
+    Starts from the latest snapshot before `as_of` and replays only the
+    movements after it. Before the warehouse's first snapshot the result
+    only reflects what the ledger recorded.
+    """
+    snapshot = latest_snapshot(db, warehouse_id, as_of)
+    quantities = {int(id): quantity for id, quantity in snapshot.data.items()} if snapshot else {}
+    replay = db.query(StockMovement.product_id, func.sum(StockMovement.delta)).filter(
+        StockMovement.warehouse_id == warehouse_id,
+        StockMovement.created_at <= as_of
+    )
+    if snapshot is not None:
+        replay = replay.filter(StockMovement.created_at > snapshot.taken_at)
+    for product_id, delta in replay.group_by(StockMovement.product_id):
+        quantities[product_id] = quantities.get(product_id, 0) + delta
+    return {id: quantity for id, quantity in sorted(quantities.items()) if quantity}
+
+
+def take_snapshot(db: Session, warehouse_id: int, now: Optional[datetime] = None) -> Optional[StockSnapshot]:
+    """Roll the warehouse's latest snapshot forward, if anything moved since.
+
+    Snapshots stay STOCK_SNAPSHOT_LAG_SECONDS behind `now` so a transaction
+    stamped before the cutoff but committing after it is never left out.
+    A warehouse's first snapshot is read from the products table instead,
+    which also covers stock that predates the ledger.
+    """
+    now = now or datetime.utcnow()
+    previous = latest_snapshot(db, warehouse_id)
+    if previous is None:
+        data = {
+            str(id): quantity
+            for id, quantity in db.query(Product.id, Product.quantity).filter(
+                Product.warehouse_id == warehouse_id, Product.quantity != 0
+            )
+        }
+        snapshot = StockSnapshot(warehouse_id=warehouse_id, taken_at=now, data=data)
+    else:
+        cutoff = now - timedelta(seconds=STOCK_SNAPSHOT_LAG_SECONDS)
+        moved = previous.taken_at < cutoff and db.query(
+            db.query(StockMovement.id).filter(
+                StockMovement.warehouse_id == warehouse_id,
+                StockMovement.created_at > previous.taken_at,
+                StockMovement.created_at <= cutoff
+            ).exists()
+        ).scalar()
+        if not moved:
+            return None
+        data = {str(id): quantity for id, quantity in stock_as_of(db, warehouse_id, cutoff).items()}
+        snapshot = StockSnapshot(warehouse_id=warehouse_id, taken_at=cutoff, data=data)
+    db.add(snapshot)
+    db.commit()
+    return snapshot
+
+
+def take_snapshots(db: Session, warehouse_ids: Optional[Iterable[int]] = None) -> int:
+    """Snapshot every (or the given) warehouse; returns how many were taken."""
+    if warehouse_ids is None:
+        warehouse_ids = [id for (id,) in db.query(Warehouse.id).order_by(Warehouse.id)]
+    return sum(take_snapshot(db, warehouse_id) is not None for warehouse_id in warehouse_ids)
+
+
+def _snapshot_all() -> int:
+    db = SessionLocal()
+    try:
+        return take_snapshots(db)
+    finally:
+        db.close()
+
+
+async def snapshot_periodically(interval: float) -> None:
+    """Keep replays bounded by snapshotting every `interval` seconds."""
+    while True:
+        await asyncio.sleep(interval)
+        try:
+            taken = await run_in_threadpool(_snapshot_all)
+            logger.info("Took %d stock snapshots", taken)
+        except Exception:
+            logger.exception("Stock snapshot run failed")
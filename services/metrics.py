@@ -0,0 +1,133 @@
+import threading
+from bisect import bisect_left
+from typing import Callable, Dict, Iterable, List, Sequence, Tuple
+
+# Latency buckets in seconds, from 1ms to 10s
+DEFAULT_BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+
+
+class Histogram:
+    """Fixed-bucket histogram that is cheap enough to update on every call."""
+
+    def __init__(self, buckets: Sequence[float] = DEFAULT_BUCKETS):
+        self.buckets = tuple(buckets)
+        self._counts = [0] * (len(self.buckets) + 1)
+        self._sum = 0.0
+        self._lock = threading.Lock()
+
+    def observe(self, value: float) -> None:
+        index = bisect_left(self.buckets, value)
+        with self._lock:
+            self._counts[index] += 1
+            self._sum += value
+
+    def snapshot(self) -> Dict:
+        """Cumulative bucket counts keyed by upper bound, plus sum and count."""
+        with self._lock:
+            counts = list(self._counts)
+            total = self._sum
+        cumulative, buckets = 0, {}
+        for bound, count in zip(self.buckets + (float("inf"),), counts):
+            cumulative += count
+            buckets["+Inf" if bound == float("inf") else str(bound)] = cumulative
+        return {"buckets": buckets, "sum": total, "count": cumulative}
+
+
+# --- Prometheus exposition ---
+
+Labels = Tuple[str, ...]
+# Extra sources of samples, e.g. pool or cache counters read at scrape time
+_collectors: List[Callable[[], Iterable[str]]] = []
+_families: List["_Family"] = []
+
+
+def _format_labels(names: Sequence[str], values: Labels, extra: str = "") -> str:
+    pairs = [f'{name}="{value}"' for name, value in zip(names, values)]
+    if extra:
+        pairs.append(extra)
+    return "{" + ",".join(pairs) + "}" if pairs else ""
+
+
+class _Family:
+    kind = ""
+
+    def __init__(self, name: str, help: str, labels: Sequence[str] = ()):
+        self.name = name
+        self.help = help
+        self.label_names = tuple(labels)
+        self._lock = threading.Lock()
+        _families.append(self)
+
+    def header(self) -> List[str]:
+        return [f"# HELP {self.name} {self.help}", f"# TYPE {self.name} {self.kind}"]
+
+
+class Counter(_Family):
+    kind = "counter"
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self._values: Dict[Labels, float] = {}
+
+    def inc(self, labels: Labels = (), amount: float = 1) -> None:
+        with self._lock:
+            self._values[labels] = self._values.get(labels, 0) + amount
+
+    def collect(self) -> List[str]:
+        return self.header() + [
+            f"{self.name}{_format_labels(self.label_names, labels)} {value}"
+            for labels, value in list(self._values.items())
+        ]
+
+
+class Gauge(Counter):
+    kind = "gauge"
+
+    def dec(self, labels: Labels = (), amount: float = 1) -> None:
+        self.inc(labels, -amount)
+
+
+class HistogramFamily(_Family):
+    kind = "histogram"
+
+    def __init__(self, name, help, labels=(), buckets: Sequence[float] = DEFAULT_BUCKETS):
+        super().__init__(name, help, labels)
+        self.buckets = buckets
+        self._histograms: Dict[Labels, Histogram] = {}
+
+    def observe(self, labels: Labels, value: float) -> None:
+        histogram = self._histograms.get(labels)
+        if histogram is None:
+            with self._lock:
+                histogram = self._histograms.setdefault(labels, Histogram(self.buckets))
+        histogram.observe(value)
+
+    def collect(self) -> List[str]:
+        lines = self.header()
+        for labels, histogram in list(self._histograms.items()):
+            lines.extend(histogram_lines(self.name, self.label_names, labels, histogram))
+        return lines
+
+
+def histogram_lines(name: str, label_names: Sequence[str], labels: Labels, histogram: Histogram) -> List[str]:
+    snapshot = histogram.snapshot()
+    lines = []
+    for bound, count in snapshot["buckets"].items():
+        bucket_labels = _format_labels(label_names, labels, 'le="%s"' % bound)
+        lines.append(f"{name}_bucket{bucket_labels} {count}")
+    lines.append(f"{name}_sum{_format_labels(label_names, labels)} {snapshot['sum']}")
+    lines.append(f"{name}_count{_format_labels(label_names, labels)} {snapshot['count']}")
+    return lines
+
+
+def register_collector(collector: Callable[[], Iterable[str]]) -> None:
+    _collectors.append(collector)
+
+
+def render_metrics() -> str:
+    lines: List[str] = []
+    for family in _families:
+        lines.extend(family.collect())
+    for collector in _collectors:
+        lines.extend(collector())
+    return "\n".join(lines) + "\n"
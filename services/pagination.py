@@ -0,0 +1,46 @@
+import base64
+import json
+from typing import Optional
+
+from fastapi import HTTPException, Response, status
+
+# Response header carrying the cursor of the next page
+NEXT_CURSOR_HEADER = "X-Next-Cursor"
+
+
+def encode_cursor(last_id: int) -> str:
+    """Build an opaque cursor pointing after the row with `last_id`."""
+    raw = json.dumps({"id": last_id}, separators=(",", ":")).encode()
+    return base64.urlsafe_b64encode(raw).decode().rstrip("=")
+
+
+def decode_cursor(cursor: str) -> int:
+    """Return the last seen id stored in a cursor built by `encode_cursor`."""
+    try:
+        padded = cursor + "=" * (-len(cursor) % 4)
+        last_id = json.loads(base64.urlsafe_b64decode(padded.encode()))["id"]
+        if not isinstance(last_id, int):
+            raise ValueError(cursor)
+    except (ValueError, KeyError, TypeError):
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail="Invalid cursor"
+        )
+    return last_id
+
+
+def paginate_by_id(query, id_column, cursor: Optional[str], skip: int, limit: int):
+    """Apply keyset pagination on `id_column`, falling back to offset paging.
+
+    `skip` is only honoured when no cursor is given, for older clients.
+    """
+    query = query.order_by(id_column)
+    if cursor:
+        return query.filter(id_column > decode_cursor(cursor)).limit(limit)
+    return query.offset(skip).limit(limit)
+
+
+def set_next_cursor(response: Response, rows, limit: int):
+    """Expose the cursor of the next page when the current page is full."""
+    if rows and len(rows) == limit:
+        response.headers[NEXT_CURSOR_HEADER] = encode_cursor(rows[-1].id)
@@ -0,0 +1,69 @@
+import asyncio
+from concurrent.futures import Executor, ProcessPoolExecutor, ThreadPoolExecutor
+from functools import lru_cache
+from typing import Optional, Tuple
+
+from config import BCRYPT_ROUNDS, PASSWORD_HASH_EXECUTOR, PASSWORD_HASH_WORKERS
+
+_executor: Optional[Executor] = None
+
+
+@lru_cache(maxsize=None)
+def get_pwd_context():
+    """Password hashing context, built on first use so workers start without passlib."""
+    from passlib.context import CryptContext
+
+    return CryptContext(schemes=["bcrypt"], deprecated="auto", bcrypt__rounds=BCRYPT_ROUNDS)
+
+
+def _hash(password: str) -> str:
+    return get_pwd_context().hash(password)
+
+
+def _verify_and_upgrade(plain_password: str, hashed_password: str) -> Tuple[bool, Optional[str]]:
+    pwd_context = get_pwd_context()
+    if not pwd_context.verify(plain_password, hashed_password):
+        return False, None
+    # Re-hash with the current cost while the plain password is at hand
+    if pwd_context.needs_update(hashed_password):
+        return True, pwd_context.hash(plain_password)
+    return True, None
+
+
+def configure_executor(workers: int = PASSWORD_HASH_WORKERS, kind: str = PASSWORD_HASH_EXECUTOR) -> Executor:
+    """(Re)create the bounded pool that runs every bcrypt call."""
+    global _executor
+    shutdown_executor()
+    if kind == "process":
+        _executor = ProcessPoolExecutor(max_workers=workers)
+    else:
+        _executor = ThreadPoolExecutor(max_workers=workers, thread_name_prefix="password-hash")
+    return _executor
+
+
+def shutdown_executor() -> None:
+    global _executor
+    if _executor is not None:
+        _executor.shutdown(wait=False)
+        _executor = None
+
+
+def _get_executor() -> Executor:
+    return _executor or configure_executor()
+
+
+async def hash_password(password: str) -> str:
+    loop = asyncio.get_running_loop()
+    return await loop.run_in_executor(_get_executor(), _hash, password)
+
+
+async def verify_and_upgrade(plain_password: str, hashed_password: str) -> Tuple[bool, Optional[str]]:
+    """Check a password off the event loop.
+
+    Returns whether it matched and, when the stored hash uses outdated
+    settings, a replacement hash to persist.
+    """
+    loop = asyncio.get_running_loop()
+    return await loop.run_in_executor(
+        _get_executor(), _verify_and_upgrade, plain_password, hashed_password
+    )
@@ -0,0 +1,331 @@
+import heapq
+import threading
+import time
+from bisect import bisect_right
+from typing import Dict, Iterable, List, Optional, Set, Tuple
+
+from sqlalchemy import event, inspect
+from sqlalchemy.orm import Session
+
+from config import PLACEMENT_REFRESH_SECONDS
+from models.warehouse import Warehouse
+from models.warehouse_stock import WarehouseStock
+from services.stock_changes import on_stock_committed
+from services.tenancy import ALL_TENANTS
+
+PENDING_KEY = "placement_pending"
+# Warehouse fields that decide where (and whether) a warehouse is indexed
+PLACEMENT_FIELDS = ("owner_id", "warehouse_type", "location", "rental_price", "capacity", "is_available")
+# How often the check against the database may correct a stale candidate
+MAX_RETRIES = 3
+
+BucketKey = Tuple[Optional[int], str, str]
+# (type, location) of a bucket inside its owner's buckets
+PlaceKey = Tuple[str, str]
+
+
+def _normalize(value: Optional[str]) -> str:
+    return (value or "").strip().lower()
+
+
+class CapacityBucket:
+    """Warehouses of one owner, type and location, cheapest first.
+
+    A max segment tree over their free capacity finds the cheapest
+    warehouse with room for a quantity, under a price limit, in O(log n).
+    Free capacity changes are O(log n) point updates.
+    """
+
+    def __init__(self, entries: Iterable[Tuple[float, int, int]]):
+        entries = sorted(entries)
+        self.prices = [price for price, _, _ in entries]
+        self.ids = [id for _, id, _ in entries]
+        self.positions = {id: position for position, id in enumerate(self.ids)}
+        self.size = 1
+        while self.size < max(len(entries), 1):
+            self.size *= 2
+        self.tree = [-1] * (2 * self.size)
+        for position, (_, _, free) in enumerate(entries):
+            self.tree[self.size + position] = free
+        for node in range(self.size - 1, 0, -1):
+            self.tree[node] = max(self.tree[2 * node], self.tree[2 * node + 1])
+
+    def __len__(self):
+        return len(self.ids)
+
+    def free(self, position: int) -> int:
+        return self.tree[self.size + position]
+
+    def update(self, warehouse_id: int, delta: int) -> None:
+        node = self.size + self.positions[warehouse_id]
+        self.tree[node] += delta
+        node //= 2
+        while node:
+            self.tree[node] = max(self.tree[2 * node], self.tree[2 * node + 1])
+            node //= 2
+
+    def first_fit(self, quantity: int, max_price: Optional[float] = None, start: int = 0) -> Optional[int]:
+        """Position of the cheapest warehouse at or after `start` with at
+        least `quantity` free and a price up to `max_price`."""
+        end = len(self.ids) if max_price is None else bisect_right(self.prices, max_price)
+        if start >= end:
+            return None
+        return self._descend(1, 0, self.size, start, end, quantity)
+
+    def _descend(self, node: int, low: int, high: int, start: int, end: int, quantity: int) -> Optional[int]:
+        # Leftmost leaf in [start, end) of the subtree covering [low, high)
+        if high <= start or end <= low or self.tree[node] < quantity:
+            return None
+        if high - low == 1:
+            return low
+        middle = (low + high) // 2
+        found = self._descend(2 * node, low, middle, start, end, quantity)
+        if found is None:
+            found = self._descend(2 * node + 1, middle, high, start, end, quantity)
+        return found
+
+
+class PlacementIndex:
+    """Free capacity of every available warehouse, bucketed by owner, type
+    and location.
+
+    Buckets are grouped per owner, so an allocation only looks at the
+    caller's own buckets however many tenants there are. Committed stock
+    changes adjust it in place. Warehouses that were created, edited or
+    deleted are reloaded on the next allocation, and the whole index is
+    rebuilt every PLACEMENT_REFRESH_SECONDS to pick up writes made by other
+    processes.
+    """
+
+    def __init__(self, refresh_seconds: float = PLACEMENT_REFRESH_SECONDS):
+        self.refresh_seconds = refresh_seconds
+        self.buckets: Dict[Optional[int], Dict[PlaceKey, CapacityBucket]] = {}
+        self.where: Dict[int, BucketKey] = {}
+        self._rows: Dict[int, Tuple[BucketKey, float, int]] = {}
+        self._members: Dict[BucketKey, Set[int]] = {}
+        self._dirty: Set[int] = set()
+        self._loaded_at: Optional[float] = None
+        self._lock = threading.RLock()
+
+    def _load(self, db: Session, warehouse_ids: Optional[Iterable[int]] = None) -> Dict[int, Tuple]:
+        # Every tenant's warehouses, queries filter by owner themselves
+        query = db.query(
+            Warehouse.id, Warehouse.owner_id, Warehouse.warehouse_type, Warehouse.location,
+            Warehouse.rental_price, Warehouse.capacity, WarehouseStock.total_quantity
+        ).outerjoin(WarehouseStock, WarehouseStock.warehouse_id == Warehouse.id).filter(
+            Warehouse.is_available.isnot(False),
+            Warehouse.capacity.isnot(None)
+        ).execution_options(**{ALL_TENANTS: True})
+        if warehouse_ids is not None:
+            query = query.filter(Warehouse.id.in_(list(warehouse_ids)))
+        return {
+            id: ((owner_id, _normalize(type), _normalize(location)), price or 0.0, capacity - (stock or 0))
+            for id, owner_id, type, location, price, capacity, stock in query
+        }
+
+    def _rebuild(self, keys: Iterable[BucketKey]) -> None:
+        # O(bucket size), only needed when warehouses themselves change
+        for key in keys:
+            owner, place = key[0], key[1:]
+            members = self._members.get(key)
+            if members:
+                self.buckets.setdefault(owner, {})[place] = CapacityBucket(
+                    (self._rows[id][1], id, self._rows[id][2]) for id in members
+                )
+            else:
+                owned = self.buckets.get(owner, {})
+                owned.pop(place, None)
+                if not owned:
+                    self.buckets.pop(owner, None)
+                self._members.pop(key, None)
+
+    def refresh(self, db: Session) -> None:
+        """Bring the index up to date before it is queried."""
+        with self._lock:
+            if self._loaded_at is None or time.monotonic() - self._loaded_at > self.refresh_seconds:
+                self._dirty.clear()
+                self._rows = self._load(db)
+                self.where = {id: row[0] for id, row in self._rows.items()}
+                self._members = {}
+                for id, key in self.where.items():
+                    self._members.setdefault(key, set()).add(id)
+                self.buckets = {}
+                self._rebuild(self._members.keys())
+                self._loaded_at = time.monotonic()
+            elif self._dirty:
+                self.reload(db, self._dirty)
+
+    def reload(self, db: Session, warehouse_ids: Iterable[int]) -> None:
+        with self._lock:
+            warehouse_ids = set(warehouse_ids)
+            self._dirty -= warehouse_ids
+            loaded = self._load(db, warehouse_ids)
+            touched = set()
+            for id in warehouse_ids:
+                key = self.where.pop(id, None)
+                if key is not None:
+                    self._members[key].discard(id)
+                    touched.add(key)
+                self._rows.pop(id, None)
+                if id in loaded:
+                    key = loaded[id][0]
+                    self._rows[id] = loaded[id]
+                    self.where[id] = key
+                    self._members.setdefault(key, set()).add(id)
+                    touched.add(key)
+            self._rebuild(touched)
+
+    def mark_dirty(self, warehouse_ids: Iterable[int]) -> None:
+        with self._lock:
+            self._dirty.update(warehouse_ids)
+
+    def apply(self, warehouse_id: int, delta: int) -> None:
+        """Take `delta` units of stock off a warehouse's free capacity."""
+        with self._lock:
+            row = self._rows.get(warehouse_id)
+            if row is None:
+                return
+            key, price, free = row
+            self._rows[warehouse_id] = (key, price, free - delta)
+            self.buckets[key[0]][key[1:]].update(warehouse_id, -delta)
+
+    def _matching(self, owner_id, warehouse_type, location) -> List[CapacityBucket]:
+        warehouse_type, location = _normalize(warehouse_type), _normalize(location)
+        # Without tenant scoping every owner's buckets are candidates
+        owners = self.buckets.values() if owner_id is None else [self.buckets.get(owner_id, {})]
+        if warehouse_type and location:
+            return [owned[(warehouse_type, location)] for owned in owners if (warehouse_type, location) in owned]
+        return [
+            bucket for owned in owners for (type, place), bucket in owned.items()
+            if (not warehouse_type or type == warehouse_type)
+            and (not location or place == location)
+        ]
+
+    def cheapest(
+        self,
+        quantity: int,
+        owner_id: Optional[int] = None,
+        warehouse_type: Optional[str] = None,
+        location: Optional[str] = None,
+        max_price: Optional[float] = None,
+        limit: int = 1,
+    ) -> List[Tuple[int, float, int]]:
+        """Up to `limit` cheapest warehouses that each fit `quantity`, as
+        (id, price, free) tuples. O(limit * log n) per matching bucket."""
+        with self._lock:
+            found = []
+            for bucket in self._matching(owner_id, warehouse_type, location):
+                position = -1
+                for _ in range(limit):
+                    position = bucket.first_fit(quantity, max_price, position + 1)
+                    if position is None:
+                        break
+                    found.append((bucket.prices[position], bucket.ids[position], bucket.free(position)))
+            return [(id, price, free) for price, id, free in heapq.nsmallest(limit, found)]
+
+    def fill(
+        self,
+        quantity: int,
+        owner_id: Optional[int] = None,
+        warehouse_type: Optional[str] = None,
+        location: Optional[str] = None,
+        max_price: Optional[float] = None,
+        limit: int = 50,
+    ) -> List[Tuple[int, float, int]]:
+        """Cheapest-first split of `quantity` over at most `limit`
+        warehouses with any free room, as (id, price, free) tuples."""
+        with self._lock:
+            heap = []
+            for index, bucket in enumerate(self._matching(owner_id, warehouse_type, location)):
+                position = bucket.first_fit(1, max_price)
+                if position is not None:
+                    heap.append((bucket.prices[position], bucket.ids[position], index, position, bucket))
+            heapq.heapify(heap)
+            plan = []
+            while heap and quantity > 0 and len(plan) < limit:
+                price, id, index, position, bucket = heapq.heappop(heap)
+                free = bucket.free(position)
+                plan.append((id, price, free))
+                quantity -= free
+                position = bucket.first_fit(1, max_price, position + 1)
+                if position is not None:
+                    heapq.heappush(heap, (bucket.prices[position], bucket.ids[position], index, position, bucket))
+            return plan
+
+    def verify(self, db: Session, warehouse_ids: List[int]) -> bool:
+        """Check candidates against the database, reloading any that drifted."""
+        with self._lock:
+            actual = self._load(db, warehouse_ids)
+            stale = [id for id in warehouse_ids if actual.get(id) != self._rows.get(id)]
+            if stale:
+                self.reload(db, stale)
+            return not stale
+
+
+placement_index = PlacementIndex()
+
+
+def allocate(
+    db: Session,
+    quantity: int,
+    owner_id: Optional[int] = None,
+    warehouse_type: Optional[str] = None,
+    location: Optional[str] = None,
+    max_price: Optional[float] = None,
+    split: bool = False,
+    limit: int = 1,
+) -> List[Tuple[int, float, int, int]]:
+    """Cheapest placement of `quantity` as (warehouse id, price, free, quantity).
+
+    Without `split` each result can take the whole quantity on its own and
+    the results are alternatives; with `split` they are one plan filling
+    the cheapest warehouses first, possibly short of `quantity`.
+    """
+    placement_index.refresh(db)
+    for _ in range(MAX_RETRIES):
+        if split:
+            candidates = placement_index.fill(quantity, owner_id, warehouse_type, location, max_price, limit)
+        else:
+            candidates = placement_index.cheapest(quantity, owner_id, warehouse_type, location, max_price, limit)
+        # Another process may have written since the index was loaded
+        if placement_index.verify(db, [id for id, _, _ in candidates]):
+            break
+    results = []
+    remaining = quantity
+    for id, price, free in candidates:
+        taken = min(free, remaining) if split else quantity
+        remaining -= taken
+        results.append((id, price, free, taken))
+    return results
+
+
+def _apply_stock_changes(changes):
+    for change in changes:
+        placement_index.apply(change.warehouse_id, change.delta)
+
+
+on_stock_committed(_apply_stock_changes)
+
+
+@event.listens_for(Session, "after_flush")
+def _track_warehouses(db: Session, flush_context):
+    changed = {instance.id for instance in list(db.new) + list(db.deleted) if isinstance(instance, Warehouse)}
+    for instance in db.dirty:
+        if isinstance(instance, Warehouse) and any(
+            inspect(instance).attrs[field].history.has_changes() for field in PLACEMENT_FIELDS
+        ):
+            changed.add(instance.id)
+    if changed:
+        db.info.setdefault(PENDING_KEY, set()).update(changed)
+
+
+@event.listens_for(Session, "after_commit")
+def _after_commit(db: Session):
+    pending = db.info.pop(PENDING_KEY, None)
+    if pending:
+        placement_index.mark_dirty(pending)
+
+
+@event.listens_for(Session, "after_rollback")
+def _after_rollback(db: Session):
+    db.info.pop(PENDING_KEY, None)
@@ -0,0 +1,73 @@
+import time
+
+from sqlalchemy.exc import TimeoutError as PoolTimeoutError
+from sqlalchemy.pool import AsyncAdaptedQueuePool, NullPool, Pool, QueuePool
+
+from services.metrics import Histogram
+
+
+class PoolStats:
+    def __init__(self):
+        # Time spent waiting for a free slot (or opening a new connection)
+        self.wait = Histogram()
+        # Full checkout time, including pre-ping and reset
+        self.checkout = Histogram()
+        self.timeouts = 0
+
+
+class _InstrumentedPool:
+    """Times connection checkouts; mixed into the pool classes below.
+
+    Stats live on the class so they survive `Pool.recreate()`, which
+    SQLAlchemy calls after a dispose or a failover.
+    """
+
+    stats: PoolStats
+
+    def connect(self):
+        started = time.perf_counter()
+        try:
+            return super().connect()
+        finally:
+            self.stats.checkout.observe(time.perf_counter() - started)
+
+    def _do_get(self):
+        started = time.perf_counter()
+        try:
+            return super()._do_get()
+        except PoolTimeoutError:
+            self.stats.timeouts += 1
+            raise
+        finally:
+            self.stats.wait.observe(time.perf_counter() - started)
+
+
+class InstrumentedQueuePool(_InstrumentedPool, QueuePool):
+    stats = PoolStats()
+
+
+class InstrumentedAsyncQueuePool(_InstrumentedPool, AsyncAdaptedQueuePool):
+    stats = PoolStats()
+
+
+def pool_status(pool: Pool) -> dict:
+    """Live view of a pool for the /health/pool endpoint."""
+    if isinstance(pool, NullPool):
+        # PgBouncer mode: every checkout is a fresh connection
+        return {"pool": "null"}
+    status = {"pool": type(pool).__name__}
+    # Only QueuePool has all of these; SingletonThreadPool's `size` is a
+    # plain int and StaticPool has none of them
+    for key, method in (("size", "size"), ("checked_out", "checkedout"),
+                        ("checked_in", "checkedin"), ("overflow", "overflow")):
+        value = getattr(pool, method, None)
+        if callable(value):
+            status[key] = value()
+    stats = getattr(pool, "stats", None)
+    if stats is not None:
+        status.update(
+            timeouts=stats.timeouts,
+            wait_seconds=stats.wait.snapshot(),
+            checkout_seconds=stats.checkout.snapshot(),
+        )
+    return status
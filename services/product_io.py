@@ -0,0 +1,186 @@
+import csv
+import io
+import json
+from datetime import datetime
+from itertools import islice
+from typing import IO, Dict, Iterator, List, Optional, Tuple
+
+from pydantic import ValidationError
+from sqlalchemy.orm import Session
+
+from config import EXPORT_BATCH_SIZE, IMPORT_CHUNK_SIZE, IMPORT_MAX_ERRORS
+from database import SessionLocal
+from models.product import PRODUCT_IDENTITY, Product
+from models.warehouse import Warehouse
+from schemas.product import ProductCreate
+from services.products import dialect_insert
+from services.stock_changes import record_stock_change
+from services.tenancy import set_tenant
+
+EXPORT_COLUMNS = (
+    Product.id,
+    Product.name,
+    Product.description,
+    Product.quantity,
+    Product.is_active,
+    Product.created_at,
+    Product.warehouse_id,
+)
+EXPORT_FIELDS = [column.key for column in EXPORT_COLUMNS]
+
+MEDIA_TYPES = {"csv": "text/csv", "ndjson": "application/x-ndjson"}
+
+
+def _plain(value):
+    return value.isoformat() if isinstance(value, datetime) else value
+
+
+def detect_format(filename: Optional[str], content_type: Optional[str]) -> str:
+    name = (filename or "").lower()
+    if name.endswith((".ndjson", ".jsonl")) or "ndjson" in (content_type or ""):
+        return "ndjson"
+    return "csv"
+
+
+def _read_rows(stream: IO[bytes], fmt: str) -> Iterator[Tuple[int, object]]:
+    """Yield (row number, parsed row or error message) without loading the file."""
+    text = io.TextIOWrapper(stream, encoding="utf-8", newline="")
+    if fmt == "csv":
+        for number, row in enumerate(csv.DictReader(text), start=1):
+            # Empty CSV cells mean "not set"
+            yield number, {key: value for key, value in row.items() if value != ""}
+        return
+    number = 0
+    for line in text:
+        if not line.strip():
+            continue
+        number += 1
+        try:
+            yield number, json.loads(line)
+        except ValueError as e:
+            yield number, f"Invalid JSON: {e}"
+
+
+def import_product_rows(db: Session, stream: IO[bytes], fmt: str) -> Dict:
+    """Insert products from a CSV/NDJSON stream in chunks.
+
+    Every chunk is validated, checked against the warehouses it references
+    and written with one executemany upsert, then committed. Bad rows are
+    reported and skipped, so one error never aborts the import. Importing a
+    product that already exists sets its quantity.
+    """
+    imported = 0
+    errors: List[Dict] = []
+    failed = 0
+
+    def reject(number: int, message: str):
+        nonlocal failed
+        failed += 1
+        if len(errors) < IMPORT_MAX_ERRORS:
+            errors.append({"row": number, "error": message})
+
+    rows = _read_rows(stream, fmt)
+    while True:
+        chunk = list(islice(rows, IMPORT_CHUNK_SIZE))
+        if not chunk:
+            break
+
+        valid: Dict[tuple, Tuple[int, ProductCreate]] = {}
+        for number, raw in chunk:
+            if isinstance(raw, str):
+                reject(number, raw)
+                continue
+            try:
+                product = ProductCreate.parse_obj(raw)
+            except ValidationError as e:
+                reject(number, "; ".join(
+                    f"{'.'.join(map(str, error['loc']))}: {error['msg']}" for error in e.errors()
+                ))
+                continue
+            key = (product.warehouse_id, product.name, product.description or "")
+            if key in valid:
+                reject(number, f"Duplicate of row {valid[key][0]}")
+                continue
+            valid[key] = (number, product)
+
+        known_warehouses = {
+            id: owner_id for id, owner_id in db.query(Warehouse.id, Warehouse.owner_id).filter(
+                Warehouse.id.in_({product.warehouse_id for _, product in valid.values()})
+            )
+        }
+        values = []
+        for number, product in valid.values():
+            if product.warehouse_id not in known_warehouses:
+                reject(number, "Warehouse not found")
+                continue
+            values.append(dict(product.dict(), owner_id=known_warehouses[product.warehouse_id]))
+
+        if values:
+            statement = dialect_insert(db)(Product)
+            statement = statement.on_conflict_do_update(
+                index_elements=list(PRODUCT_IDENTITY),
+                set_={"quantity": statement.excluded.quantity}
+            )
+            previous = {
+                (warehouse_id, name, description or ""): quantity
+                for warehouse_id, name, description, quantity in db.query(
+                    Product.warehouse_id, Product.name, Product.description, Product.quantity
+                ).filter(
+                    Product.warehouse_id.in_(set(known_warehouses)),
+                    Product.name.in_({value["name"] for value in values})
+                )
+            }
+            written = db.execute(
+                statement.returning(
+                    Product.id, Product.warehouse_id, Product.name,
+                    Product.description, Product.quantity
+                ),
+                values
+            )
+            for id, warehouse_id, name, description, quantity in written:
+                delta = quantity - previous.get((warehouse_id, name, description or ""), 0)
+                if delta:
+                    record_stock_change(db, id, warehouse_id, delta, quantity, "import")
+            db.commit()
+            imported += len(values)
+
+    return {"imported": imported, "failed": failed, "errors": errors}
+
+
+def stream_product_rows(
+    fmt: str, warehouse_id: Optional[int] = None, owner_id: Optional[int] = None
+) -> Iterator[str]:
+    """Stream products in id order through a server-side cursor.
+
+    Uses its own session because the response body is produced after the
+    request's dependencies have been torn down, scoped to `owner_id`.
+    """
+    db = SessionLocal()
+    set_tenant(db, owner_id)
+    try:
+        query = db.query(*EXPORT_COLUMNS)
+        if warehouse_id:
+            query = query.filter(Product.warehouse_id == warehouse_id)
+        rows = iter(query.order_by(Product.id).yield_per(EXPORT_BATCH_SIZE))
+
+        buffer = io.StringIO()
+        writer = csv.writer(buffer)
+        if fmt == "csv":
+            writer.writerow(EXPORT_FIELDS)
+        while True:
+            batch = list(islice(rows, EXPORT_BATCH_SIZE))
+            if not batch:
+                break
+            for row in batch:
+                values = [_plain(value) for value in row]
+                if fmt == "csv":
+                    writer.writerow(values)
+                else:
+                    buffer.write(json.dumps(dict(zip(EXPORT_FIELDS, values))) + "\n")
+            yield buffer.getvalue()
+            buffer.seek(0)
+            buffer.truncate()
+        if buffer.tell():
+            yield buffer.getvalue()
+    finally:
+        db.close()
@@ -0,0 +1,49 @@
+from typing import Optional, Tuple
+
+from sqlalchemy import literal, select, String
+from sqlalchemy.dialects import postgresql, sqlite
+from sqlalchemy.orm import Session
+
+from models.product import PRODUCT_IDENTITY, Product
+from models.warehouse import Warehouse
+from services.tenancy import tenant_filter
+
+
+def dialect_insert(db: Session):
+    """Return the `insert` construct that supports ON CONFLICT for this database."""
+    if db.get_bind().dialect.name == "postgresql":
+        return postgresql.insert
+    return sqlite.insert
+
+
+def add_stock(
+    db: Session,
+    warehouse_id: int,
+    name: str,
+    description: Optional[str],
+    quantity: int
+) -> Optional[Tuple[int, int]]:
+    """Increment a product in a warehouse, creating it if it does not exist.
+
+    Runs as a single `INSERT ... SELECT ... ON CONFLICT DO UPDATE` probing the
+    unique product identity index. Selecting from `warehouses` means nothing
+    is written when the warehouse does not exist or belongs to another
+    tenant, in which case None is returned; otherwise the product's id and
+    new quantity.
+    """
+    source = select(
+        literal(name, String),
+        literal(description, String),
+        literal(quantity),
+        Warehouse.id,
+        Warehouse.owner_id
+    ).where(Warehouse.id == warehouse_id, *tenant_filter(db, Warehouse))
+    statement = dialect_insert(db)(Product).from_select(
+        ["name", "description", "quantity", "warehouse_id", "owner_id"], source
+    )
+    statement = statement.on_conflict_do_update(
+        index_elements=list(PRODUCT_IDENTITY),
+        set_={"quantity": Product.quantity + statement.excluded.quantity}
+    ).returning(Product.id, Product.quantity)
+    row = db.execute(statement).first()
+    return tuple(row) if row else None
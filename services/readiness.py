@@ -0,0 +1,94 @@
+import asyncio
+import logging
+from typing import Dict, List, Optional, Tuple
+
+from sqlalchemy import text
+from starlette.concurrency import run_in_threadpool
+
+import migrations
+from database import async_engine, engine
+
+logger = logging.getLogger("smart_stock.readiness")
+
+STARTING = "starting"
+READY = "ready"
+# Seconds between warm-up attempts while the database is unreachable or behind
+RETRY_SECONDS = 2.0
+
+
+def _pool_size(pool) -> int:
+    # NullPool (PgBouncer) and the single-connection SQLite pools keep nothing warm
+    size = getattr(pool, "size", None)
+    return size() if callable(size) else 1
+
+
+def _warm_sync() -> Tuple[int, List[str]]:
+    connections = []
+    try:
+        for _ in range(_pool_size(engine.pool)):
+            connections.append(engine.connect())
+        connections[0].execute(text("SELECT 1"))
+        return len(connections), migrations.pending(connections[0])
+    finally:
+        for connection in connections:
+            connection.close()
+
+
+async def _warm_async() -> int:
+    connections = []
+    try:
+        for _ in range(_pool_size(async_engine.pool)):
+            connections.append(await async_engine.connect())
+        await connections[0].execute(text("SELECT 1"))
+        return len(connections)
+    finally:
+        for connection in connections:
+            await connection.close()
+
+
+class Readiness:
+    """Whether this worker should get traffic, as reported by /ready.
+
+    Startup does no database work; `warm_up` runs right after it and
+    opens the pools' connections, so the first requests do not pay for
+    connecting, and checks that scripts/migrate.py has been run. Until
+    both succeed it retries every RETRY_SECONDS and /ready answers 503.
+    """
+
+    def __init__(self):
+        self.status = STARTING
+        self.connections: Dict[str, int] = {}
+        self.pending_migrations: List[str] = []
+        self.error: Optional[str] = None
+
+    @property
+    def ready(self) -> bool:
+        return self.status == READY
+
+    async def warm_up(self) -> None:
+        while True:
+            try:
+                warmed, pending = await run_in_threadpool(_warm_sync)
+                self.connections["sync"] = warmed
+                if async_engine is not None:
+                    self.connections["async"] = await _warm_async()
+                self.pending_migrations = pending
+                if not pending:
+                    self.status, self.error = READY, None
+                    return
+                self.error = "Database schema is behind, run scripts/migrate.py"
+            except Exception as error:
+                logger.warning("Warm-up failed, retrying: %s", error)
+                self.error = str(error)
+            await asyncio.sleep(RETRY_SECONDS)
+
+    def report(self) -> Dict:
+        report = {"status": self.status, "connections": self.connections}
+        if self.pending_migrations:
+            report["pending_migrations"] = self.pending_migrations
+        if self.error:
+            report["error"] = self.error
+        return report
+
+
+readiness = Readiness()
@@ -0,0 +1,268 @@
+import hashlib
+import threading
+import time
+import uuid
+from collections import OrderedDict
+from dataclasses import dataclass, field
+from typing import Any, Awaitable, Callable, Dict, Iterable, List, Optional
+
+from fastapi import Request, Response
+
+from config import (
+    RESPONSE_CACHE_ENABLED, RESPONSE_CACHE_MAX_AGE, RESPONSE_CACHE_MAX_BYTES, RESPONSE_CACHE_TTL_SECONDS
+)
+from services.metrics import register_collector
+from services.serialization import dumps
+from services.stock_changes import on_stock_committed
+
+# Headers of the handler's response worth replaying from the cache
+STORED_HEADERS = ("x-next-cursor", "x-missing-ids")
+
+
+@dataclass
+class CachedResponse:
+    etag: str
+    body: bytes
+    headers: Dict[str, str] = field(default_factory=dict)
+
+    @property
+    def size(self) -> int:
+        return len(self.body) + sum(len(key) + len(value) for key, value in self.headers.items())
+
+
+class ResponseCacheBackend:
+    """Storage for cached responses and the version stamps they depend on.
+
+    Stamps are opaque strings that change whenever an entity is written.
+    The in-memory backend only sees writes made by its own process, so
+    deployments with several workers should plug in a shared backend.
+    """
+
+    def get(self, key: str) -> Optional[CachedResponse]:
+        raise NotImplementedError
+
+    def set(self, key: str, entry: CachedResponse, ttl: float) -> None:
+        raise NotImplementedError
+
+    def stamps(self, names: List[str]) -> List[str]:
+        raise NotImplementedError
+
+    def bump(self, names: Iterable[str]) -> None:
+        raise NotImplementedError
+
+    def clear(self) -> None:
+        raise NotImplementedError
+
+
+class InMemoryResponseBackend(ResponseCacheBackend):
+    """LRU of responses bounded by the total size of their bodies.
+
+    Writes made by other processes (other workers, the job runner script,
+    maintenance scripts) never bump these stamps, so stamps also roll over
+    every `stamp_ttl` seconds: ETags and entries can then be stale for at
+    most that long, the same bound the entry TTL gives.
+    """
+
+    def __init__(self, max_bytes: int, stamp_ttl: float = 0):
+        self.max_bytes = max_bytes
+        self.stamp_ttl = stamp_ttl
+        self.size = 0
+        self._entries: "OrderedDict[str, tuple]" = OrderedDict()
+        self._stamps: Dict[str, int] = {}
+        # Stamps restart at 0, the epoch keeps ETags of an older process from matching
+        self._epoch = uuid.uuid4().hex[:8]
+        self._lock = threading.Lock()
+
+    def get(self, key):
+        with self._lock:
+            item = self._entries.get(key)
+            if item is None:
+                return None
+            expires_at, entry = item
+            if expires_at <= time.monotonic():
+                self._remove(key)
+                return None
+            self._entries.move_to_end(key)
+            return entry
+
+    def set(self, key, entry, ttl):
+        if entry.size > self.max_bytes or ttl <= 0:
+            return
+        with self._lock:
+            self._remove(key)
+            self._entries[key] = (time.monotonic() + ttl, entry)
+            self.size += entry.size
+            while self.size > self.max_bytes:
+                self._remove(next(iter(self._entries)))
+
+    def _remove(self, key):
+        item = self._entries.pop(key, None)
+        if item is not None:
+            self.size -= item[1].size
+
+    def stamps(self, names):
+        window = int(time.time() // self.stamp_ttl) if self.stamp_ttl > 0 else 0
+        with self._lock:
+            return [f"{self._epoch}:{window}:{self._stamps.get(name, 0)}" for name in names]
+
+    def bump(self, names):
+        with self._lock:
+            for name in names:
+                self._stamps[name] = self._stamps.get(name, 0) + 1
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+            self.size = 0
+
+    def __len__(self):
+        return len(self._entries)
+
+
+class ResponseCache:
+    """Caches serialized GET responses per principal, route and query string.
+
+    Every response depends on version stamps of the entities it shows
+    (e.g. `product:5` or the `products` collection). Its ETag is derived
+    from those stamps, so a matching If-None-Match is answered with 304
+    before any query runs, and a write only has to bump the stamps.
+    """
+
+    def __init__(self, backend: ResponseCacheBackend, ttl: float, max_age: int = 0, enabled: bool = True):
+        self.backend = backend
+        self.ttl = ttl
+        self.max_age = max_age
+        self.enabled = enabled
+        self.hits = 0
+        self.misses = 0
+        self.not_modified = 0
+
+    def bump(self, *names: str) -> None:
+        self.backend.bump(names)
+
+    async def respond(
+        self,
+        request: Request,
+        principal: Any,
+        dependencies: List[str],
+        produce: Callable[[], Awaitable[Any]],
+        response: Optional[Response] = None
+    ):
+        """Serve `produce()` through the cache.
+
+        `produce` must return plain rows or pydantic models, which are encoded
+        without another validation pass. It is only awaited on a miss;
+        headers it sets on `response` are cached as well.
+        """
+        if not self.enabled:
+            content = await produce()
+            return Response(dumps(content), media_type="application/json", headers=_stored_headers(response))
+
+        query = "&".join(sorted(f"{key}={value}" for key, value in request.query_params.multi_items()))
+        key = f"{getattr(principal, 'id', principal)}|{request.url.path}|{query}"
+        # Stamps are read before loading, so a write racing with this request
+        # leaves its entry behind an outdated ETag instead of a current one
+        stamps = self.backend.stamps(dependencies)
+        etag = '"%s"' % hashlib.sha1("|".join([key, *stamps]).encode()).hexdigest()
+        headers = {
+            "ETag": etag,
+            "Cache-Control": f"private, max-age={self.max_age}" if self.max_age else "private, no-cache",
+        }
+
+        if _etag_matches(request.headers.get("if-none-match"), etag):
+            self.not_modified += 1
+            return Response(status_code=304, headers=headers)
+
+        entry = self.backend.get(key)
+        if entry is not None and entry.etag == etag:
+            self.hits += 1
+        else:
+            self.misses += 1
+            content = await produce()
+            entry = CachedResponse(etag, dumps(content), _stored_headers(response))
+            self.backend.set(key, entry, self.ttl)
+        return Response(entry.body, media_type="application/json", headers={**entry.headers, **headers})
+
+    def stats(self) -> Dict[str, float]:
+        # A 304 is the cheapest hit of all
+        requests = self.hits + self.misses + self.not_modified
+        return {
+            "hits": self.hits,
+            "misses": self.misses,
+            "not_modified": self.not_modified,
+            "hit_ratio": (self.hits + self.not_modified) / requests if requests else 0.0,
+        }
+
+
+def _stored_headers(response: Optional[Response]) -> Dict[str, str]:
+    if response is None:
+        return {}
+    return {name: response.headers[name] for name in STORED_HEADERS if name in response.headers}
+
+
+def _etag_matches(if_none_match: Optional[str], etag: str) -> bool:
+    if not if_none_match:
+        return False
+    return any(tag.strip().removeprefix("W/") in (etag, "*") for tag in if_none_match.split(","))
+
+
+response_cache = ResponseCache(
+    InMemoryResponseBackend(RESPONSE_CACHE_MAX_BYTES, stamp_ttl=RESPONSE_CACHE_TTL_SECONDS),
+    ttl=RESPONSE_CACHE_TTL_SECONDS,
+    max_age=RESPONSE_CACHE_MAX_AGE,
+    enabled=RESPONSE_CACHE_ENABLED
+)
+
+
+def set_backend(backend: ResponseCacheBackend) -> None:
+    """Swap the response storage, e.g. for one shared by several workers."""
+    response_cache.backend = backend
+
+
+def bump_product(product_id: int, *warehouse_ids: Optional[int]) -> None:
+    """Invalidate a product and everything that lists it."""
+    names = {f"product:{product_id}", "products", "warehouses"}
+    names.update(f"warehouse:{id}" for id in warehouse_ids if id is not None)
+    response_cache.bump(*sorted(names))
+
+
+def bump_warehouse(warehouse_id: int) -> None:
+    response_cache.bump(f"warehouse:{warehouse_id}", "warehouses")
+
+
+def _bump_stock_changes(changes):
+    # Transfers and imports only go through the stock ledger
+    names = {"products", "warehouses"}
+    for change in changes:
+        names.add(f"product:{change.product_id}")
+        names.add(f"warehouse:{change.warehouse_id}")
+    response_cache.bump(*sorted(names))
+
+
+on_stock_committed(_bump_stock_changes)
+
+
+def _collect():
+    stats = response_cache.stats()
+    backend = response_cache.backend
+    lines = [
+        "# TYPE response_cache_hits_total counter",
+        f"response_cache_hits_total {stats['hits']}",
+        "# TYPE response_cache_misses_total counter",
+        f"response_cache_misses_total {stats['misses']}",
+        "# TYPE response_cache_not_modified_total counter",
+        f"response_cache_not_modified_total {stats['not_modified']}",
+        "# TYPE response_cache_hit_ratio gauge",
+        f"response_cache_hit_ratio {stats['hit_ratio']}",
+    ]
+    if isinstance(backend, InMemoryResponseBackend):
+        lines += [
+            "# TYPE response_cache_bytes gauge",
+            f"response_cache_bytes {backend.size}",
+            "# TYPE response_cache_entries gauge",
+            f"response_cache_entries {len(backend)}",
+        ]
+    return lines
+
+
+register_collector(_collect)
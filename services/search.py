@@ -0,0 +1,254 @@
+import heapq
+import re
+import threading
+from bisect import bisect_left
+from collections import Counter, defaultdict
+from typing import Callable, Dict, Iterable, List, Optional, Set, Tuple
+
+from sqlalchemy import case, event, func, inspect, or_, text
+from sqlalchemy.orm import Session
+
+from models.product import PRODUCT_SEARCH_DOCUMENT, Product
+from models.warehouse import WAREHOUSE_SEARCH_DOCUMENT, Warehouse
+from services.tenancy import ALL_TENANTS, current_tenant
+
+# Supported values for the `mode` query parameter
+SEARCH_MODE_PATTERN = "^(prefix|fuzzy|fulltext)$"
+
+# pg_trgm's default similarity threshold, the one its `%` operator uses
+FUZZY_THRESHOLD = 0.3
+
+_WORD = re.compile(r"\w+")
+
+# (id, name, other searchable text, group, owner) as fed to the in-memory index
+SearchRow = Tuple[int, Optional[str], Optional[str], Optional[int], Optional[int]]
+
+
+def trigrams(value: str) -> Set[str]:
+    """Trigrams of `value` the way pg_trgm extracts them."""
+    grams = set()
+    for word in _WORD.findall(value.lower()):
+        padded = f"  {word} "
+        grams.update(padded[i:i + 3] for i in range(len(padded) - 2))
+    return grams
+
+
+def escape_like(value: str) -> str:
+    return value.replace("\\", "\\\\").replace("%", "\\%").replace("_", "\\_")
+
+
+class InMemorySearchIndex:
+    """Prefix, trigram and word index used when the database has no pg_trgm.
+
+    Mirrors the SQL search closely enough for tests: prefix matches the
+    start of the name or of a word in it, fuzzy is trigram similarity on the
+    name and full-text requires every query word in name or extra text.
+    """
+
+    def __init__(self, rows: Iterable[SearchRow]):
+        self.names: Dict[int, str] = {}
+        self.groups: Dict[int, Optional[int]] = {}
+        self.owners: Dict[int, Optional[int]] = {}
+        self.name_grams: Dict[int, Set[str]] = {}
+        self.grams: Dict[str, List[int]] = defaultdict(list)
+        self.documents: Dict[str, Dict[int, int]] = defaultdict(dict)
+        self.lengths: Dict[int, int] = {}
+        # Sorted (word, id) pairs of name words, scanned with bisect
+        name_words = []
+
+        for id, name, extra, group, owner in rows:
+            name = (name or "").lower()
+            self.names[id] = name
+            self.groups[id] = group
+            self.owners[id] = owner
+            grams = trigrams(name)
+            self.name_grams[id] = grams
+            for gram in grams:
+                self.grams[gram].append(id)
+            name_words.extend((word, id) for word in set(_WORD.findall(name)))
+            words = Counter(_WORD.findall(f"{name} {(extra or '').lower()}"))
+            for word, count in words.items():
+                self.documents[word][id] = count
+            self.lengths[id] = sum(words.values())
+
+        name_words.sort()
+        self.name_words = name_words
+
+    def search(self, mode: str, query: str, limit: int, group: Optional[int] = None,
+               owner: Optional[int] = None) -> List[int]:
+        """Ids of the best `limit` matches, best first (ties by id)."""
+        query = query.strip().lower()
+        scored = {"prefix": self._prefix, "fuzzy": self._fuzzy, "fulltext": self._fulltext}[mode](query)
+        if group is not None:
+            scored = ((score, id) for score, id in scored if self.groups.get(id) == group)
+        if owner is not None:
+            # The index holds every tenant, so other tenants must not use up `limit`
+            scored = ((score, id) for score, id in scored if self.owners.get(id) == owner)
+        return [id for _, id in heapq.nsmallest(limit, scored, key=lambda item: (-item[0], item[1]))]
+
+    def similarity(self, id: int, grams: Set[str]) -> float:
+        shared = len(grams & self.name_grams[id])
+        union = len(grams) + len(self.name_grams[id]) - shared
+        return shared / union if union else 0.0
+
+    def _prefix(self, query: str):
+        words = _WORD.findall(query)
+        if not words:
+            return
+        first = words[0]
+        position = bisect_left(self.name_words, (first,))
+        grams = trigrams(query)
+        seen = set()
+        while position < len(self.name_words):
+            word, id = self.name_words[position]
+            if not word.startswith(first):
+                break
+            position += 1
+            if id in seen:
+                continue
+            seen.add(id)
+            name = self.names[id]
+            starts = name.startswith(query)
+            if starts or f" {query}" in name:
+                yield (1.0 if starts else 0.0) + self.similarity(id, grams), id
+
+    def _fuzzy(self, query: str):
+        grams = trigrams(query)
+        shared: Counter = Counter()
+        for gram in grams:
+            shared.update(self.grams.get(gram, ()))
+        for id, count in shared.items():
+            score = count / (len(grams) + len(self.name_grams[id]) - count)
+            if score >= FUZZY_THRESHOLD:
+                yield score, id
+
+    def _fulltext(self, query: str):
+        words = set(_WORD.findall(query))
+        if not words:
+            return
+        postings = sorted((self.documents.get(word, {}) for word in words), key=len)
+        for id in postings[0]:
+            if all(id in posting for posting in postings[1:]):
+                hits = sum(posting[id] for posting in postings)
+                yield hits / self.lengths[id], id
+
+
+# The index is shared by every request, so it is loaded across tenants and
+# filtered by owner when searched
+def _product_rows(db: Session):
+    return db.query(
+        Product.id, Product.name, Product.description, Product.warehouse_id, Product.owner_id
+    ).execution_options(**{ALL_TENANTS: True})
+
+
+def _warehouse_rows(db: Session):
+    rows = db.query(
+        Warehouse.id, Warehouse.name, Warehouse.location, Warehouse.owner_id
+    ).execution_options(**{ALL_TENANTS: True})
+    for id, name, location, owner_id in rows:
+        yield id, name, location, None, owner_id
+
+
+_SOURCES: Dict[str, Callable[[Session], Iterable[SearchRow]]] = {
+    "products": _product_rows,
+    "warehouses": _warehouse_rows,
+}
+# Attributes whose change makes an in-memory index stale
+_SEARCHABLE = {
+    Product: ("name", "description", "warehouse_id", "owner_id"),
+    Warehouse: ("name", "location", "owner_id"),
+}
+PENDING_KEY = "search_dirty"
+
+_indexes: Dict[str, InMemorySearchIndex] = {}
+_dirty: Set[str] = set(_SOURCES)
+_lock = threading.Lock()
+
+
+def get_index(db: Session, source: str) -> InMemorySearchIndex:
+    """Return the in-memory index of `source`, rebuilding it when stale."""
+    with _lock:
+        if source in _dirty:
+            # Discarded before loading so writes committed meanwhile mark it again
+            _dirty.discard(source)
+            _indexes[source] = InMemorySearchIndex(_SOURCES[source](db))
+        return _indexes[source]
+
+
+def _mark(db: Session, source: str):
+    db.info.setdefault(PENDING_KEY, set()).add(source)
+
+
+@event.listens_for(Session, "after_flush")
+def _track_flush(db: Session, flush_context):
+    for instance in list(db.new) + list(db.deleted):
+        if type(instance) in _SEARCHABLE:
+            _mark(db, instance.__tablename__)
+    for instance in db.dirty:
+        fields = _SEARCHABLE.get(type(instance))
+        if fields and any(inspect(instance).attrs[field].history.has_changes() for field in fields):
+            _mark(db, instance.__tablename__)
+
+
+@event.listens_for(Session, "do_orm_execute")
+def _track_statement(state):
+    # Bulk statements such as the import upsert bypass the flush
+    if state.is_insert or state.is_update or state.is_delete:
+        table = getattr(state.statement, "table", None)
+        if table is not None and table.name in _SOURCES:
+            _mark(state.session, table.name)
+
+
+@event.listens_for(Session, "after_commit")
+def _after_commit(db: Session):
+    pending = db.info.pop(PENDING_KEY, None)
+    if pending:
+        with _lock:
+            _dirty.update(pending)
+
+
+@event.listens_for(Session, "after_rollback")
+def _after_rollback(db: Session):
+    db.info.pop(PENDING_KEY, None)
+
+
+def _search(db: Session, model, source: str, document, query: str, mode: str,
+            skip: int, limit: int, group_column=None, group: Optional[int] = None):
+    if db.get_bind().dialect.name != "postgresql":
+        ids = get_index(db, source).search(mode, query, skip + limit, group, current_tenant(db))[skip:]
+        if not ids:
+            return []
+        rows = {row.id: row for row in db.query(model).filter(model.id.in_(ids))}
+        return [rows[id] for id in ids if id in rows]
+
+    statement = db.query(model)
+    if group is not None:
+        statement = statement.filter(group_column == group)
+    if mode == "fulltext":
+        tsquery = func.plainto_tsquery(text("'simple'"), query)
+        rank = func.ts_rank(document, tsquery)
+        statement = statement.filter(document.op("@@")(tsquery))
+    elif mode == "fuzzy":
+        rank = func.similarity(model.name, query)
+        statement = statement.filter(model.name.op("%")(query))
+    else:
+        # Both patterns are served by the trigram index
+        pattern = escape_like(query)
+        starts = model.name.ilike(f"{pattern}%", escape="\\")
+        rank = case((starts, 1.0), else_=0.0) + func.similarity(model.name, query)
+        statement = statement.filter(or_(starts, model.name.ilike(f"% {pattern}%", escape="\\")))
+    return statement.order_by(rank.desc(), model.id).offset(skip).limit(limit).all()
+
+
+def search_products(db: Session, query: str, mode: str = "prefix", skip: int = 0,
+                    limit: int = 20, warehouse_id: Optional[int] = None) -> List[Product]:
+    """Ranked product search over name and description, best match first."""
+    return _search(db, Product, "products", PRODUCT_SEARCH_DOCUMENT, query, mode,
+                   skip, limit, Product.warehouse_id, warehouse_id)
+
+
+def search_warehouses(db: Session, query: str, mode: str = "prefix", skip: int = 0,
+                      limit: int = 20) -> List[Warehouse]:
+    """Ranked warehouse search over name and location, best match first."""
+    return _search(db, Warehouse, "warehouses", WAREHOUSE_SEARCH_DOCUMENT, query, mode,
+                   skip, limit)
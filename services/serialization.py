@@ -0,0 +1,44 @@
+import json
+from typing import Any, Iterable, List, Sequence
+
+from fastapi.encoders import jsonable_encoder
+from fastapi.responses import JSONResponse
+from pydantic import BaseModel
+
+from config import FAST_JSON
+
+try:
+    import orjson
+    from fastapi.responses import ORJSONResponse
+except ImportError:  # Falls back to the stdlib encoder
+    orjson = None
+
+# Default response class of the app
+JSONResponseClass = ORJSONResponse if FAST_JSON and orjson is not None else JSONResponse
+
+
+def _default(value: Any):
+    if isinstance(value, BaseModel):
+        return value.dict()
+    raise TypeError(f"Type is not JSON serializable: {type(value).__name__}")
+
+
+def dumps(content: Any) -> bytes:
+    """Encode plain rows, dicts or pydantic models to JSON bytes."""
+    if JSONResponseClass is not JSONResponse:
+        return orjson.dumps(content, default=_default)
+    return json.dumps(jsonable_encoder(content)).encode()
+
+
+def read_columns(model, schema, exclude: Iterable[str] = ()) -> List:
+    """Model columns backing the fields of a read schema, for `with_entities`.
+
+    Loading these tuples instead of ORM instances and dumping them directly
+    skips hydration and the response_model validation; the columns already
+    have the schema's types.
+    """
+    return [getattr(model, name) for name in schema.__fields__ if name not in set(exclude)]
+
+
+def as_dicts(rows: Sequence) -> List[dict]:
+    return [row._asdict() for row in rows]
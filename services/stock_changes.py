@@ -0,0 +1,128 @@
+from collections import defaultdict
+from dataclasses import dataclass
+from datetime import datetime
+from typing import Callable, Dict, List, Tuple
+
+from sqlalchemy import event, insert
+from sqlalchemy.orm import Session
+
+from models.stock_movement import StockMovement
+from models.warehouse_stock import WarehouseStock
+from services.products import dialect_insert
+
+SESSION_KEY = "stock_changes"
+
+
+@dataclass
+class StockChange:
+    product_id: int
+    warehouse_id: int
+    delta: int
+    # Quantity of the product after the change, 0 once it is deleted
+    quantity: int
+    kind: str
+    # False when the warehouse is deleted in the same transaction, its counter goes with it
+    counted: bool = True
+
+    @property
+    def sku_delta(self) -> int:
+        return int(self.quantity > 0) - int(self.quantity - self.delta > 0)
+
+
+# Called with the committed changes once their transaction is durable
+_after_commit_listeners: List[Callable[[List[StockChange]], None]] = []
+# Called inside the transaction right before it commits, to write alongside it
+_before_commit_listeners: List[Callable[[Session, List[StockChange]], None]] = []
+
+
+def on_stock_committed(listener: Callable[[List[StockChange]], None]) -> None:
+    _after_commit_listeners.append(listener)
+
+
+def on_stock_committing(listener: Callable[[Session, List[StockChange]], None]) -> None:
+    _before_commit_listeners.append(listener)
+
+
+def record_stock_change(
+    db: Session,
+    product_id: int,
+    warehouse_id: int,
+    delta: int,
+    quantity: int,
+    kind: str,
+    counted: bool = True
+) -> None:
+    """Register a stock write made in the current transaction.
+
+    Warehouse counters for every recorded change are written in one upsert
+    per warehouse just before the transaction commits, together with one
+    stock_movements ledger row per change, so both are always consistent
+    with the products they describe. Pass `counted=False` for changes of a
+    warehouse that the same transaction deletes.
+    """
+    db.info.setdefault(SESSION_KEY, []).append(
+        StockChange(product_id, warehouse_id, delta, quantity, kind, counted)
+    )
+
+
+def _apply_counters(db: Session, changes: List[StockChange]) -> None:
+    totals: Dict[int, Tuple[int, int]] = defaultdict(lambda: (0, 0))
+    for change in changes:
+        if not change.counted:
+            continue
+        quantity, skus = totals[change.warehouse_id]
+        totals[change.warehouse_id] = (quantity + change.delta, skus + change.sku_delta)
+
+    rows = [
+        {"warehouse_id": warehouse_id, "total_quantity": quantity, "sku_count": skus,
+         "updated_at": datetime.utcnow()}
+        for warehouse_id, (quantity, skus) in sorted(totals.items())
+        if quantity or skus
+    ]
+    if not rows:
+        return
+    statement = dialect_insert(db)(WarehouseStock)
+    statement = statement.on_conflict_do_update(
+        index_elements=[WarehouseStock.warehouse_id],
+        set_={
+            "total_quantity": WarehouseStock.total_quantity + statement.excluded.total_quantity,
+            "sku_count": WarehouseStock.sku_count + statement.excluded.sku_count,
+            "updated_at": statement.excluded.updated_at,
+        }
+    )
+    db.execute(statement, rows)
+
+
+def _write_movements(db: Session, changes: List[StockChange]) -> None:
+    created_at = datetime.utcnow()
+    db.execute(insert(StockMovement), [
+        {"product_id": change.product_id, "warehouse_id": change.warehouse_id,
+         "delta": change.delta, "quantity": change.quantity, "kind": change.kind,
+         "created_at": created_at}
+        for change in changes
+    ])
+
+
+@event.listens_for(Session, "before_commit")
+def _before_commit(db: Session):
+    changes = db.info.get(SESSION_KEY)
+    if changes:
+        # Sorted by warehouse so concurrent commits lock counters in one order
+        _apply_counters(db, changes)
+        # The ledger commits (or rolls back) together with the change itself
+        _write_movements(db, changes)
+        for listener in _before_commit_listeners:
+            listener(db, changes)
+
+
+@event.listens_for(Session, "after_commit")
+def _after_commit(db: Session):
+    changes = db.info.pop(SESSION_KEY, None)
+    if changes:
+        for listener in _after_commit_listeners:
+            listener(changes)
+
+
+@event.listens_for(Session, "after_rollback")
+def _after_rollback(db: Session):
+    db.info.pop(SESSION_KEY, None)
@@ -0,0 +1,94 @@
+from typing import Dict, List
+
+from sqlalchemy import Float, case, cast, func
+from sqlalchemy.orm import Session
+
+from models.product import Product
+from models.warehouse import Warehouse
+from models.warehouse_stock import WarehouseStock
+
+STATS_ORDER_PATTERN = "^(quantity|utilization|sku_count)$"
+
+total_quantity = func.coalesce(WarehouseStock.total_quantity, 0)
+sku_count = func.coalesce(WarehouseStock.sku_count, 0)
+# NULL for warehouses without a usable capacity
+utilization = cast(total_quantity, Float) / func.nullif(Warehouse.capacity, 0)
+
+
+def warehouse_stats_query(db: Session):
+    """Per-warehouse totals read from the precomputed counters."""
+    return db.query(
+        Warehouse.id.label("id"),
+        Warehouse.name,
+        Warehouse.owner_id,
+        Warehouse.capacity,
+        total_quantity.label("total_quantity"),
+        sku_count.label("sku_count"),
+        utilization.label("utilization"),
+    ).outerjoin(WarehouseStock, WarehouseStock.warehouse_id == Warehouse.id)
+
+
+def top_warehouses(db: Session, n: int, by: str):
+    order = {"quantity": total_quantity, "utilization": utilization, "sku_count": sku_count}[by]
+    return warehouse_stats_query(db).order_by(
+        order.desc().nulls_last(), Warehouse.id
+    ).limit(n).all()
+
+
+def owner_rollup(db: Session):
+    return db.query(
+        Warehouse.owner_id,
+        func.count(Warehouse.id).label("warehouse_count"),
+        func.sum(total_quantity).label("total_quantity"),
+        func.sum(sku_count).label("sku_count"),
+        func.coalesce(func.sum(Warehouse.capacity), 0).label("total_capacity"),
+    ).outerjoin(
+        WarehouseStock, WarehouseStock.warehouse_id == Warehouse.id
+    ).group_by(Warehouse.owner_id).order_by(Warehouse.owner_id).all()
+
+
+def reconcile_counters(db: Session, fix: bool = False) -> List[Dict]:
+    """Compare the counters with totals computed from the products table.
+
+    Returns one entry per warehouse whose counters drifted (or are missing).
+    With `fix`, the counters are overwritten with the computed values, which
+    also backfills warehouses created before the counters existed.
+    """
+    actual = {
+        warehouse_id: (int(quantity or 0), int(skus or 0))
+        for warehouse_id, quantity, skus in db.query(
+            Warehouse.id,
+            func.sum(Product.quantity),
+            func.sum(case((Product.quantity > 0, 1), else_=0)),
+        ).outerjoin(Product, Product.warehouse_id == Warehouse.id).group_by(Warehouse.id)
+    }
+    stored = {
+        row.warehouse_id: (row.total_quantity, row.sku_count)
+        for row in db.query(WarehouseStock)
+    }
+
+    drift = []
+    for warehouse_id in sorted(actual.keys() | stored.keys()):
+        expected = actual.get(warehouse_id)
+        current = stored.get(warehouse_id)
+        if expected == current or (current is None and expected == (0, 0)):
+            continue
+        drift.append({
+            "warehouse_id": warehouse_id,
+            "expected": expected,
+            "stored": current,
+        })
+
+    if fix and drift:
+        for entry in drift:
+            counter = db.get(WarehouseStock, entry["warehouse_id"])
+            if entry["expected"] is None:
+                # Counter left behind by a deleted warehouse
+                db.delete(counter)
+                continue
+            if counter is None:
+                counter = WarehouseStock(warehouse_id=entry["warehouse_id"])
+                db.add(counter)
+            counter.total_quantity, counter.sku_count = entry["expected"]
+        db.commit()
+    return drift
@@ -0,0 +1,62 @@
+from typing import List, Optional
+
+from sqlalchemy import event, inspect, select
+from sqlalchemy.orm import Session, with_loader_criteria
+
+from config import TENANT_SCOPING
+from models.product import Product
+from models.warehouse import Warehouse
+
+TENANT_KEY = "tenant_id"
+# Execution option that lets a statement see every tenant's rows
+ALL_TENANTS = "all_tenants"
+
+
+def set_tenant(db, owner_id: Optional[int]) -> None:
+    """Scope every later query of `db` (sync or async session) to one owner."""
+    if TENANT_SCOPING:
+        db.info[TENANT_KEY] = owner_id
+
+
+def current_tenant(db) -> Optional[int]:
+    return db.info.get(TENANT_KEY)
+
+
+def tenant_filter(db, model) -> List:
+    """Owner criteria for statements the ORM hook does not reach, such as
+    the SELECT inside an INSERT ... FROM SELECT."""
+    owner_id = current_tenant(db)
+    return [] if owner_id is None else [model.owner_id == owner_id]
+
+
+@event.listens_for(Session, "do_orm_execute")
+def _scope_to_tenant(state):
+    owner_id = state.session.info.get(TENANT_KEY)
+    if owner_id is None or state.execution_options.get(ALL_TENANTS):
+        return
+    if state.is_select and (state.is_column_load or state.is_relationship_load):
+        # Refreshes and lazy loads inherit the criteria of the query that loaded the object
+        return
+    if state.is_select or state.is_update or state.is_delete:
+        # Both filters hit the (owner_id, ...) indexes, so a tenant's queries
+        # only touch its own index range
+        state.statement = state.statement.options(
+            with_loader_criteria(Warehouse, Warehouse.owner_id == owner_id, include_aliases=True),
+            with_loader_criteria(Product, Product.owner_id == owner_id, include_aliases=True),
+        )
+
+
+def _warehouse_owner(warehouse_id):
+    return select(Warehouse.owner_id).where(Warehouse.id == warehouse_id).scalar_subquery()
+
+
+@event.listens_for(Product, "before_insert")
+def _set_product_owner(mapper, connection, product):
+    # Evaluated inside the INSERT, no extra round trip
+    product.owner_id = _warehouse_owner(product.warehouse_id)
+
+
+@event.listens_for(Product, "before_update")
+def _move_product_owner(mapper, connection, product):
+    if inspect(product).attrs.warehouse_id.history.has_changes():
+        product.owner_id = _warehouse_owner(product.warehouse_id)
@@ -0,0 +1,187 @@
+from typing import Dict, List, Optional, Tuple
+
+from fastapi import HTTPException, status
+from sqlalchemy import update
+from sqlalchemy.exc import IntegrityError
+from sqlalchemy.orm import Session
+
+from database import begin_write
+from models.product import Product
+from models.warehouse import Warehouse
+from schemas.product import BulkProductTransfer, ProductRead, ProductTransfer
+from services.jobs import JobContext, job_type
+from services.products import add_stock
+from services.stock_changes import record_stock_change
+
+ProductKey = Tuple[int, str, Optional[str]]
+
+
+def _bad_request(detail: str) -> HTTPException:
+    return HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail=detail)
+
+
+def transfer_stock(db: Session, transfer: ProductTransfer) -> Product:
+    """Move stock between warehouses in one transaction.
+
+    The source row is decremented with a conditional UPDATE, so the quantity
+    check and the write are a single atomic statement and concurrent
+    transfers can never oversell. The target side is a single upsert.
+    """
+    if transfer.from_warehouse_id == transfer.to_warehouse_id:
+        raise _bad_request("Source and target warehouse must differ")
+
+    source = db.execute(
+        update(Product)
+        .where(
+            Product.id == transfer.product_id,
+            Product.warehouse_id == transfer.from_warehouse_id,
+            Product.quantity >= transfer.quantity
+        )
+        .values(quantity=Product.quantity - transfer.quantity)
+        .returning(Product.name, Product.description, Product.quantity)
+        .execution_options(synchronize_session=False)
+    ).first()
+
+    if source is None:
+        # Only the failure path pays for working out why nothing matched
+        exists = db.query(Product.id).filter(
+            Product.id == transfer.product_id,
+            Product.warehouse_id == transfer.from_warehouse_id
+        ).first()
+        db.rollback()
+        if not exists:
+            raise _bad_request("Product not found in source warehouse")
+        raise _bad_request("Not enough quantity in source warehouse")
+
+    target = add_stock(
+        db,
+        transfer.to_warehouse_id,
+        source.name,
+        source.description,
+        transfer.quantity
+    )
+    if target is None:
+        db.rollback()
+        raise _bad_request("Target warehouse not found")
+
+    record_stock_change(
+        db, transfer.product_id, transfer.from_warehouse_id,
+        -transfer.quantity, source.quantity, "transfer_out"
+    )
+    target_id, target_quantity = target
+    record_stock_change(
+        db, target_id, transfer.to_warehouse_id,
+        transfer.quantity, target_quantity, "transfer_in"
+    )
+    db.commit()
+    return db.get(Product, target_id)
+
+
+def bulk_transfer_stock(db: Session, transfers: List[ProductTransfer]) -> List[ProductRead]:
+    """Apply many transfers atomically; either all of them succeed or none.
+
+    Every row involved is locked up front with a single
+    `SELECT ... ORDER BY id FOR UPDATE`, so concurrent batches always take
+    their locks in the same order and cannot deadlock each other.
+    """
+    for index, transfer in enumerate(transfers):
+        if transfer.from_warehouse_id == transfer.to_warehouse_id:
+            raise _bad_request(f"Transfer {index}: source and target warehouse must differ")
+
+    begin_write(db)
+    # Resolve which rows take part before locking anything
+    source_ids = {transfer.product_id for transfer in transfers}
+    source_keys = {
+        id: (name, description)
+        for id, name, description in db.query(
+            Product.id, Product.name, Product.description
+        ).filter(Product.id.in_(source_ids))
+    }
+    wanted_keys = {
+        (transfer.to_warehouse_id, *source_keys[transfer.product_id])
+        for transfer in transfers
+        if transfer.product_id in source_keys
+    }
+    target_ids = set()
+    if wanted_keys:
+        candidates = db.query(
+            Product.id, Product.warehouse_id, Product.name, Product.description
+        ).filter(
+            Product.warehouse_id.in_({key[0] for key in wanted_keys}),
+            Product.name.in_({key[1] for key in wanted_keys})
+        )
+        target_ids = {id for id, *key in candidates if tuple(key) in wanted_keys}
+
+    locked = {
+        product.id: product
+        for product in db.query(Product).filter(
+            Product.id.in_(source_ids | target_ids)
+        ).order_by(Product.id).with_for_update()
+    }
+    targets: Dict[ProductKey, Product] = {
+        (product.warehouse_id, product.name, product.description): product
+        for id, product in locked.items()
+        if id in target_ids
+    }
+
+    missing_warehouses = {transfer.to_warehouse_id for transfer in transfers} - {
+        key[0] for key in targets
+    }
+    if missing_warehouses:
+        missing_warehouses -= {
+            id for (id,) in db.query(Warehouse.id).filter(Warehouse.id.in_(missing_warehouses))
+        }
+
+    results = []
+    # (product, delta, quantity afterwards, kind); ids of new rows come at flush
+    movements = []
+    for index, transfer in enumerate(transfers):
+        source = locked.get(transfer.product_id)
+        if source is None or source.warehouse_id != transfer.from_warehouse_id:
+            db.rollback()
+            raise _bad_request(f"Transfer {index}: product not found in source warehouse")
+        if source.quantity < transfer.quantity:
+            db.rollback()
+            raise _bad_request(f"Transfer {index}: not enough quantity in source warehouse")
+        if transfer.to_warehouse_id in missing_warehouses:
+            db.rollback()
+            raise _bad_request(f"Transfer {index}: target warehouse not found")
+
+        source.quantity -= transfer.quantity
+        movements.append((source, -transfer.quantity, source.quantity, "transfer_out"))
+        key = (transfer.to_warehouse_id, source.name, source.description)
+        target = targets.get(key)
+        if target is None:
+            # Later transfers of the same product reuse the row created here
+            target = targets[key] = Product(
+                name=source.name,
+                description=source.description,
+                quantity=0,
+                warehouse_id=transfer.to_warehouse_id,
+                is_active=True
+            )
+            db.add(target)
+        target.quantity += transfer.quantity
+        movements.append((target, transfer.quantity, target.quantity, "transfer_in"))
+        results.append(target)
+
+    try:
+        db.flush()
+    except IntegrityError:
+        # Another transaction created one of our new target rows first
+        db.rollback()
+        raise HTTPException(
+            status_code=status.HTTP_409_CONFLICT,
+            detail="A concurrent transfer created the same product, please retry"
+        )
+    for product, delta, quantity, kind in movements:
+        record_stock_change(db, product.id, product.warehouse_id, delta, quantity, kind)
+    response = [ProductRead.from_orm(product) for product in results]
+    db.commit()
+    return response
+
+
+@job_type("products.transfer_bulk", concurrency=2, schema=BulkProductTransfer)
+def _bulk_transfer_job(db: Session, bulk: BulkProductTransfer, context: JobContext):
+    products = bulk_transfer_stock(db, bulk.transfers)
+    return {"product_ids": [product.id for product in products]}
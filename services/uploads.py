@@ -0,0 +1,193 @@
+import hashlib
+import logging
+import os
+import tempfile
+from dataclasses import dataclass
+from typing import Dict, Optional
+
+from fastapi import HTTPException, UploadFile, status
+from fastapi.responses import JSONResponse
+from starlette.concurrency import run_in_threadpool
+
+from config import AVATAR_SIZES, UPLOAD_CHUNK_SIZE, UPLOAD_DIR, UPLOAD_MAX_BYTES
+from services.jobs import JobContext, job_type
+
+logger = logging.getLogger("smart_stock.uploads")
+
+# Leading bytes of the accepted image formats and their canonical extension
+IMAGE_SIGNATURES = (
+    (b"\xff\xd8\xff", ".jpg"),
+    (b"\x89PNG\r\n\x1a\n", ".png"),
+    (b"GIF87a", ".gif"),
+    (b"GIF89a", ".gif"),
+)
+
+# Routes taking an image upload; their whole body is held to UPLOAD_MAX_BYTES
+# plus room for the other form fields and the multipart framing
+UPLOAD_ROUTES = {"/auth/register"}
+FORM_OVERHEAD_BYTES = 64 * 1024
+
+
+@dataclass
+class StoredUpload:
+    # Path relative to the working directory, as stored in User.image_path
+    path: str
+    digest: str
+    extension: str
+    # False when identical content was already stored, the file is shared then
+    created: bool = False
+
+
+def sniff_extension(head: bytes) -> Optional[str]:
+    """Detect the image format from its first bytes, ignoring what the client claims."""
+    for signature, extension in IMAGE_SIGNATURES:
+        if head.startswith(signature):
+            return extension
+    if head[:4] == b"RIFF" and head[8:12] == b"WEBP":
+        return ".webp"
+    return None
+
+
+def variant_path(path: str, size: int) -> str:
+    root, extension = os.path.splitext(path)
+    return f"{root}_{size}{extension}"
+
+
+async def save_upload(upload: UploadFile) -> StoredUpload:
+    """Copy an uploaded image into UPLOAD_DIR under its content hash.
+
+    The body is read in chunks into a temporary file next to the target, so
+    the final rename is atomic and a half-written file is never visible.
+    Uploads over UPLOAD_MAX_BYTES are rejected with 413 and anything that
+    is not a JPEG, PNG, GIF or WebP image with 415. Identical images share
+    one file.
+    """
+    os.makedirs(UPLOAD_DIR, exist_ok=True)
+    descriptor, temp_path = tempfile.mkstemp(dir=UPLOAD_DIR, prefix=".upload-")
+    digest = hashlib.sha256()
+    extension = None
+    size = 0
+    try:
+        with os.fdopen(descriptor, "wb") as target:
+            while True:
+                chunk = await upload.read(UPLOAD_CHUNK_SIZE)
+                if not chunk:
+                    break
+                if extension is None:
+                    extension = sniff_extension(chunk)
+                    if extension is None:
+                        raise HTTPException(
+                            status_code=status.HTTP_415_UNSUPPORTED_MEDIA_TYPE,
+                            detail="Image must be JPEG, PNG, GIF or WebP"
+                        )
+                size += len(chunk)
+                if size > UPLOAD_MAX_BYTES:
+                    raise HTTPException(
+                        status_code=status.HTTP_413_REQUEST_ENTITY_TOO_LARGE,
+                        detail=f"Image is larger than {UPLOAD_MAX_BYTES} bytes"
+                    )
+                digest.update(chunk)
+                await run_in_threadpool(target.write, chunk)
+        if extension is None:
+            raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail="Image is empty")
+
+        path = os.path.join(UPLOAD_DIR, f"{digest.hexdigest()}{extension}")
+        created = not os.path.exists(path)
+        if created:
+            os.chmod(temp_path, 0o644)
+            os.replace(temp_path, path)
+        else:
+            # Same content uploaded before, reuse that file
+            os.unlink(temp_path)
+    except BaseException:
+        if os.path.exists(temp_path):
+            os.unlink(temp_path)
+        raise
+    return StoredUpload(path=path, digest=digest.hexdigest(), extension=extension, created=created)
+
+
+def discard_upload(upload: StoredUpload) -> None:
+    """Remove a file stored by `save_upload` whose request failed later on.
+
+    Files that already existed belong to someone else as well and are kept.
+    """
+    if upload.created and os.path.exists(upload.path):
+        os.unlink(upload.path)
+
+
+class UploadLimitMiddleware:
+    """Pure ASGI middleware rejecting oversized bodies of the UPLOAD_ROUTES.
+
+    FastAPI spools the whole multipart form before the handler, and with it
+    save_upload, ever runs. A too large Content-Length is answered with 413
+    without reading the body; bodies without one are counted while they
+    stream in and cut off with 413 once over the limit.
+    """
+
+    def __init__(self, app, max_bytes: int = UPLOAD_MAX_BYTES + FORM_OVERHEAD_BYTES):
+        self.app = app
+        self.max_bytes = max_bytes
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http" or scope["path"] not in UPLOAD_ROUTES:
+            return await self.app(scope, receive, send)
+
+        length = dict(scope["headers"]).get(b"content-length", b"")
+        if length.isdigit() and int(length) > self.max_bytes:
+            response = JSONResponse(
+                {"detail": f"Request body is larger than {self.max_bytes} bytes"},
+                status_code=status.HTTP_413_REQUEST_ENTITY_TOO_LARGE
+            )
+            return await response(scope, receive, send)
+
+        received = 0
+
+        async def limited_receive():
+            nonlocal received
+            message = await receive()
+            if message["type"] == "http.request":
+                received += len(message.get("body", b""))
+                if received > self.max_bytes:
+                    # Raised inside the form parsing, turned into a 413 response
+                    raise HTTPException(
+                        status_code=status.HTTP_413_REQUEST_ENTITY_TOO_LARGE,
+                        detail=f"Request body is larger than {self.max_bytes} bytes"
+                    )
+            return message
+
+        await self.app(scope, limited_receive, send)
+
+
+def make_variants(upload: StoredUpload) -> None:
+    """Write the AVATAR_SIZES square thumbnails of an upload.
+
+    Runs as a background job after the response; every variant is written
+    to a temporary file first and renamed into place.
+    """
+    try:
+        # Imported here, only job workers ever need Pillow
+        from PIL import Image, ImageOps
+    except ImportError:  # Thumbnails are skipped without Pillow
+        return
+    for size in AVATAR_SIZES:
+        path = variant_path(upload.path, size)
+        if os.path.exists(path):
+            continue
+        descriptor, temp_path = tempfile.mkstemp(dir=UPLOAD_DIR, prefix=".variant-")
+        try:
+            with os.fdopen(descriptor, "wb") as target, Image.open(upload.path) as image:
+                thumbnail = ImageOps.fit(ImageOps.exif_transpose(image), (size, size))
+                if upload.extension == ".jpg" and thumbnail.mode not in ("RGB", "L"):
+                    thumbnail = thumbnail.convert("RGB")
+                thumbnail.save(target, format=Image.registered_extensions()[upload.extension])
+            os.chmod(temp_path, 0o644)
+            os.replace(temp_path, path)
+        except Exception:
+            logger.exception("Could not create %spx variant of %s", size, upload.path)
+            if os.path.exists(temp_path):
+                os.unlink(temp_path)
+
+
+@job_type("uploads.variants", concurrency=2)
+def _make_variants_job(db, payload: Dict, context: JobContext):
+    make_variants(StoredUpload(**payload))
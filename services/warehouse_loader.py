@@ -0,0 +1,113 @@
+from typing import Dict, List, Optional
+
+from sqlalchemy import func
+from sqlalchemy.orm import Session
+from sqlalchemy.orm.attributes import set_committed_value
+
+from models.product import Product
+from models.warehouse import Warehouse
+from schemas.product import ProductRead
+from schemas.warehouse import WarehouseProductSummary, WarehouseRead
+from services.serialization import read_columns
+
+# Supported values for the `products` query parameter
+PRODUCT_MODE_PATTERN = "^(none|summary|full)$"
+
+# Columns behind ProductRead and WarehouseRead, for row-based list responses
+PRODUCT_COLUMNS = read_columns(Product, ProductRead)
+WAREHOUSE_COLUMNS = read_columns(Warehouse, WarehouseRead, exclude=("products", "product_summary"))
+
+
+def _product_query(db: Session, entities: List, warehouse_ids: List[int], limit: Optional[int]):
+    query = db.query(*entities).filter(Product.warehouse_id.in_(warehouse_ids))
+    if limit is not None:
+        # Rank products inside each warehouse and keep the first `limit`
+        ranked = db.query(
+            Product.id.label("id"),
+            func.row_number().over(
+                partition_by=Product.warehouse_id,
+                order_by=Product.id
+            ).label("position")
+        ).filter(Product.warehouse_id.in_(warehouse_ids)).subquery()
+        query = db.query(*entities).join(ranked, Product.id == ranked.c.id).filter(
+            ranked.c.position <= limit
+        )
+    return query.order_by(Product.warehouse_id, Product.id)
+
+
+def _summaries(db: Session, warehouse_ids: List[int]) -> Dict[int, WarehouseProductSummary]:
+    summaries = {
+        warehouse_id: WarehouseProductSummary(
+            product_count=product_count,
+            total_quantity=total_quantity or 0
+        )
+        for warehouse_id, product_count, total_quantity in db.query(
+            Product.warehouse_id,
+            func.count(Product.id),
+            func.sum(Product.quantity)
+        ).filter(
+            Product.warehouse_id.in_(warehouse_ids)
+        ).group_by(Product.warehouse_id)
+    }
+    empty = WarehouseProductSummary(product_count=0, total_quantity=0)
+    return {id: summaries.get(id, empty) for id in warehouse_ids}
+
+
+def attach_products(
+    db: Session,
+    warehouses: List[Warehouse],
+    mode: str = "full",
+    limit: Optional[int] = None
+) -> List[Warehouse]:
+    """Fill `products` for a page of warehouses with at most one extra query.
+
+    `full` loads up to `limit` products per warehouse, `summary` only loads
+    per-warehouse counts and `none` skips products entirely. The relationship
+    is set as already loaded so serialization never triggers a lazy SELECT.
+    """
+    if not warehouses:
+        return warehouses
+
+    warehouse_ids = [warehouse.id for warehouse in warehouses]
+    products_by_warehouse: Dict[int, List[Product]] = {id: [] for id in warehouse_ids}
+
+    if mode == "full":
+        for product in _product_query(db, [Product], warehouse_ids, limit):
+            products_by_warehouse[product.warehouse_id].append(product)
+
+    if mode == "summary":
+        summaries = _summaries(db, warehouse_ids)
+        for warehouse in warehouses:
+            warehouse.product_summary = summaries[warehouse.id]
+
+    for warehouse in warehouses:
+        set_committed_value(warehouse, "products", products_by_warehouse[warehouse.id])
+
+    return warehouses
+
+
+def warehouse_rows(
+    db: Session,
+    rows: List,
+    mode: str = "full",
+    limit: Optional[int] = None
+) -> List[Dict]:
+    """`attach_products` for warehouse rows loaded with `WAREHOUSE_COLUMNS`.
+
+    Returns plain dicts shaped like `WarehouseRead`, built from column tuples
+    without hydrating ORM instances.
+    """
+    warehouses = [dict(row._asdict(), products=[], product_summary=None) for row in rows]
+    if not warehouses:
+        return warehouses
+    by_id = {warehouse["id"]: warehouse for warehouse in warehouses}
+
+    if mode == "full":
+        for product in _product_query(db, PRODUCT_COLUMNS, list(by_id), limit):
+            by_id[product.warehouse_id]["products"].append(product._asdict())
+
+    if mode == "summary":
+        for id, summary in _summaries(db, list(by_id)).items():
+            by_id[id]["product_summary"] = summary.dict()
+
+    return warehouses
@@ -0,0 +1,84 @@
+from typing import Callable, List, Optional
+
+from sqlalchemy import func, select, update
+from sqlalchemy.orm import Session
+
+from config import JOB_BATCH_SIZE
+from models.product import Product
+from models.warehouse import Warehouse
+from models.warehouse_stock import WarehouseStock
+from schemas.job import WarehouseDeletePayload
+from services.jobs import JobContext, job_type
+from services.placement import placement_index
+from services.response_cache import bump_warehouse, response_cache
+from services.stock_changes import record_stock_change
+
+
+def _bump_products(product_ids: List[int]) -> None:
+    if product_ids:
+        response_cache.bump("products", "warehouses", *(f"product:{id}" for id in product_ids))
+
+
+def remove_warehouse(
+    db: Session,
+    warehouse_id: int,
+    batch_size: Optional[int] = None,
+    progress: Optional[Callable[[int, Optional[int]], None]] = None
+) -> bool:
+    """Delete a warehouse with set-based statements; False if it is not visible.
+
+    Its products are kept and detached from it by UPDATE ... RETURNING
+    instead of one ORM write per product; the stock leaving with them is
+    recorded as ledger movements in the same transaction. Without
+    `batch_size` everything happens in one transaction. With it the products
+    are detached `batch_size` at a time, each batch committed, so a huge
+    warehouse never holds long locks and a retry continues where the last
+    attempt stopped.
+    """
+    if db.query(Warehouse.id).filter(Warehouse.id == warehouse_id).first() is None:
+        return False
+    total = None
+    if progress is not None:
+        total = db.query(func.count(Product.id)).filter(Product.warehouse_id == warehouse_id).scalar()
+        progress(0, total)
+
+    detached = 0
+    while True:
+        statement = update(Product).where(Product.warehouse_id == warehouse_id)
+        if batch_size:
+            statement = statement.where(Product.id.in_(
+                select(Product.id).where(Product.warehouse_id == warehouse_id).order_by(Product.id).limit(batch_size)
+            ))
+        # owner_id is left as is: detached products stay with the tenant that owned the warehouse
+        rows = db.execute(
+            statement.values(warehouse_id=None)
+            .returning(Product.id, Product.quantity)
+            .execution_options(synchronize_session=False)
+        ).all()
+        product_ids = [id for id, _ in rows]
+        detached += len(rows)
+        last = not batch_size or len(rows) < batch_size
+        for id, quantity in rows:
+            # The last batch commits with the warehouse delete, which takes its counter along
+            record_stock_change(db, id, warehouse_id, -(quantity or 0), 0, "warehouse_delete", counted=not last)
+        if last:
+            break
+        db.commit()
+        _bump_products(product_ids)
+        if progress is not None:
+            progress(detached, total)
+
+    db.query(WarehouseStock).filter(WarehouseStock.warehouse_id == warehouse_id).delete(synchronize_session=False)
+    db.query(Warehouse).filter(Warehouse.id == warehouse_id).delete(synchronize_session=False)
+    db.commit()
+    _bump_products(product_ids)
+    bump_warehouse(warehouse_id)
+    # Bulk deletes bypass the flush tracking of the placement index
+    placement_index.mark_dirty([warehouse_id])
+    return True
+
+
+@job_type("warehouse.delete", concurrency=1, schema=WarehouseDeletePayload)
+def _delete_warehouse_job(db: Session, payload: WarehouseDeletePayload, context: JobContext):
+    deleted = remove_warehouse(db, payload.warehouse_id, JOB_BATCH_SIZE, context.progress)
+    return {"warehouse_id": payload.warehouse_id, "deleted": deleted}
@@ -0,0 +1,112 @@
+"""Shared fixtures: the app on a throwaway SQLite database migrated to head.
+
+The environment is set before anything imports config.py, so the suite
+never touches the database of a .env file.
+"""
+import itertools
+import os
+import sys
+import tempfile
+import time
+from contextlib import contextmanager
+from datetime import timedelta
+from typing import List
+
+import pytest
+
+_DATA_DIR = tempfile.mkdtemp(prefix="smart_stock_tests_")
+os.environ["DATABASE_URL"] = f"sqlite:///{os.path.join(_DATA_DIR, 'test.db')}"
+os.environ["UPLOAD_DIR"] = os.path.join(_DATA_DIR, "uploads")
+# Background loops would add their own queries to the counted ones
+os.environ["JOB_WORKERS"] = "0"
+os.environ["STOCK_SNAPSHOT_INTERVAL_SECONDS"] = "0"
+os.environ["FORECAST_INTERVAL_SECONDS"] = "0"
+os.environ.setdefault("BCRYPT_ROUNDS", "4")
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from fastapi.testclient import TestClient  # noqa: E402
+from sqlalchemy import event  # noqa: E402
+
+import main  # noqa: E402
+import migrations  # noqa: E402
+from database import SessionLocal, async_engine, engine  # noqa: E402
+from models.product import Product  # noqa: E402
+from models.user import User  # noqa: E402
+from models.warehouse import Warehouse  # noqa: E402
+from routers.auth import create_access_token  # noqa: E402
+
+migrations.upgrade(engine)
+
+_emails = itertools.count()
+
+
+@pytest.fixture(scope="session")
+def client():
+    with TestClient(main.app) as client:
+        # Let the pool warm-up finish so its queries are not counted
+        deadline = time.monotonic() + 10
+        while client.get("/ready").status_code != 200 and time.monotonic() < deadline:
+            time.sleep(0.05)
+        yield client
+
+
+@pytest.fixture
+def db():
+    session = SessionLocal()
+    try:
+        yield session
+    finally:
+        session.close()
+
+
+@pytest.fixture
+def make_user(db):
+    """Create an active user; returns it with its bearer headers."""
+    def make(**fields):
+        fields.setdefault("is_active", True)
+        user = User(email=f"user{next(_emails)}@example.com", password="x", user_type="business", **fields)
+        db.add(user)
+        db.commit()
+        token = create_access_token({"sub": user.email}, timedelta(minutes=30))
+        return user, {"Authorization": f"Bearer {token}"}
+    return make
+
+
+@pytest.fixture
+def make_warehouse(db):
+    """Create a warehouse of `owner` holding `products` products of quantity `quantity`."""
+    def make(owner: User, products: int = 0, quantity: int = 10) -> Warehouse:
+        warehouse = Warehouse(
+            name=f"warehouse of {owner.email}", location="Istanbul", capacity=10000,
+            rental_price=10.0, warehouse_type="dry", owner_id=owner.id
+        )
+        db.add(warehouse)
+        db.flush()
+        for index in range(products):
+            db.add(Product(name=f"product {index}", description="test", quantity=quantity,
+                           warehouse_id=warehouse.id))
+        db.commit()
+        return warehouse
+    return make
+
+
+@pytest.fixture
+def count_queries():
+    """Context manager collecting the SQL run on the sync and async engines."""
+    @contextmanager
+    def count():
+        statements: List[str] = []
+
+        def record(conn, cursor, statement, parameters, context, executemany):
+            statements.append(statement)
+
+        engines = [engine] + ([async_engine.sync_engine] if async_engine is not None else [])
+        for bind in engines:
+            event.listen(bind, "before_cursor_execute", record)
+        try:
+            yield statements
+        finally:
+            for bind in engines:
+                event.remove(bind, "before_cursor_execute", record)
+    return count
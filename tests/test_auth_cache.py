@@ -0,0 +1,137 @@
+import time
+from typing import Any, Dict, Optional
+
+import pytest
+
+from routers.auth import decode_token
+from services import auth_cache
+from services.auth_cache import CacheBackend, InMemoryBackend, PrincipalCache, cached_claims, principal_cache
+
+
+class DictBackend(CacheBackend):
+    """Stand-in for a shared store: a plain dict that ignores TTLs."""
+
+    def __init__(self):
+        self.data: Dict[str, Any] = {}
+        self.sets = 0
+
+    def get(self, key: str) -> Optional[Any]:
+        return self.data.get(key)
+
+    def set(self, key: str, value: Any, ttl: float) -> None:
+        self.sets += 1
+        self.data[key] = value
+
+    def delete(self, key: str) -> None:
+        self.data.pop(key, None)
+
+    def clear(self) -> None:
+        self.data.clear()
+
+
+@pytest.fixture
+def backend(monkeypatch):
+    backend = DictBackend()
+    monkeypatch.setattr(principal_cache, "backend", principal_cache.backend)
+    auth_cache.set_backend(backend)
+    return backend
+
+
+def _authenticated(client, headers) -> int:
+    return client.get("/warehouses/?products=none&limit=1", headers=headers).status_code
+
+
+def test_hit_and_miss(make_user):
+    user, _ = make_user()
+    cache = PrincipalCache(InMemoryBackend(10), ttl=60)
+
+    assert cache.get(user.email) is None
+    cache.set(user.email, user)
+    cached = cache.get(user.email)
+
+    assert (cached.id, cached.email) == (user.id, user.email)
+    assert cached is not user
+    assert cache.stats() == {"hits": 1, "misses": 1}
+
+
+def test_inactive_users_are_not_cached(make_user):
+    user, _ = make_user(is_active=False)
+    cache = PrincipalCache(InMemoryBackend(10), ttl=60)
+
+    cache.set(user.email, user)
+
+    assert cache.get(user.email) is None
+
+
+def test_entries_expire_after_ttl(make_user):
+    user, _ = make_user()
+    cache = PrincipalCache(InMemoryBackend(10), ttl=0.05)
+
+    cache.set(user.email, user)
+    assert cache.get(user.email) is not None
+    time.sleep(0.1)
+
+    assert cache.get(user.email) is None
+
+
+def test_size_limit_evicts_least_recently_used():
+    backend = InMemoryBackend(2)
+    backend.set("a", 1, 60)
+    backend.set("b", 2, 60)
+    backend.get("a")
+    backend.set("c", 3, 60)
+
+    assert (backend.get("a"), backend.get("b"), backend.get("c")) == (1, None, 3)
+
+
+def test_set_backend_swaps_storage(client, make_user, backend):
+    user, headers = make_user()
+
+    assert _authenticated(client, headers) == 200
+    assert user.email in backend.data
+    hits = principal_cache.hits
+    assert _authenticated(client, headers) == 200
+
+    assert principal_cache.hits == hits + 1
+    assert backend.sets == 1
+
+
+def test_deactivation_invalidates_principal(client, db, make_user, backend):
+    user, headers = make_user()
+    assert _authenticated(client, headers) == 200
+    assert user.email in backend.data
+
+    user.is_active = False
+    db.commit()
+
+    assert user.email not in backend.data
+    assert _authenticated(client, headers) == 401
+
+
+def test_email_change_invalidates_old_subject(client, db, make_user, backend):
+    user, headers = make_user()
+    assert _authenticated(client, headers) == 200
+    old_email = user.email
+
+    user.email = f"renamed.{old_email}"
+    db.commit()
+
+    assert old_email not in backend.data
+    # The token still names the old email, which no longer exists
+    assert _authenticated(client, headers) == 401
+
+
+def test_claims_are_decoded_once_per_token(make_user):
+    _, headers = make_user()
+    token = headers["Authorization"].split(" ", 1)[1]
+    calls = []
+
+    def decode(raw):
+        calls.append(raw)
+        return decode_token(raw)
+
+    first = cached_claims(token, decode)
+    second = cached_claims(token, decode)
+
+    assert first == second
+    assert calls == [token]
@@ -0,0 +1,32 @@
+import pytest
+
+from models.product import Product
+
+BATCH_SIZES = (2, 10, 30)
+
+
+def _statements(client, count_queries, path, headers, ids):
+    client.post(path, headers=headers, json={"ids": ids})
+    with count_queries() as statements:
+        response = client.post(path, headers=headers, json={"ids": ids})
+    assert response.status_code == 200, response.text
+    return response, len(statements)
+
+
+@pytest.mark.parametrize("path", ["/warehouses/batch-get", "/products/batch-get"])
+def test_batch_query_count_does_not_grow(client, make_user, make_warehouse, count_queries, db, path):
+    owner, headers = make_user()
+    warehouses = [make_warehouse(owner, products=2) for _ in range(max(BATCH_SIZES))]
+    if path.startswith("/products"):
+        ids = [id for (id,) in db.query(Product.id).filter(
+            Product.warehouse_id.in_([warehouse.id for warehouse in warehouses])
+        ).order_by(Product.id)]
+    else:
+        ids = [warehouse.id for warehouse in warehouses]
+
+    counts = []
+    for size in BATCH_SIZES:
+        response, queries = _statements(client, count_queries, path, headers, ids[:size])
+        assert len(response.json()["items"]) == size
+        counts.append(queries)
+    assert len(set(counts)) == 1, counts
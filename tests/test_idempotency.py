@@ -0,0 +1,112 @@
+import json
+
+import pytest
+from fastapi.testclient import TestClient
+
+from models.warehouse import Warehouse
+from services import idempotency
+from services.idempotency import (
+    REPLAYED_HEADER, IdempotencyMiddleware, InMemoryIdempotencyStore, StoredResponse, _fingerprint
+)
+
+
+@pytest.fixture(autouse=True)
+def store(monkeypatch):
+    store = InMemoryIdempotencyStore(max_entries=100, ttl=60)
+    monkeypatch.setattr(idempotency, "store", store)
+    return store
+
+
+def _warehouse(name: str) -> bytes:
+    return json.dumps({
+        "name": name, "location": "Istanbul", "capacity": 100, "rental_price": 10.0, "warehouse_type": "dry",
+    }).encode()
+
+
+def _post(client, headers, key, body):
+    return client.post("/warehouses/", content=body, headers={
+        **headers, "Idempotency-Key": key, "Content-Type": "application/json",
+    })
+
+
+def test_retry_replays_stored_response(client, db, make_user):
+    user, headers = make_user()
+    body = _warehouse("replayed")
+
+    first = _post(client, headers, "create-1", body)
+    second = _post(client, headers, "create-1", body)
+
+    assert first.status_code == 201
+    assert REPLAYED_HEADER not in first.headers
+    assert (second.status_code, second.content) == (first.status_code, first.content)
+    assert second.headers[REPLAYED_HEADER] == "true"
+    assert db.query(Warehouse).filter(Warehouse.owner_id == user.id).count() == 1
+
+
+def test_key_reused_for_different_request(client, make_user):
+    _, headers = make_user()
+
+    assert _post(client, headers, "create-2", _warehouse("first")).status_code == 201
+    response = _post(client, headers, "create-2", _warehouse("second"))
+
+    assert response.status_code == 422
+
+
+def test_keys_are_scoped_to_the_principal(client, db, make_user):
+    first, first_headers = make_user()
+    second, second_headers = make_user()
+    body = _warehouse("shared key")
+
+    _post(client, first_headers, "create-3", body)
+    response = _post(client, second_headers, "create-3", body)
+
+    assert REPLAYED_HEADER not in response.headers
+    assert db.query(Warehouse).filter(Warehouse.owner_id.in_([first.id, second.id])).count() == 2
+
+
+def test_duplicate_of_running_request_conflicts(client, make_user, store, monkeypatch):
+    user, headers = make_user()
+    body = _warehouse("in progress")
+    monkeypatch.setattr(idempotency, "IDEMPOTENCY_WAIT_SECONDS", 0.05)
+    # Claimed as the middleware would while the first request is running
+    store.begin(f"{user.email}|create-4", _fingerprint({"method": "POST", "path": "/warehouses/"}, body))
+
+    response = _post(client, headers, "create-4", body)
+
+    assert response.status_code == 409
+
+
+def test_server_error_releases_key(make_user):
+    _, headers = make_user()
+    statuses = [500, 201]
+    calls = []
+
+    async def app(scope, receive, send):
+        await receive()
+        calls.append(scope["path"])
+        await send({"type": "http.response.start", "status": statuses[len(calls) - 1], "headers": []})
+        await send({"type": "http.response.body", "body": b"{}"})
+
+    client = TestClient(IdempotencyMiddleware(app))
+    body = _warehouse("flaky")
+
+    assert _post(client, headers, "create-5", body).status_code == 500
+    assert _post(client, headers, "create-5", body).status_code == 201
+    replayed = _post(client, headers, "create-5", body)
+
+    assert replayed.status_code == 201
+    assert replayed.headers[REPLAYED_HEADER] == "true"
+    assert len(calls) == 2
+
+
+def test_eviction_keeps_records_in_progress():
+    store = InMemoryIdempotencyStore(max_entries=2, ttl=60)
+    running, _ = store.begin("running", b"a")
+    store.begin("done", b"b")
+    store.complete("done", StoredResponse(201, [], b"{}"))
+
+    store.begin("new", b"c")
+    record, claimed = store.begin("running", b"a")
+
+    assert (record, claimed) == (running, False)
+    assert store.begin("done", b"b")[1]
@@ -0,0 +1,94 @@
+from datetime import datetime, timedelta
+
+import pytest
+
+from config import STOCK_SNAPSHOT_LAG_SECONDS
+from models.product import Product
+from models.stock_movement import StockMovement, StockSnapshot
+from services.ledger import stock_as_of, take_snapshot
+
+START = datetime(2024, 1, 1)
+LAG = timedelta(seconds=STOCK_SNAPSHOT_LAG_SECONDS)
+
+
+def at(minutes: float) -> datetime:
+    return START + timedelta(minutes=minutes)
+
+
+@pytest.fixture
+def ledger(db, make_user, make_warehouse):
+    """A warehouse and a helper recording movements at given minutes after START."""
+    owner, _ = make_user()
+    warehouse_id = make_warehouse(owner).id
+
+    def move(minutes: float, product_id: int, delta: int):
+        db.add(StockMovement(
+            product_id=product_id, warehouse_id=warehouse_id, delta=delta, quantity=0, kind="test",
+            created_at=at(minutes)
+        ))
+        db.commit()
+    return warehouse_id, move
+
+
+def test_as_of_replays_the_ledger_without_snapshots(db, ledger):
+    warehouse_id, move = ledger
+    move(1, 1, 10)
+    move(2, 1, -3)
+    move(2, 2, 5)
+    move(3, 2, -5)
+
+    assert stock_as_of(db, warehouse_id, at(0)) == {}
+    assert stock_as_of(db, warehouse_id, at(1)) == {1: 10}
+    assert stock_as_of(db, warehouse_id, at(2.5)) == {1: 7, 2: 5}
+    # Products back at zero are left out
+    assert stock_as_of(db, warehouse_id, at(3)) == {1: 7}
+
+
+def test_snapshot_covers_movements_up_to_its_cutoff(db, ledger):
+    warehouse_id, move = ledger
+    db.add(StockSnapshot(warehouse_id=warehouse_id, taken_at=at(0), data={}))
+    db.commit()
+    move(1, 1, 10)
+    move(2, 1, -4)
+    # Exactly at the cutoff: inside the snapshot, not replayed on top of it
+    move(3, 2, 5)
+
+    snapshot = take_snapshot(db, warehouse_id, now=at(3) + LAG)
+    move(4, 1, 1)
+
+    assert (snapshot.taken_at, snapshot.data) == (at(3), {"1": 6, "2": 5})
+    assert stock_as_of(db, warehouse_id, at(3)) == {1: 6, 2: 5}
+    assert stock_as_of(db, warehouse_id, at(4)) == {1: 7, 2: 5}
+    # Nothing moved between the snapshot and the next cutoff
+    assert take_snapshot(db, warehouse_id, now=at(3.5) + LAG) is None
+
+
+def test_reads_start_from_the_latest_snapshot_before_as_of(db, ledger):
+    warehouse_id, move = ledger
+    db.add(StockSnapshot(warehouse_id=warehouse_id, taken_at=at(0), data={}))
+    db.commit()
+    move(1, 1, 10)
+    take_snapshot(db, warehouse_id, now=at(2) + LAG)
+    move(3, 1, 2)
+
+    # Movements covered by the snapshot are no longer replayed after it
+    db.query(StockMovement).filter(
+        StockMovement.warehouse_id == warehouse_id, StockMovement.created_at <= at(2)
+    ).delete()
+    db.commit()
+
+    assert stock_as_of(db, warehouse_id, at(1)) == {}
+    assert stock_as_of(db, warehouse_id, at(2)) == {1: 10}
+    assert stock_as_of(db, warehouse_id, at(3)) == {1: 12}
+
+
+def test_first_snapshot_reads_the_products_table(db, make_user, make_warehouse):
+    owner, _ = make_user()
+    warehouse_id = make_warehouse(owner, products=2, quantity=4).id
+    product_ids = [id for (id,) in db.query(Product.id).filter(Product.warehouse_id == warehouse_id)]
+
+    snapshot = take_snapshot(db, warehouse_id, now=at(10))
+
+    assert snapshot.taken_at == at(10)
+    assert snapshot.data == {str(id): 4 for id in product_ids}
+    assert stock_as_of(db, warehouse_id, at(11)) == {id: 4 for id in sorted(product_ids)}
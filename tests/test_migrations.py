@@ -0,0 +1,108 @@
+import importlib
+
+import pytest
+from sqlalchemy import create_engine, inspect, text
+from sqlalchemy.exc import IntegrityError
+
+import migrations
+from database import Base
+
+# Rows as a deployment from before the migrations would hold them
+PRE_SERIES_ROWS = """
+INSERT INTO users (id, email, password, user_type) VALUES (1, 'a@example.com', 'x', 'business'),
+                                                          (2, 'b@example.com', 'x', 'business');
+INSERT INTO warehouses (id, name, location, capacity, owner_id) VALUES (1, 'north', 'Istanbul', 100, 1),
+                                                                       (2, 'south', 'Ankara', 100, 2),
+                                                                       (3, 'empty', 'Izmir', 100, 2);
+INSERT INTO products (id, name, description, quantity, warehouse_id) VALUES
+    (1, 'bolt', NULL, 4, 1),
+    (2, 'bolt', '', 6, 1),
+    (3, 'bolt', 'M8', 1, 1),
+    (4, 'nut', 'M8', 0, 1),
+    (5, 'bolt', NULL, 3, 2),
+    (6, 'washer', NULL, 7, NULL)
+"""
+
+
+@pytest.fixture
+def pre_series(tmp_path):
+    """A database with the baseline schema and data, never migrated."""
+    engine = create_engine(f"sqlite:///{tmp_path / 'old.db'}")
+    with engine.begin() as connection:
+        importlib.import_module("migrations.0001_initial").upgrade(connection)
+        for statement in PRE_SERIES_ROWS.split(";"):
+            connection.execute(text(statement))
+    yield engine
+    engine.dispose()
+
+
+def _rows(engine, query):
+    with engine.connect() as connection:
+        return [tuple(row) for row in connection.execute(text(query))]
+
+
+def test_upgrade_migrates_pre_series_data(pre_series):
+    assert migrations.upgrade(pre_series) == [name for _, name in migrations.migrations()]
+
+    # 0003: NULL and '' descriptions are the same product, merged into the lowest id
+    assert _rows(pre_series, "SELECT id, warehouse_id, name, description, quantity FROM products ORDER BY id") == [
+        (1, 1, "bolt", None, 10),
+        (3, 1, "bolt", "M8", 1),
+        (4, 1, "nut", "M8", 0),
+        (5, 2, "bolt", None, 3),
+        (6, None, "washer", None, 7),
+    ]
+    with pytest.raises(IntegrityError), pre_series.begin() as connection:
+        connection.execute(text("INSERT INTO products (name, description, warehouse_id) VALUES ('bolt', '', 1)"))
+    # 0002: owners copied from the warehouses, none for products without one
+    assert _rows(pre_series, "SELECT id, owner_id FROM products ORDER BY id") == [
+        (1, 1), (3, 1), (4, 1), (5, 2), (6, None),
+    ]
+    # 0005: counters match the products, positive quantities counted as SKUs
+    assert _rows(
+        pre_series, "SELECT warehouse_id, total_quantity, sku_count FROM warehouse_stock ORDER BY warehouse_id"
+    ) == [(1, 11, 2), (2, 3, 1), (3, 0, 0)]
+
+
+def test_upgrade_is_applied_once(pre_series):
+    migrations.upgrade(pre_series)
+
+    assert migrations.upgrade(pre_series) == []
+    with pre_series.connect() as connection:
+        assert migrations.pending(connection) == []
+
+
+def test_counters_are_recomputed_when_they_drifted(pre_series):
+    with pre_series.begin() as connection:
+        for name in ("0002_product_owner", "0003_product_identity", "0005_stock_counters"):
+            importlib.import_module(f"migrations.{name}").upgrade(connection)
+        connection.execute(text("UPDATE warehouse_stock SET total_quantity = 99, sku_count = 9"))
+
+        importlib.import_module("migrations.0005_stock_counters").upgrade(connection)
+
+    assert _rows(pre_series, "SELECT total_quantity, sku_count FROM warehouse_stock WHERE warehouse_id = 1") == [
+        (11, 2)
+    ]
+
+
+def test_migrated_schema_matches_models(tmp_path):
+    migrated = create_engine(f"sqlite:///{tmp_path / 'migrated.db'}")
+    created = create_engine(f"sqlite:///{tmp_path / 'created.db'}")
+    migrations.upgrade(migrated)
+    Base.metadata.create_all(created)
+
+    def schema(engine):
+        inspector = inspect(engine)
+        return {
+            table: (
+                sorted(column["name"] for column in inspector.get_columns(table)),
+                sorted((index["name"], index["unique"]) for index in inspector.get_indexes(table)),
+            )
+            for table in Base.metadata.tables
+        }
+
+    try:
+        assert schema(migrated) == schema(created)
+    finally:
+        migrated.dispose()
+        created.dispose()
@@ -0,0 +1,122 @@
+import random
+
+import pytest
+
+from models.warehouse import Warehouse
+from services.placement import CapacityBucket, placement_index
+
+SEEDS = range(5)
+
+
+def _entries(rng, count):
+    # Few distinct prices, so ties are broken by id like in the index
+    return [(float(rng.randint(1, 5)), id, rng.randint(0, 100)) for id in range(count)]
+
+
+@pytest.mark.parametrize("seed", SEEDS)
+def test_bucket_updates_keep_the_tree_consistent(seed):
+    rng = random.Random(seed)
+    entries = _entries(rng, rng.randint(1, 40))
+    bucket = CapacityBucket(entries)
+    free = {id: capacity for _, id, capacity in entries}
+
+    for _ in range(200):
+        id = rng.choice(list(free))
+        delta = rng.randint(-30, 30)
+        bucket.update(id, delta)
+        free[id] += delta
+
+        assert [bucket.free(position) for position in range(len(bucket))] == [free[id] for id in bucket.ids]
+        assert bucket.tree[1] == max(free.values())
+
+
+@pytest.mark.parametrize("seed", SEEDS)
+def test_first_fit_matches_a_linear_scan(seed):
+    rng = random.Random(seed)
+    entries = _entries(rng, rng.randint(1, 40))
+    bucket = CapacityBucket(entries)
+    for _ in range(50):
+        bucket.update(rng.choice(bucket.ids), rng.randint(-20, 20))
+
+    for _ in range(500):
+        quantity = rng.randint(0, 120)
+        max_price = rng.choice([None, rng.uniform(0, 6)])
+        start = rng.randint(0, len(bucket))
+        expected = next((
+            position for position in range(start, len(bucket))
+            if bucket.free(position) >= quantity and (max_price is None or bucket.prices[position] <= max_price)
+        ), None)
+
+        assert bucket.first_fit(quantity, max_price, start) == expected
+
+
+def test_empty_bucket_fits_nothing():
+    bucket = CapacityBucket([])
+
+    assert len(bucket) == 0
+    assert bucket.first_fit(1) is None
+
+
+@pytest.fixture
+def warehouses(db, make_user):
+    """Owner with (price, capacity) warehouses of one type and location."""
+    def make(*specs):
+        owner, headers = make_user()
+        created = []
+        for price, capacity in specs:
+            warehouse = Warehouse(
+                name="placement", location="Izmir", capacity=capacity, rental_price=price,
+                warehouse_type="Cold", owner_id=owner.id
+            )
+            db.add(warehouse)
+            created.append(warehouse)
+        db.commit()
+        return owner, headers, [warehouse.id for warehouse in created]
+    return make
+
+
+def _allocate(client, headers, quantity, **fields):
+    response = client.post("/warehouses/allocate", json={"quantity": quantity, **fields}, headers=headers)
+    assert response.status_code == 200, response.text
+    body = response.json()
+    return [(item["warehouse_id"], item["quantity"]) for item in body["allocations"]], body["unallocated"]
+
+
+def test_allocation_picks_the_cheapest_that_fits(client, warehouses):
+    _, headers, (cheap, middle, dear) = warehouses((1.0, 10), (2.0, 50), (3.0, 100))
+
+    assert _allocate(client, headers, 30) == ([(middle, 30)], 0)
+    assert _allocate(client, headers, 30, warehouse_type="cold", location="izmir", limit=2) == (
+        [(middle, 30), (dear, 30)], 0
+    )
+    assert _allocate(client, headers, 60, max_price=2.5) == ([], 60)
+
+
+def test_split_fills_the_cheapest_warehouses_first(client, warehouses):
+    _, headers, (cheap, middle, dear) = warehouses((1.0, 10), (2.0, 50), (3.0, 100))
+
+    assert _allocate(client, headers, 70, split=True, limit=3) == ([(cheap, 10), (middle, 50), (dear, 10)], 0)
+    assert _allocate(client, headers, 200, split=True, limit=2) == ([(cheap, 10), (middle, 50)], 140)
+    assert _allocate(client, headers, 200, split=True, limit=5, max_price=2.0) == (
+        [(cheap, 10), (middle, 50)], 140
+    )
+
+
+def test_index_follows_stock_and_warehouse_writes(client, warehouses):
+    owner, headers, (cheap, dear) = warehouses((1.0, 50), (2.0, 50))
+    assert _allocate(client, headers, 40) == ([(cheap, 40)], 0)
+
+    product = {"name": "pallet", "description": "placement", "quantity": 20, "warehouse_id": cheap}
+    assert client.post("/products/", json=product, headers=headers).status_code == 201
+    # 30 left in the cheap warehouse after the committed stock write,
+    # applied to the index itself rather than corrected by verify()
+    assert placement_index.cheapest(1, owner.id, limit=2) == [(cheap, 1.0, 30), (dear, 2.0, 50)]
+    assert _allocate(client, headers, 40) == ([(dear, 40)], 0)
+    assert _allocate(client, headers, 30) == ([(cheap, 30)], 0)
+
+    warehouse = {
+        "name": "placement", "location": "Izmir", "capacity": 50, "rental_price": 3.0, "warehouse_type": "Cold",
+    }
+    assert client.put(f"/warehouses/{cheap}", json=warehouse, headers=headers).status_code == 200
+    # Repriced above the other one, the edit reloads it on the next allocation
+    assert _allocate(client, headers, 30) == ([(dear, 30)], 0)
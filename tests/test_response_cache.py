@@ -0,0 +1,128 @@
+import pytest
+
+from models.product import Product
+from services import response_cache as cache_module
+from services.response_cache import CachedResponse, InMemoryResponseBackend, response_cache
+
+
+@pytest.fixture(autouse=True)
+def backend(monkeypatch):
+    backend = InMemoryResponseBackend(1024 * 1024)
+    monkeypatch.setattr(response_cache, "enabled", True)
+    monkeypatch.setattr(response_cache, "backend", response_cache.backend)
+    cache_module.set_backend(backend)
+    return backend
+
+
+@pytest.fixture
+def stocked(db, make_user, make_warehouse):
+    """An owner with two warehouses, the first holding one product."""
+    owner, headers = make_user()
+    source = make_warehouse(owner, products=1, quantity=10)
+    target = make_warehouse(owner)
+    product_id = db.query(Product.id).filter(Product.warehouse_id == source.id).scalar()
+    return {"headers": headers, "source": source.id, "target": target.id, "product": product_id}
+
+
+def _get(client, path, headers, etag=None):
+    return client.get(path, headers={**headers, **({"If-None-Match": etag} if etag else {})})
+
+
+def test_matching_etag_is_not_modified(client, stocked):
+    path, headers = f"/products/{stocked['product']}", stocked["headers"]
+    first = _get(client, path, headers)
+    hits = response_cache.hits
+
+    cached = _get(client, path, headers)
+    not_modified = _get(client, path, headers, first.headers["ETag"])
+
+    assert first.status_code == 200
+    assert (cached.content, cached.headers["ETag"]) == (first.content, first.headers["ETag"])
+    assert response_cache.hits == hits + 1
+    assert not_modified.status_code == 304
+    assert not_modified.content == b""
+    assert _get(client, path, headers, '"other"').status_code == 200
+
+
+def _update_product(client, stocked):
+    product = {"name": "renamed", "description": "test", "quantity": 3, "warehouse_id": stocked["source"]}
+    return client.put(f"/products/{stocked['product']}", json=product, headers=stocked["headers"])
+
+
+def _update_warehouse(client, stocked):
+    warehouse = {
+        "name": "renamed", "location": "Ankara", "capacity": 50, "rental_price": 5.0, "warehouse_type": "cold",
+    }
+    return client.put(f"/warehouses/{stocked['source']}", json=warehouse, headers=stocked["headers"])
+
+
+def _transfer(client, stocked):
+    transfer = {"product_id": stocked["product"], "from_warehouse_id": stocked["source"],
+                "to_warehouse_id": stocked["target"], "quantity": 4}
+    return client.post("/products/transfer", json=transfer, headers=stocked["headers"])
+
+
+def _delete_product(client, stocked):
+    return client.delete(f"/products/{stocked['product']}", headers=stocked["headers"])
+
+
+@pytest.mark.parametrize("write, resource", [
+    (_update_product, "product"),
+    (_update_product, "source"),
+    (_update_warehouse, "source"),
+    (_transfer, "product"),
+    (_transfer, "source"),
+    (_transfer, "target"),
+    (_delete_product, "source"),
+])
+def test_writes_change_etag_and_body(client, stocked, write, resource):
+    path = f"/{'products' if resource == 'product' else 'warehouses'}/{stocked[resource]}"
+    before = _get(client, path, stocked["headers"])
+    assert before.status_code == 200
+
+    assert write(client, stocked).status_code < 300
+    after = _get(client, path, stocked["headers"], before.headers["ETag"])
+
+    assert after.status_code == 200
+    assert after.headers["ETag"] != before.headers["ETag"]
+    assert after.content != before.content
+
+
+@pytest.mark.parametrize("resource", ["product", "source"])
+def test_deleted_rows_are_not_served_from_cache(client, stocked, resource):
+    path = f"/{'products' if resource == 'product' else 'warehouses'}/{stocked[resource]}"
+    before = _get(client, path, stocked["headers"])
+
+    assert client.delete(path, headers=stocked["headers"]).status_code == 204
+
+    assert _get(client, path, stocked["headers"]).status_code == 404
+    assert _get(client, path, stocked["headers"], before.headers["ETag"]).status_code == 404
+
+
+def test_cached_responses_are_not_shared_across_tenants(client, stocked, make_user):
+    _, other = make_user()
+    for path in (f"/products/{stocked['product']}", f"/warehouses/{stocked['source']}", "/products/?limit=1000"):
+        owned = _get(client, path, stocked["headers"])
+        assert owned.status_code == 200
+
+        foreign = _get(client, path, other)
+        replayed = _get(client, path, other, owned.headers["ETag"])
+
+        assert replayed.status_code == foreign.status_code != 304
+        if foreign.status_code == 200:
+            assert stocked["product"] not in {row["id"] for row in foreign.json()}
+        else:
+            assert foreign.status_code == 404
+
+
+def test_lru_evicts_by_total_bytes():
+    backend = InMemoryResponseBackend(max_bytes=10)
+    backend.set("a", CachedResponse("a", b"1234"), 60)
+    backend.set("b", CachedResponse("b", b"1234"), 60)
+    backend.get("a")
+    backend.set("c", CachedResponse("c", b"1234"), 60)
+    backend.set("huge", CachedResponse("huge", b"x" * 11), 60)
+
+    assert [key for key in "abc" if backend.get(key) is not None] == ["a", "c"]
+    assert backend.get("huge") is None
+    assert (len(backend), backend.size) == (2, 8)
@@ -0,0 +1,138 @@
+import itertools
+import json
+
+import pytest
+
+from database import SessionLocal
+from models.product import Product
+from services.warehouses import remove_warehouse
+
+_names = itertools.count()
+
+
+@pytest.fixture
+def tenants(db, make_user, make_warehouse):
+    """Owner A with a warehouse and a product, and owner B with the same."""
+    name = f"tenant{next(_names)}"
+    owners = {}
+    for label in ("a", "b"):
+        user, headers = make_user()
+        warehouse = make_warehouse(user, products=1, quantity=10)
+        warehouse.name = f"{name}{label} warehouse"
+        product = db.query(Product).filter(Product.warehouse_id == warehouse.id).one()
+        product.name = f"{name}{label} product"
+        db.commit()
+        owners[label] = {"user": user, "headers": headers, "warehouse": warehouse.id, "product": product.id}
+    owners["name"] = name
+    return owners
+
+
+def _ids(rows):
+    return {row["id"] for row in rows}
+
+
+def test_lists_hold_only_own_rows(client, tenants):
+    a, b = tenants["a"], tenants["b"]
+
+    warehouses = client.get("/warehouses/?limit=1000", headers=b["headers"]).json()
+    products = client.get("/products/?limit=1000", headers=b["headers"]).json()
+    owned = client.get(f"/users/{a['user'].id}/warehouses", headers=b["headers"]).json()
+
+    assert b["warehouse"] in _ids(warehouses) and a["warehouse"] not in _ids(warehouses)
+    assert b["product"] in _ids(products) and a["product"] not in _ids(products)
+    assert owned == []
+
+
+def test_other_tenants_rows_are_not_found(client, tenants):
+    a, b = tenants["a"], tenants["b"]
+
+    for path in (
+        f"/warehouses/{a['warehouse']}",
+        f"/warehouses/{a['warehouse']}/stock",
+        f"/warehouses/{a['warehouse']}/movements",
+        f"/products/{a['product']}",
+    ):
+        assert client.get(path, headers=b["headers"]).status_code == 404, path
+
+
+def test_other_tenants_rows_cannot_be_changed(client, db, tenants):
+    a, b = tenants["a"], tenants["b"]
+    warehouse = {
+        "name": "taken over", "location": "Ankara", "capacity": 1, "rental_price": 1.0, "warehouse_type": "cold",
+    }
+    product = {"name": "taken over", "description": "x", "quantity": 1, "warehouse_id": b["warehouse"]}
+
+    assert client.put(f"/warehouses/{a['warehouse']}", json=warehouse, headers=b["headers"]).status_code == 404
+    assert client.put(f"/products/{a['product']}", json=product, headers=b["headers"]).status_code == 404
+    assert client.delete(f"/products/{a['product']}", headers=b["headers"]).status_code == 404
+    assert client.delete(f"/warehouses/{a['warehouse']}", headers=b["headers"]).status_code == 404
+    assert client.delete(
+        f"/warehouses/{a['warehouse']}?background=true", headers=b["headers"]
+    ).status_code == 404
+
+    response = client.get(f"/warehouses/{a['warehouse']}", headers=a["headers"]).json()
+    assert response["name"] == f"{tenants['name']}a warehouse"
+    assert [item["id"] for item in response["products"]] == [a["product"]]
+
+
+def test_transfers_across_tenants_are_refused(client, db, tenants):
+    a, b = tenants["a"], tenants["b"]
+    into = {"product_id": b["product"], "from_warehouse_id": b["warehouse"],
+            "to_warehouse_id": a["warehouse"], "quantity": 5}
+    out_of = {"product_id": a["product"], "from_warehouse_id": a["warehouse"],
+              "to_warehouse_id": b["warehouse"], "quantity": 5}
+
+    assert client.post("/products/transfer", json=into, headers=b["headers"]).status_code >= 400
+    assert client.post("/products/transfer", json=out_of, headers=b["headers"]).status_code >= 400
+    assert client.post(
+        "/products/transfer/bulk", json={"transfers": [into]}, headers=b["headers"]
+    ).status_code >= 400
+
+    assert db.query(Product.warehouse_id, Product.quantity).filter(
+        Product.id.in_([a["product"], b["product"]])
+    ).order_by(Product.id).all() == [(a["warehouse"], 10), (b["warehouse"], 10)]
+
+
+def test_search_and_batch_get_skip_other_tenants(client, tenants):
+    a, b, name = tenants["a"], tenants["b"], tenants["name"]
+
+    warehouses = client.get(f"/warehouses/search?q={name}", headers=b["headers"]).json()
+    products = client.get(f"/products/search?q={name}", headers=b["headers"]).json()
+    warehouse_batch = client.post(
+        "/warehouses/batch-get", json={"ids": [a["warehouse"], b["warehouse"]]}, headers=b["headers"]
+    ).json()
+    product_batch = client.post(
+        "/products/batch-get", json={"ids": [a["product"], b["product"]]}, headers=b["headers"]
+    ).json()
+
+    assert _ids(warehouses) == {b["warehouse"]}
+    assert _ids(products) == {b["product"]}
+    assert warehouse_batch["missing"] == [a["warehouse"]]
+    assert product_batch["missing"] == [a["product"]]
+
+
+def test_export_and_stats_skip_other_tenants(client, tenants):
+    a, b = tenants["a"], tenants["b"]
+
+    exported = client.get("/products/export?format=ndjson", headers=b["headers"]).text
+    stats = client.get("/warehouses/stats?limit=1000", headers=b["headers"]).json()
+    top = client.get("/warehouses/stats/top?n=100", headers=b["headers"]).json()
+    owners = client.get("/warehouses/stats/owners", headers=b["headers"]).json()
+
+    assert {json.loads(line)["id"] for line in exported.splitlines() if line} == {b["product"]}
+    assert a["warehouse"] not in {row["id"] for row in stats + top}
+    assert [row["owner_id"] for row in owners] == [b["user"].id]
+
+
+def test_detached_products_keep_their_owner(client, db, tenants):
+    a, b = tenants["a"], tenants["b"]
+    session = SessionLocal()
+    try:
+        assert remove_warehouse(session, a["warehouse"])
+    finally:
+        session.close()
+
+    product = db.get(Product, a["product"])
+    assert (product.warehouse_id, product.owner_id) == (None, a["user"].id)
+    assert client.get(f"/products/{a['product']}", headers=a["headers"]).status_code == 200
+    assert client.get(f"/products/{a['product']}", headers=b["headers"]).status_code == 404
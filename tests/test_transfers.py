@@ -0,0 +1,102 @@
+import random
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+from fastapi import HTTPException
+from sqlalchemy import func
+
+from database import SessionLocal
+from models.product import Product
+from models.stock_movement import StockMovement
+from schemas.product import ProductTransfer
+from services.transfers import bulk_transfer_stock, transfer_stock
+
+WAREHOUSES = 4
+START_QUANTITY = 50
+WORKERS = 8
+ROUNDS = 40
+
+
+def _stock(db, warehouse_ids):
+    return db.query(Product.warehouse_id, Product.id, Product.quantity).filter(
+        Product.warehouse_id.in_(warehouse_ids)
+    ).all()
+
+
+def _random_transfer(db, rng, warehouse_ids) -> ProductTransfer:
+    source_id, target_id = rng.sample(warehouse_ids, 2)
+    product_id = db.query(Product.id).filter(Product.warehouse_id == source_id).scalar()
+    # Sometimes more than is left, so refused transfers race the others too
+    return ProductTransfer(
+        product_id=product_id or 0, from_warehouse_id=source_id,
+        to_warehouse_id=target_id, quantity=rng.randint(1, START_QUANTITY // 2)
+    )
+
+
+def test_concurrent_transfers_conserve_stock(db, make_user, make_warehouse):
+    owner, _ = make_user()
+    warehouse_ids = [make_warehouse(owner, products=1, quantity=START_QUANTITY).id for _ in range(WAREHOUSES)]
+    errors = []
+    applied = [0]
+    lock = threading.Lock()
+
+    def worker(seed: int):
+        rng = random.Random(seed)
+        for _ in range(ROUNDS):
+            session = SessionLocal()
+            try:
+                if rng.random() < 0.5:
+                    transfer_stock(session, _random_transfer(session, rng, warehouse_ids))
+                else:
+                    bulk_transfer_stock(session, [
+                        _random_transfer(session, rng, warehouse_ids) for _ in range(rng.randint(2, 5))
+                    ])
+                with lock:
+                    applied[0] += 1
+            except HTTPException as error:
+                # Running out of stock (400) or losing a creation race (409)
+                # is expected, anything else is a bug
+                if error.status_code not in (400, 409):
+                    errors.append(error)
+            except Exception as error:
+                errors.append(error)
+            finally:
+                session.close()
+
+    with ThreadPoolExecutor(WORKERS) as executor:
+        list(executor.map(worker, range(WORKERS)))
+
+    assert errors == []
+    assert applied[0] > 0
+    db.expire_all()
+    rows = _stock(db, warehouse_ids)
+    assert sum(quantity for _, _, quantity in rows) == WAREHOUSES * START_QUANTITY
+    assert all(quantity >= 0 for _, _, quantity in rows)
+    # One row per warehouse: targets are upserted, never duplicated
+    assert sorted(warehouse_id for warehouse_id, _, _ in rows) == sorted(warehouse_ids)
+    # Every movement has its counterpart in the ledger
+    ledger = db.query(func.sum(StockMovement.delta)).filter(
+        StockMovement.warehouse_id.in_(warehouse_ids)
+    ).scalar()
+    assert ledger == 0
+
+
+def test_transfer_refuses_overdraw(db, make_user, make_warehouse):
+    owner, _ = make_user()
+    source = make_warehouse(owner, products=1, quantity=5)
+    target = make_warehouse(owner)
+    product_id = db.query(Product.id).filter(Product.warehouse_id == source.id).scalar()
+
+    transfer = ProductTransfer(product_id=product_id, from_warehouse_id=source.id,
+                               to_warehouse_id=target.id, quantity=6)
+    session = SessionLocal()
+    try:
+        try:
+            transfer_stock(session, transfer)
+        except HTTPException as error:
+            assert error.status_code == 400
+        else:
+            raise AssertionError("overdraw was accepted")
+    finally:
+        session.close()
+    assert db.get(Product, product_id).quantity == 5
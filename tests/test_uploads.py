@@ -0,0 +1,62 @@
+import itertools
+import os
+
+import pytest
+
+import routers.auth
+from config import UPLOAD_DIR
+from services.uploads import FORM_OVERHEAD_BYTES, UPLOAD_MAX_BYTES
+
+PNG = b"\x89PNG\r\n\x1a\n"
+LIMIT = UPLOAD_MAX_BYTES + FORM_OVERHEAD_BYTES
+_emails = itertools.count()
+
+
+def _form():
+    return {"email": f"upload{next(_emails)}@example.com", "password": "pw", "user_type": "business"}
+
+
+def _stored_files():
+    return set(os.listdir(UPLOAD_DIR)) if os.path.isdir(UPLOAD_DIR) else set()
+
+
+def test_content_length_over_limit_is_rejected(client):
+    image = PNG + b"x" * LIMIT
+    response = client.post("/auth/register", data=_form(), files={"image": ("a.png", image, "image/png")})
+
+    assert response.status_code == 413
+
+
+def test_streamed_body_over_limit_is_cut_off(client):
+    def body():
+        yield b'--b\r\nContent-Disposition: form-data; name="image"; filename="a.png"\r\n\r\n' + PNG
+        for _ in range(LIMIT // 65536 + 2):
+            yield b"x" * 65536
+
+    # A generator is sent chunked, without a Content-Length
+    response = client.post("/auth/register", content=body(),
+                           headers={"content-type": "multipart/form-data; boundary=b"})
+
+    assert response.status_code == 413
+
+
+def test_failed_registration_removes_its_upload(client, monkeypatch):
+    async def failing_hash(password):
+        raise RuntimeError("hashing failed")
+
+    monkeypatch.setattr(routers.auth, "hash_password", failing_hash)
+    before = _stored_files()
+    image = PNG + os.urandom(64)
+
+    with pytest.raises(RuntimeError):
+        client.post("/auth/register", data=_form(), files={"image": ("a.png", image, "image/png")})
+
+    assert _stored_files() == before
+
+
+def test_registration_keeps_its_upload(client):
+    image = PNG + os.urandom(64)
+    response = client.post("/auth/register", data=_form(), files={"image": ("a.png", image, "image/png")})
+
+    assert response.status_code == 201
+    assert os.path.exists(response.json()["image_path"])
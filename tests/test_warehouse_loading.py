@@ -0,0 +1,50 @@
+import pytest
+
+from services.response_cache import response_cache
+
+PAGE_SIZES = (2, 10, 30)
+
+
+@pytest.fixture(autouse=True)
+def no_response_cache(monkeypatch):
+    # A cached page would be served without running any query at all
+    monkeypatch.setattr(response_cache, "enabled", False)
+
+
+def _statements(client, count_queries, method, url, headers, **kwargs):
+    response = client.request(method, url, headers=headers, **kwargs)
+    with count_queries() as statements:
+        response = client.request(method, url, headers=headers, **kwargs)
+    assert response.status_code == 200, response.text
+    return response, len(statements)
+
+
+@pytest.mark.parametrize("mode", ["none", "summary", "full"])
+def test_list_query_count_does_not_grow_with_page_size(client, make_user, make_warehouse, count_queries, mode):
+    owner, headers = make_user()
+    for _ in range(max(PAGE_SIZES)):
+        make_warehouse(owner, products=3)
+
+    counts = []
+    for size in PAGE_SIZES:
+        response, queries = _statements(
+            client, count_queries, "GET", f"/warehouses/?limit={size}&products={mode}", headers
+        )
+        assert len(response.json()) == size
+        counts.append(queries)
+    assert len(set(counts)) == 1, counts
+
+
+def test_user_warehouses_query_count_does_not_grow(client, make_user, make_warehouse, count_queries):
+    owner, headers = make_user()
+    counts = []
+    created = 0
+    for size in PAGE_SIZES:
+        while created < size:
+            make_warehouse(owner, products=3)
+            created += 1
+        response, queries = _statements(client, count_queries, "GET", f"/users/{owner.id}/warehouses", headers)
+        assert len(response.json()) == size
+        assert all(len(warehouse["products"]) == 3 for warehouse in response.json())
+        counts.append(queries)
+    assert len(set(counts)) == 1, counts
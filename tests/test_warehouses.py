@@ -0,0 +1,29 @@
+import pytest
+from sqlalchemy import func
+
+from database import SessionLocal
+from models.product import Product
+from models.stock_movement import StockMovement
+from models.warehouse_stock import WarehouseStock
+from services.warehouses import remove_warehouse
+
+
+@pytest.mark.parametrize("batch_size", [None, 2])
+def test_remove_warehouse_records_outgoing_stock(db, make_user, make_warehouse, batch_size):
+    owner, _ = make_user()
+    warehouse_id = make_warehouse(owner, products=5, quantity=7).id
+    product_ids = [id for (id,) in db.query(Product.id).filter(Product.warehouse_id == warehouse_id)]
+
+    session = SessionLocal()
+    try:
+        assert remove_warehouse(session, warehouse_id, batch_size=batch_size)
+    finally:
+        session.close()
+
+    movements = db.query(StockMovement.kind, func.sum(StockMovement.delta), func.count()).filter(
+        # SQLite reuses the ids of deleted warehouses
+        StockMovement.warehouse_id == warehouse_id, StockMovement.product_id.in_(product_ids)
+    ).group_by(StockMovement.kind).all()
+    assert movements == [("warehouse_delete", -35, 5)]
+    # The counter is deleted with the warehouse, not recreated by the movements
+    assert db.get(WarehouseStock, warehouse_id) is None